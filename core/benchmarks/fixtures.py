@@ -0,0 +1,183 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.utils import timezone
+
+from bookings.cards import fill_card
+from bookings.models import Booking, Payment, SeatLedger, SeatSnapshot
+from rides.geo import encode as encode_geohash
+from rides.models import Location, LocationTrigram, Ride, RideStop, Vehicle, VehicleMake, VehicleModel
+from rides.names import canonical_location_name, trigrams
+from rides.schedule import schedule_key
+from rides.search_index import refresh_ride_search_index, sync_ride_search_index
+from rides.stops import build_stops
+from users.claims import claims_key, token_state_key
+from users.models import DriverProfile, PassengerProfile, Profile
+
+User = get_user_model()
+
+# Bulk data generators for benchmarks. Everything goes through bulk_create, so
+# model save() overrides and post_save signals (profile creation, welcome
+# emails, search index) are bypassed and have to be done here explicitly.
+
+FIRST_NAMES = ['Aarav','Vivaan','Aditya','Ishaan','Ananya','Diya','Saanvi','Meera','Rohan','Kavya']
+LAST_NAMES = ['Sharma','Patil','Kulkarni','Deshmukh','Iyer','Reddy','Joshi','Nair','Gupta','Sutar']
+PLACES = ['Station','Airport','Bus Stand','Market','IT Park','University','Mall','Hospital','Chowk','Gate']
+CITIES = [('Pune',18.5204,73.8567),('Mumbai',19.0760,72.8777),('Nashik',19.9975,73.7898),('Kolhapur',16.7050,74.2433)]
+BENCHMARK_PASSWORD = 'benchmark-pass'
+
+
+def create_users(count, role, prefix='bench'):
+    password = make_password(BENCHMARK_PASSWORD)
+    run = random.randrange(10**8)
+    users = User.objects.bulk_create([
+        User(email=f"{prefix}-{role}-{run}-{i}@example.com",role=role,password=password)
+        for i in range(count)
+    ])
+    profiles = Profile.objects.bulk_create([
+        Profile(user=user,first_name=random.choice(FIRST_NAMES),last_name=random.choice(LAST_NAMES))
+        for user in users
+    ])
+    if role == User.Roles.DRIVER:
+        DriverProfile.objects.bulk_create([
+            DriverProfile(profile=profile,is_driver_verified=True,rating=Decimal(random.randint(300,500))/100)
+            for profile in profiles
+        ])
+    elif role == User.Roles.PASSENGER:
+        PassengerProfile.objects.bulk_create([PassengerProfile(profile=profile) for profile in profiles])
+    cache.delete_many([key for user in users for key in (claims_key(user.id),token_state_key(user.id),schedule_key(user.id))])
+    return users
+
+
+def create_vehicles(drivers):
+    make, _ = VehicleMake.objects.get_or_create(name='Benchmark Motors')
+    model, _ = VehicleModel.objects.get_or_create(make=make,name='Sedan')
+    run = random.randrange(10**6)
+    return Vehicle.objects.bulk_create([
+        Vehicle(owner=driver,model=model,registration_number=f"BM{run}{i}"[:15],seats=5,color='white')
+        for i, driver in enumerate(drivers)
+    ])
+
+
+def create_locations(count, spread_km=15, names=None):
+    run = random.randrange(10**8)
+    locations = []
+    for i in range(count):
+        city, lat, lng = CITIES[i % len(CITIES)]
+        latitude = lat + random.uniform(-spread_km,spread_km) / 111.32
+        longitude = lng + random.uniform(-spread_km,spread_km) / 111.32
+        name = names[i] if names else f"{city} {random.choice(PLACES)} {run}-{i}"
+        locations.append(Location(
+            name=name,
+            normalized_name=canonical_location_name(name),
+            latitude=latitude,
+            longitude=longitude,
+            geohash=encode_geohash(latitude,longitude),
+            is_verified=True,
+        ))
+    locations = Location.objects.bulk_create(locations,batch_size=5000)
+    LocationTrigram.objects.bulk_create([
+        LocationTrigram(location=location,trigram=gram)
+        for location in locations
+        for gram in trigrams(location.normalized_name)
+    ],batch_size=5000)
+    return locations
+
+
+def create_rides(vehicles, locations, count, days=30, batch_size=5000, prebooked=True, stops=2):
+    # stops: average route length; the source boards, the destination drops,
+    # intermediate stops are split between the two lists
+    start = timezone.now() + timedelta(hours=1)
+    rides = []
+    for i in range(count):
+        vehicle = vehicles[i % len(vehicles)]
+        length = max(2,min(len(locations),random.randint(2,2 * stops - 2))) if stops > 2 else 2
+        source, *middle, destination = random.sample(locations,length)
+        split = random.randint(0,len(middle))
+        start_time = start + timedelta(minutes=random.randrange(days * 24 * 60))
+        rides.append(Ride(
+            driver_id=vehicle.owner_id,
+            vehicle=vehicle,
+            source=source,
+            destination=destination,
+            boarding_points=[source.name] + [location.name for location in middle[:split]],
+            dropping_points=[location.name for location in middle[split:]] + [destination.name],
+            fare=Decimal(random.randrange(100,1500)),
+            seats_offered=4,
+            seats_booked=random.randint(0,3) if prebooked else 0,
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=random.randrange(30,300)),
+        ))
+    rides = Ride.objects.bulk_create(rides,batch_size=batch_size)
+    RideStop.objects.bulk_create([
+        stop for ride in rides for stop in build_stops(ride.id,ride.boarding_points,ride.dropping_points)
+    ],batch_size=batch_size)
+    # Pre-booked seats have no bookings behind them; the snapshot keeps the ledger in step
+    SeatSnapshot.objects.bulk_create([
+        SeatSnapshot(ride=ride,seats_booked=ride.seats_booked) for ride in rides if ride.seats_booked
+    ],batch_size=batch_size)
+    # bulk_create skips the post_save handlers that index a new ride
+    for i in range(0,len(rides),batch_size):
+        refresh_ride_search_index([ride.id for ride in rides[i:i+batch_size]])
+    return rides
+
+
+def create_bookings(rides, passengers, count, batch_size=5000):
+    # Confirmed one-seat bookings with paid payments; ride seat counts follow.
+    # A passenger books a ride at most once.
+    open_rides = [ride for ride in rides if ride.seats_available > 0]
+    taken = set(Booking.objects.filter(ride__in=open_rides).values_list('passenger_id','ride_id'))
+    profiles = {profile.user_id: profile for profile in Profile.objects.filter(user__in=passengers)}
+    booked_rides, bookings = {}, []
+    for i in range(count):
+        if not open_rides:
+            break
+        ride = random.choice(open_rides)
+        passenger = next((p for p in random.sample(passengers,min(5,len(passengers))) if (p.id,ride.id) not in taken),None)
+        if passenger is None:
+            continue
+        taken.add((passenger.id,ride.id))
+        ride.seats_booked += 1
+        booked_rides[ride.id] = ride
+        if ride.seats_available == 0:
+            open_rides.remove(ride)
+        bookings.append(fill_card(Booking(
+            passenger=passenger,
+            ride=ride,
+            boarding_point=ride.boarding_points[0],
+            dropping_point=ride.dropping_points[0],
+            seats_booked=1,
+            status=Booking.BookingStatus.CONFIRMED,
+        ),ride,profiles[passenger.id]))
+    bookings = Booking.objects.bulk_create(bookings,batch_size=batch_size)
+    Payment.objects.bulk_create([
+        Payment(booking=booking,amount=booking.ride.fare,status=Payment.PaymentStatus.SUCCESS)
+        for booking in bookings
+    ],batch_size=batch_size)
+    SeatLedger.objects.bulk_create([
+        SeatLedger(ride=booking.ride,booking=booking,kind=SeatLedger.EventKind.RESERVE,delta=booking.seats_booked)
+        for booking in bookings
+    ],batch_size=batch_size)
+    Ride.objects.bulk_update(booked_rides.values(),['seats_booked'],batch_size=batch_size)
+    ride_ids = list(booked_rides)
+    for i in range(0,len(ride_ids),batch_size):
+        refresh_ride_search_index(ride_ids[i:i+batch_size])
+    return bookings
+
+
+def create_dataset(drivers, passengers, locations, rides, bookings):
+    drivers = create_users(drivers,'driver')
+    passengers = create_users(passengers,'passenger')
+    vehicles = create_vehicles(drivers)
+    locations = create_locations(locations)
+    rides = create_rides(vehicles,locations,rides,prebooked=False)
+    bookings = create_bookings(rides,passengers,bookings)
+    sync_ride_search_index(full=True)
+    return {
+        "drivers": len(drivers), "passengers": len(passengers), "locations": len(locations),
+        "rides": len(rides), "bookings": len(bookings),
+    }
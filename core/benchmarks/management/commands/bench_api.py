@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import SCENARIOS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Load-test the ride/booking/token API in-process or against --base-url and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios',nargs='+',choices=list(SCENARIOS),default=list(SCENARIOS))
+        parser.add_argument('--requests',type=int,default=200,help="Requests per scenario.")
+        parser.add_argument('--concurrency',type=int,default=4)
+        parser.add_argument('--base-url',help="Drive a running server (e.g. http://127.0.0.1:8000) instead of the in-process client.")
+        parser.add_argument('--output',help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmark(
+                options['scenarios'],
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                base_url=options['base_url'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        output = json.dumps(report,indent=2)
+        if options['output']:
+            with open(options['output'],'w') as f:
+                f.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.servers import TARGETS, run_server_benchmark
+
+
+class Command(BaseCommand):
+    help = "Throughput of the hot read endpoints under sync WSGI (gunicorn) vs async ASGI (uvicorn) at many concurrent connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets',nargs='+',choices=list(TARGETS),default=list(TARGETS),
+                            help="wsgi: DRF views on gunicorn; asgi-sync: the same views on uvicorn; asgi: the /async/ views on uvicorn.")
+        parser.add_argument('--connections',type=int,default=1000)
+        parser.add_argument('--duration',type=int,default=20,help="Measured seconds per target.")
+        parser.add_argument('--warmup',type=int,default=5)
+        parser.add_argument('--workers',type=int,default=2,help="Server processes.")
+        parser.add_argument('--threads',type=int,default=32,help="Threads per gunicorn worker.")
+        parser.add_argument('--port',type=int,default=8765)
+        parser.add_argument('--output',help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_server_benchmark(
+                options['targets'],
+                connections=options['connections'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+                workers=options['workers'],
+                threads=options['threads'],
+                port=options['port'],
+            )
+        except (ValueError,RuntimeError) as e:
+            raise CommandError(e)
+        output = json.dumps(report,indent=2)
+        if options['output']:
+            with open(options['output'],'w') as f:
+                f.write(output)
+        self.stdout.write(output)
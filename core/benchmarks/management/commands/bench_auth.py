@@ -0,0 +1,72 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from benchmarks.fixtures import create_dataset
+from benchmarks.runner import access_token, in_process_side_effects
+from benchmarks.stats import Rollback, measure, summarize
+from users.models import User
+
+# (name, path, role of the caller) on RideViewset, BookingViewSet and ProfileViewset
+ENDPOINTS = [
+    ('ride_list','/ride/','passenger'),
+    ('ride_my_rides','/ride/my_rides/','driver'),
+    ('booking_list','/bookings/','passenger'),
+    ('booking_my_bookings','/bookings/my_bookings/','passenger'),
+    ('profile_list','/user/profile/','passenger'),
+    ('driver_profile_list','/user/driver-profile/','driver'),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare queries per request with row-loading JWT auth against claims-based tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests',type=int,default=200,help="Requests per endpoint and token kind.")
+        parser.add_argument('--rides',type=int,default=2000)
+        parser.add_argument('--bookings',type=int,default=5000)
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), in_process_side_effects():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write("Generating dataset...")
+        create_dataset(drivers=50,passengers=500,locations=100,rides=options['rides'],bookings=options['bookings'])
+        users = {
+            role: list(User.objects.filter(email__startswith='bench-',role=role,profile__isnull=False)[:50])
+            for role in ('driver','passenger')
+        }
+        tokens = {
+            # Plain simplejwt tokens carry no claims, so every request loads the user row
+            'user_row': {user.id: str(RefreshToken.for_user(user).access_token) for group in users.values() for user in group},
+            'claims': {user.id: access_token(user) for group in users.values() for user in group},
+        }
+
+        client = Client()
+        report = {}
+        for name, path, role in ENDPOINTS:
+            callers = random.choices(users[role],k=options['requests'])
+            report[name] = {kind: self.bench(client,path,callers,issued) for kind, issued in tokens.items()}
+        return report
+
+    def bench(self, client, path, callers, tokens):
+        latencies, counts = [], []
+        for user in callers:
+            with measure() as result:
+                response = client.get(path,HTTP_AUTHORIZATION=f"Bearer {tokens[user.id]}")
+            assert response.status_code == 200, (path,response.status_code)
+            latencies.append(result['ms'])
+            counts.append(result['queries'])
+        return summarize(latencies,counts)
@@ -0,0 +1,105 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import localtime
+from rest_framework import serializers
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import Rollback, measure, summarize
+from bookings.cards import fill_card
+from bookings.models import Booking
+from bookings.serializers import BookingSerializer
+from users.models import Profile
+
+
+class LegacyBookingSerializer(serializers.ModelSerializer):
+    # BookingSerializer as it was before the card columns: display fields built per row from joins
+    passenger_display = serializers.SerializerMethodField()
+    ride_display = serializers.SerializerMethodField()
+    date = serializers.SerializerMethodField()
+    time = serializers.SerializerMethodField()
+
+    def get_passenger_display(self,obj):
+        return f"{obj.passenger.profile.first_name} {obj.passenger.profile.last_name}"
+
+    def get_ride_display(self,obj):
+        return f"Trip from {obj.ride.source} to {obj.ride.destination}"
+
+    def get_date(self,obj):
+        return localtime(obj.ride.start_time).date()
+
+    def get_time(self,obj):
+        return localtime(obj.ride.start_time).time().strftime("%I:%M %p")
+
+    class Meta:
+        model = Booking
+        fields = BookingSerializer.Meta.fields
+
+
+class Command(BaseCommand):
+    help = "Render a passenger's booking list from the booking card columns vs the ride/profile joins."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings',type=int,default=10000,help="Bookings of the one passenger.")
+        parser.add_argument('--pages',type=int,default=200,help="my_bookings pages to time per variant.")
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write(f"Generating {options['bookings']} bookings for one passenger...")
+        passenger = create_users(1,'passenger')[0]
+        profile = Profile.objects.get(user=passenger)
+        rides = create_rides(create_vehicles(create_users(50,'driver')),create_locations(100),options['bookings'],prebooked=False,stops=2)
+        Booking.objects.bulk_create([
+            fill_card(Booking(
+                passenger=passenger,ride=ride,boarding_point=ride.boarding_points[0],dropping_point=ride.dropping_points[0],
+                seats_booked=1,status=Booking.BookingStatus.CONFIRMED
+            ),ride,profile)
+            for ride in rides
+        ],batch_size=5000)
+
+        mine = Booking.objects.filter(passenger=passenger)
+        # The list as it was served before: joined, per-row display methods
+        legacy = mine.select_related('ride__source','ride__destination','passenger__profile')
+        variants = {"before": (legacy,LegacyBookingSerializer),"after": (mine,BookingSerializer)}
+        report = {"bookings": len(rides)}
+        for name, (queryset, serializer) in variants.items():
+            report[name] = {
+                "page": self.bench_pages(queryset,serializer,options['pages']),
+                "full_list": self.bench(lambda: serializer(queryset.order_by('-id'),many=True).data,3),
+            }
+        return report
+
+    def bench_pages(self, queryset, serializer, pages):
+        # my_bookings walks newest first by id (core.pagination.IdCursorPagination)
+        size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        state = {"last": None}
+
+        def page():
+            rows = queryset if state["last"] is None else queryset.filter(id__lt=state["last"])
+            data = serializer(rows.order_by('-id')[:size],many=True).data
+            state["last"] = data[-1]['id'] if len(data) == size else None
+            return data
+        return self.bench(page,pages)
+
+    def bench(self, render, repeat):
+        latencies, counts, rows = [], [], 0
+        for _ in range(repeat):
+            with measure() as result:
+                rows += len(render())
+            latencies.append(result['ms'])
+            counts.append(result['queries'])
+        summary = summarize(latencies,counts)
+        summary['rows_per_request'] = round(rows / repeat,2)
+        return summary
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import compare_reports
+
+
+class Command(BaseCommand):
+    help = "Compare two bench_api reports and fail when the current one regressed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--tolerance',type=float,default=0.10,help="Allowed relative slowdown (0.10 = 10%%).")
+
+    def handle(self, *args, **options):
+        reports = []
+        for path in (options['baseline'],options['current']):
+            with open(path) as f:
+                reports.append(json.load(f))
+        regressions, rows = compare_reports(*reports,tolerance=options['tolerance'])
+
+        self.stdout.write(f"{'scenario':<20}{'p95 ms':>20}{'rps':>20}{'queries':>16}")
+        for name, old, new in rows:
+            self.stdout.write(
+                f"{name:<20}{old['p95_ms']:>9} -> {new['p95_ms']:<8}"
+                f"{old.get('throughput_rps',0):>9} -> {new.get('throughput_rps',0):<8}"
+                f"{old.get('queries_per_request',0):>6} -> {new.get('queries_per_request',0):<6}"
+            )
+        if regressions:
+            raise CommandError("Regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions."))
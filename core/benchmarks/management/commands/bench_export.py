@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import Rollback
+from bookings.models import Booking, Payment
+from exports.datasets import CHUNK_SIZE, DATASETS
+from exports.formats import FORMATS, pyarrow, stream_export
+
+
+def rss_mib():
+    # Resident set size right now (Linux only), unlike ru_maxrss which only grows
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Export throughput and memory for every format over a generated bookings table (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings',type=int,default=10_000_000)
+        parser.add_argument('--passengers',type=int,default=1000,help="Bookings per ride at most, one per passenger.")
+        parser.add_argument('--datasets',nargs='+',choices=list(DATASETS),default=['bookings','payments'])
+        parser.add_argument('--formats',nargs='+',choices=list(FORMATS),default=list(FORMATS))
+        parser.add_argument('--chunk-size',type=int,default=CHUNK_SIZE)
+        parser.add_argument('--keep',action='store_true',help="Keep the generated rows.")
+
+    def handle(self, *args, **options):
+        formats = [name for name in options['formats'] if FORMATS[name].requires != 'pyarrow' or pyarrow]
+        report = {"vendor": connection.vendor,"bookings": options['bookings'],"chunk_size": options['chunk_size']}
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.generate(options['bookings'],options['passengers'])
+                report["generate_s"] = round(time.perf_counter() - started,1)
+                report["exports"] = {
+                    f"{name}.{file_format}": self.export(name,file_format,options['chunk_size'])
+                    for name in options['datasets']
+                    for file_format in formats
+                }
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def generate(self, count, passenger_count):
+        # Booking k is passenger k % P on ride k // P, so (passenger, ride)
+        # pairs never repeat and no per-row lookups are needed
+        passengers = [user.id for user in create_users(min(count,passenger_count),'passenger')]
+        vehicles = create_vehicles(create_users(10,'driver'))
+        rides = [ride.id for ride in create_rides(vehicles,create_locations(20),-(-count // len(passengers)),prebooked=False)]
+        for offset in range(0,count,CHUNK_SIZE):
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    passenger_id=passengers[k % len(passengers)],
+                    ride_id=rides[k // len(passengers)],
+                    boarding_point='Benchmark boarding',
+                    dropping_point='Benchmark dropping',
+                    seats_booked=1,
+                    status=Booking.BookingStatus.CONFIRMED,
+                )
+                for k in range(offset,min(offset + CHUNK_SIZE,count))
+            ])
+            Payment.objects.bulk_create([
+                Payment(booking_id=booking.id,amount=250,status=Payment.PaymentStatus.SUCCESS)
+                for booking in bookings
+            ])
+
+    def export(self, name, file_format, chunk_size):
+        stats, size, peak = {}, 0, 0.0
+        baseline = rss_mib()
+        started = time.perf_counter()
+        for chunk in stream_export(DATASETS[name],file_format,chunk_size=chunk_size,stats=stats):
+            size += len(chunk)
+            if baseline is not None:
+                peak = max(peak,rss_mib() - baseline)
+        elapsed = time.perf_counter() - started
+        return {
+            "rows": stats['rows'],
+            "mib": round(size / 2**20,1),
+            "seconds": round(elapsed,2),
+            "rows_per_s": round(stats['rows'] / elapsed),
+            "mib_per_s": round(size / 2**20 / elapsed,1),
+            "rss_growth_mib": round(peak,1) if baseline is not None else None,
+        }
@@ -0,0 +1,66 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.fixtures import CITIES, PLACES, create_locations
+from benchmarks.stats import Rollback, measure, summarize
+from rides.locations import autocomplete
+
+SYLLABLES = ['ka','ra','shi','na','pur','wa','di','gaon','ko','le','ma','ha','vi','ne','sa','ta','ba','lo','dha','ni']
+
+
+def place_name(i):
+    word = "".join(random.choice(SYLLABLES) for _ in range(random.randint(2,4))).title()
+    city = CITIES[i % len(CITIES)][0]
+    return f"{word} {random.choice(PLACES)} {i}, {city}"
+
+
+def typo(name):
+    # Swap two neighbouring letters of the first word
+    word, _, rest = name.partition(' ')
+    if len(word) < 4:
+        return name
+    i = random.randrange(1,len(word) - 2)
+    return f"{word[:i]}{word[i+1]}{word[i]}{word[i+2:]} {rest}"
+
+
+class Command(BaseCommand):
+    help = "Measure /location/autocomplete latency for prefix and misspelled queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations',type=int,default=100000)
+        parser.add_argument('--requests',type=int,default=500)
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write(f"Generating {options['locations']} locations...")
+        names = [place_name(i) for i in range(options['locations'])]
+        create_locations(len(names),names=names)
+        samples = random.sample(names,min(options['requests'],len(names)))
+
+        report = {"locations": len(names)}
+        for kind, queries in (
+            ('prefix',[name[:random.randint(3,8)] for name in samples]),
+            ('full_name',samples),
+            ('misspelled',[typo(name) for name in samples]),
+        ):
+            latencies, counts, hits = [], [], 0
+            for query in queries:
+                with measure() as result:
+                    hits += bool(autocomplete(query))
+                latencies.append(result['ms'])
+                counts.append(result['queries'])
+            report[kind] = {**summarize(latencies,counts),"hit_ratio": round(hits / len(queries),3)}
+        return report
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.test import override_settings
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from bookings import inventory, ledger
+from bookings.models import Booking, Payment
+from bookings.serializers import BookingSerializer
+from rides.models import Location, Ride
+
+User = get_user_model()
+
+
+def legacy_book(ride_id, passenger, seats):
+    # The booking transaction as it was before the guarded UPDATE: ride row
+    # locked for the whole transaction, booking and payment written twice.
+    with transaction.atomic():
+        ride = Ride.objects.select_for_update().get(id=ride_id)
+        if ride.seats_available < seats:
+            return False
+        booking = Booking.objects.create(passenger=passenger,ride=ride,boarding_point='A',dropping_point='B',seats_booked=seats)
+        payment = Payment.objects.create(booking=booking,amount=ride.fare,status=Payment.PaymentStatus.PENDING)
+        payment.status = Payment.PaymentStatus.SUCCESS
+        payment.save()
+        booking.status = Booking.BookingStatus.CONFIRMED
+        booking.save()
+        ride.seats_booked = F('seats_booked') + seats
+        ride.save()
+    return True
+
+
+def guarded_book(ride_id, passenger, seats):
+    ride = Ride.objects.get(id=ride_id)
+    try:
+        BookingSerializer().create({
+            'passenger': passenger, 'ride': ride, 'boarding_point': 'A',
+            'dropping_point': 'B', 'seats_booked': seats, 'board_stop': 0, 'drop_stop': 1,
+        })
+    except Exception as e:
+        if isinstance(e,OperationalError):
+            raise
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = "Race N threads booking one hot ride: legacy row lock, guarded UPDATE, guarded UPDATE behind the Redis inventory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads',type=int,default=16)
+        parser.add_argument('--bookings',type=int,default=400,help="Booking attempts per strategy.")
+        parser.add_argument('--seats',type=int,default=300,help="Seats offered by the hot ride.")
+        parser.add_argument('--fake-redis',action='store_true',help="Use an in-process fakeredis server instead of REDIS_URL.")
+
+    def handle(self, *args, **options):
+        drivers = create_users(1,'driver')
+        vehicles = create_vehicles(drivers)
+        locations = create_locations(2)
+        passengers = create_users(options['bookings'],'passenger')
+        report = {}
+        try:
+            for name, book, use_inventory in (
+                ('select_for_update',legacy_book,False),
+                ('guarded_update',guarded_book,False),
+                ('guarded_update_redis_inventory',guarded_book,True),
+            ):
+                ride = create_rides(vehicles,locations,1,prebooked=False)[0]
+                Ride.objects.filter(id=ride.id).update(seats_offered=options['seats'],seats_booked=0)
+                with ExitStack() as stack:
+                    stack.enter_context(override_settings(SEAT_INVENTORY_ENABLED=use_inventory))
+                    if use_inventory and options['fake_redis']:
+                        import fakeredis
+                        stack.enter_context(mock.patch.object(inventory,'get_redis',return_value=fakeredis.FakeRedis()))
+                    report[name] = self.race(ride.id,passengers,book,options['threads'])
+        finally:
+            Ride.objects.filter(vehicle__in=vehicles).delete()
+            User.objects.filter(id__in=[user.id for user in drivers + passengers]).delete()
+            Location.objects.filter(id__in=[location.id for location in locations]).delete()
+        self.stdout.write(json.dumps({"vendor": connection.vendor, **report},indent=2))
+
+    def race(self, ride_id, passengers, book, thread_count):
+        pending = list(passengers)
+        lock = threading.Lock()
+        outcome = {"confirmed": 0, "rejected": 0, "lock_retries": 0}
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        passenger = pending.pop()
+                    while True:
+                        try:
+                            ok = book(ride_id,passenger,1)
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention instead of blocking
+                            with lock:
+                                outcome["lock_retries"] += 1
+                            time.sleep(0.001)
+                    with lock:
+                        outcome["confirmed" if ok else "rejected"] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        ride = Ride.objects.get(id=ride_id)
+        booked = Booking.objects.filter(ride_id=ride_id,status=Booking.BookingStatus.CONFIRMED).aggregate(total=Sum('seats_booked'))['total'] or 0
+        ledger_seats = ledger.seats_booked([ride_id])[ride_id]
+        outcome.update({
+            "seats_offered": ride.seats_offered,
+            "seats_booked": ride.seats_booked,
+            "confirmed_booking_seats": booked,
+            "ledger_seats": ledger_seats,
+            "overbooked": ride.seats_booked > ride.seats_offered or booked != ride.seats_booked,
+            # legacy_book predates the ledger and doesn't write it
+            "ledger_in_step": ledger_seats == ride.seats_booked,
+            "elapsed_s": round(elapsed,3),
+            "bookings_per_s": round(len(passengers) / elapsed,2),
+        })
+        return outcome
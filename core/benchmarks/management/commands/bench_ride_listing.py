@@ -0,0 +1,65 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import localtime
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import Rollback, measure, summarize
+from rides.filters import RideFilter, RideSearchIndexFilter
+from rides.models import Ride, RideSearchIndex
+from rides.search_index import sync_ride_search_index
+from rides.serializers import RideSearchSerializer, RideSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the open-ride listing on the Ride joins against RideSearchIndex."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides',type=int,default=100000)
+        parser.add_argument('--drivers',type=int,default=2000)
+        parser.add_argument('--locations',type=int,default=500)
+        parser.add_argument('--requests',type=int,default=200)
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write(f"Generating {options['rides']} open rides...")
+        drivers = create_users(options['drivers'],'driver')
+        vehicles = create_vehicles(drivers)
+        locations = create_locations(options['locations'])
+        rides = create_rides(vehicles,locations,options['rides'])
+        sync_ride_search_index(full=True)
+
+        samples = random.sample(rides,min(options['requests'],len(rides)))
+        queries = [{
+            'source': ride.source.name,
+            'date': localtime(ride.start_time).date().isoformat(),
+        } for ride in samples]
+
+        # Listing as it was served before: Ride joins + nested serializers
+        legacy_qs = Ride.objects.select_related('driver__profile','vehicle__model__make').filter(status=Ride.RideStatus.OPEN)
+        before = self.bench(queries,lambda params: RideSerializer(RideFilter(params,queryset=legacy_qs).qs,many=True).data)
+        after = self.bench(queries,lambda params: RideSearchSerializer(RideSearchIndexFilter(params,queryset=RideSearchIndex.objects.all()).qs,many=True).data)
+        return {"open_rides": len(rides), "before": before, "after": after}
+
+    def bench(self, queries, render):
+        latencies, counts, rows = [], [], 0
+        for params in queries:
+            with measure() as result:
+                rows += len(render(params))
+            latencies.append(result['ms'])
+            counts.append(result['queries'])
+        summary = summarize(latencies,counts)
+        summary['rows_per_request'] = round(rows / len(queries),2) if queries else 0
+        return summary
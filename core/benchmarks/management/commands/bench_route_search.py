@@ -0,0 +1,77 @@
+import json
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import Rollback, measure, summarize
+from rides.models import Ride
+from rides.names import canonical_location_name
+from rides.stops import rides_through
+
+
+def json_scan(board_at, drop_at, departs_after):
+    # Without the stop index: read every candidate ride's JSON lists
+    board_key, drop_key = canonical_location_name(board_at), canonical_location_name(drop_at)
+    rides = Ride.objects.filter(status=Ride.RideStatus.OPEN,start_time__gte=departs_after).values_list('id','boarding_points','dropping_points')
+    return {
+        ride_id for ride_id, boarding_points, dropping_points in rides.iterator(chunk_size=5000)
+        if board_key in {canonical_location_name(name) for name in boarding_points}
+        and drop_key in {canonical_location_name(name) for name in dropping_points}
+    }
+
+
+def stop_index(board_at, drop_at, departs_after):
+    return set(Ride.objects.filter(
+        status=Ride.RideStatus.OPEN,start_time__gte=departs_after,pk__in=rides_through(board_at,drop_at)
+    ).values_list('id',flat=True))
+
+
+class Command(BaseCommand):
+    help = "Route search (board at A, drop at B, departing after T): JSON scan vs the ride stop index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides',type=int,default=100000)
+        parser.add_argument('--stops',type=int,default=8,help="Average stops per ride.")
+        parser.add_argument('--locations',type=int,default=300)
+        parser.add_argument('--queries',type=int,default=30)
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        report = {}
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write("Generating rides...")
+        vehicles = create_vehicles(create_users(50,'driver'))
+        locations = create_locations(options['locations'])
+        rides = create_rides(vehicles,locations,options['rides'],prebooked=False,stops=options['stops'])
+
+        queries = []
+        for ride in random.sample(rides,options['queries']):
+            departs_after = timezone.now() + timedelta(days=random.uniform(0,20))
+            queries.append((random.choice(ride.boarding_points),random.choice(ride.dropping_points),departs_after))
+
+        report = {"vendor": connection.vendor,"rides": len(rides),"stops_per_ride": options['stops']}
+        results = {}
+        for name, search in (('json_scan',json_scan),('stop_index',stop_index)):
+            latencies, counts, results[name] = [], [], []
+            for query in queries:
+                with measure() as result:
+                    results[name].append(search(*query))
+                latencies.append(result['ms'])
+                counts.append(result['queries'])
+            report[name] = summarize(latencies,counts)
+        report["same_results"] = results['json_scan'] == results['stop_index']
+        report["mean_matches"] = sum(map(len,results['stop_index'])) / len(queries)
+        return report
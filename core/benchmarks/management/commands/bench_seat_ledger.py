@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import summarize
+from bookings import ledger
+from bookings.models import SeatLedger, SeatSnapshot
+from rides.models import Location, Ride
+
+User = get_user_model()
+
+
+def row_update(ride_id):
+    # The guarded counter UPDATE of reservations.reserve_seats on its own
+    Ride.objects.filter(id=ride_id,seats_booked__lte=F('seats_offered') - 1).update(seats_booked=F('seats_booked') + 1,updated_at=timezone.now())
+
+
+def ledger_append(ride_id):
+    ledger.record(ride_id,1)
+
+
+class Command(BaseCommand):
+    help = "Hot-ride seat writes (counter UPDATE vs ledger append) and ledger reads by tail length."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads',type=int,default=16)
+        parser.add_argument('--writes',type=int,default=2000,help="Writes per strategy.")
+        parser.add_argument('--tails',default='0,100,1000,10000',help="Tail lengths to time reads at.")
+
+    def handle(self, *args, **options):
+        drivers = create_users(1,'driver')
+        vehicles = create_vehicles(drivers)
+        locations = create_locations(2)
+        report = {"vendor": connection.vendor}
+        try:
+            ride = create_rides(vehicles,locations,1,prebooked=False)[0]
+            Ride.objects.filter(id=ride.id).update(seats_offered=32000)
+            for name, write in (('row_update',row_update),('ledger_append',ledger_append)):
+                report[name] = self.hammer(ride.id,write,options['threads'],options['writes'])
+
+            reads = {}
+            for tail in [int(value) for value in options['tails'].split(',')]:
+                SeatLedger.objects.filter(ride=ride).delete()
+                SeatSnapshot.objects.filter(ride=ride).delete()
+                SeatLedger.objects.bulk_create([SeatLedger(ride=ride,kind='reserve',delta=1) for _ in range(tail)],batch_size=5000)
+                reads[f"tail_{tail}"] = self.time_reads(ride.id)
+            # Same ledger, rolled into the snapshot
+            ledger.take_snapshots()
+            reads[f"snapshot_of_{tail}"] = self.time_reads(ride.id)
+            report["ledger_read"] = reads
+        finally:
+            Ride.objects.filter(vehicle__in=vehicles).delete()
+            User.objects.filter(id__in=[user.id for user in drivers]).delete()
+            Location.objects.filter(id__in=[location.id for location in locations]).delete()
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def hammer(self, ride_id, write, thread_count, writes):
+        remaining = [writes]
+        lock = threading.Lock()
+        latencies, retries = [], [0]
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            write(ride_id)
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention instead of blocking
+                            with lock:
+                                retries[0] += 1
+                            time.sleep(0.001)
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {**summarize(latencies,elapsed=time.perf_counter() - started),"lock_retries": retries[0]}
+
+    def time_reads(self, ride_id, repeat=50):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            seats = ledger.seats_booked([ride_id])[ride_id]
+            latencies.append((time.perf_counter() - started) * 1000)
+        return {"seats": seats,**summarize(latencies)}
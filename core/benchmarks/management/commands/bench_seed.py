@@ -0,0 +1,41 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.fixtures import create_dataset
+from rides.models import Location, Ride, Vehicle
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Create (or --clear) the benchmark dataset used by bench_api. Rows are committed so a separate server process can see them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers',type=int,default=500)
+        parser.add_argument('--passengers',type=int,default=5000)
+        parser.add_argument('--locations',type=int,default=500)
+        parser.add_argument('--rides',type=int,default=20000)
+        parser.add_argument('--bookings',type=int,default=20000)
+        parser.add_argument('--clear',action='store_true',help="Delete the existing benchmark dataset instead.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+        with transaction.atomic():
+            counts = create_dataset(options['drivers'],options['passengers'],options['locations'],options['rides'],options['bookings'])
+        self.stdout.write(json.dumps(counts))
+
+    @transaction.atomic
+    def clear(self):
+        users = User.objects.filter(email__startswith='bench-')
+        rides = Ride.objects.filter(driver__in=users)
+        locations = list(Location.objects.filter(rides_as_source__in=rides).values_list('id',flat=True).distinct())
+        deleted = rides.delete()[0]
+        Vehicle.objects.filter(owner__in=users).delete()
+        deleted += users.delete()[0]
+        Location.objects.filter(id__in=locations,rides_as_source__isnull=True,rides_as_destination__isnull=True).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} benchmark rows."))
@@ -0,0 +1,104 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.stats import Rollback, measure, summarize
+from bookings.cards import fill_card
+from bookings.models import Booking
+from bookings.serializers import BookingSerializer
+from core.flat import compile_serializer
+from core.renderers import FastJSONRenderer
+from rides.models import Ride, RideSearchIndex
+from rides.search_index import sync_ride_search_index
+from rides.serializers import RideSearchSerializer, RideSerializer
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Serialize list pages with the DRF serializers vs their compiled flat form, and render them with JSONRenderer vs orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides',type=int,default=5000,help="Rides to generate (one booking each).")
+        parser.add_argument('--repeat',type=int,default=5,help="Full-table passes per variant.")
+        parser.add_argument('--pages',type=int,default=200,help="Page-sized requests per variant.")
+        parser.add_argument('--keep',action='store_true',help="Keep the generated data instead of rolling back.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                report = self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report,indent=2))
+
+    def run(self, options):
+        self.stderr.write(f"Generating {options['rides']} rides with one booking each...")
+        passenger = create_users(1,'passenger')[0]
+        profile = Profile.objects.get(user=passenger)
+        rides = create_rides(create_vehicles(create_users(50,'driver')),create_locations(100),options['rides'],stops=4)
+        Booking.objects.bulk_create([
+            fill_card(Booking(
+                passenger=passenger,ride=ride,boarding_point=ride.boarding_points[0],dropping_point=ride.dropping_points[-1],
+                seats_booked=1,status=Booking.BookingStatus.CONFIRMED
+            ),ride,profile)
+            for ride in rides
+        ],batch_size=5000)
+        sync_ride_search_index(full=True)
+
+        # The list views' querysets (rides.views, bookings.views)
+        variants = {
+            "ride": (RideSerializer,Ride.objects.select_related('driver__profile__driver_profile','vehicle__model__make','source','destination').order_by('id')),
+            "ride_search": (RideSearchSerializer,RideSearchIndex.objects.order_by('ride_id')),
+            "booking": (BookingSerializer,Booking.objects.order_by('id')),
+        }
+        report = {"rides": len(rides)}
+        for name, (serializer, queryset) in variants.items():
+            flat = compile_serializer(serializer)
+            # .all(): each pass runs its own query instead of reusing an evaluated queryset
+            drf = lambda rows: serializer(rows.all(),many=True).data
+            fast = lambda rows: flat.serialize(flat.values(rows.all()))
+            report[name] = {
+                "equal": fast(queryset) == drf(queryset),
+                "drf": self.bench(lambda: drf(queryset),options['repeat'],options['pages'],queryset,drf),
+                "flat": self.bench(lambda: fast(queryset),options['repeat'],options['pages'],queryset,fast),
+            }
+        report["render"] = self.bench_render(compile_serializer(RideSerializer),variants["ride"][1],options['repeat'])
+        return report
+
+    def bench(self, full, repeat, pages, queryset, serialize):
+        size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        count = queryset.count()
+        latencies, rows = [], 0
+        for _ in range(repeat):
+            with measure() as result:
+                rows += len(full())
+            latencies.append(result['ms'])
+        page_latencies = []
+        for i in range(pages):
+            offset = (i * size) % max(1,count - size)
+            with measure() as result:
+                serialize(queryset.all()[offset:offset + size])
+            page_latencies.append(result['ms'])
+        return {
+            "full_list": {**summarize(latencies),"rows_per_s": round(rows / (sum(latencies) / 1000))},
+            "page": summarize(page_latencies),
+        }
+
+    def bench_render(self, flat, queryset, repeat):
+        data = flat.serialize(flat.values(queryset))
+        renderers = {"json_renderer": JSONRenderer(),"orjson": FastJSONRenderer()}
+        report = {"equal": renderers["orjson"].render(data) == renderers["json_renderer"].render(data)}
+        for name, renderer in renderers.items():
+            latencies = []
+            for _ in range(repeat):
+                with measure() as result:
+                    content = renderer.render(data)
+                latencies.append(result['ms'])
+            report[name] = {**summarize(latencies),"bytes": len(content),"rows_per_s": round(len(data) * repeat / (sum(latencies) / 1000))}
+        return report
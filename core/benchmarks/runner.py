@@ -0,0 +1,344 @@
+import http.client
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+from django.utils.timezone import localtime
+
+from bookings.models import Booking
+from core.celery import app as celery_app
+from rides.models import Location, Ride, RideSearchIndex, Vehicle
+from users.serializers import ClaimsTokenObtainPairSerializer
+
+from .fixtures import BENCHMARK_PASSWORD, create_bookings
+from .stats import summarize
+
+User = get_user_model()
+
+# API load runner. Requests are built up front from the benchmark dataset
+# (see bench_seed), then fired by N worker threads either in-process through
+# the Django test client or over HTTP against a running server. Query counts
+# come from the Server-Timing header written by core.middleware.
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class InProcessTransport:
+    name = 'inprocess'
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {token}"} if token else {}
+        data = json.dumps(body) if body is not None else None
+        response = self.client.generic(method,path,data or '',content_type='application/json',**headers)
+        return response.status_code,response.get('Server-Timing','')
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    name = 'http'
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        data = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            # Keep-alive connection per worker, reopened once if the server dropped it
+            if self.conn is None:
+                self.conn = self.connection_class(self.netloc,timeout=30)
+            try:
+                self.conn.request(method,self.prefix + path,body=data,headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                return response.status,response.getheader('Server-Timing','')
+            except (http.client.HTTPException,ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class Request:
+    def __init__(self, method, path, body=None, token=None, expected=(200,)):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.token = token
+        self.expected = expected
+
+
+def refresh_token(user):
+    # Same claims as tokens from /api/token/
+    return ClaimsTokenObtainPairSerializer.get_token(user)
+
+
+def access_token(user):
+    return str(refresh_token(user).access_token)
+
+
+class Dataset:
+    # Benchmark rows created by bench_seed / fixtures.create_dataset
+    def __init__(self, prefix='bench'):
+        users = User.objects.filter(email__startswith=f"{prefix}-")
+        self.drivers = list(users.filter(role=User.Roles.DRIVER,vehicles__isnull=False).distinct()[:500])
+        self.passengers = list(users.filter(role=User.Roles.PASSENGER)[:2000])
+        self.rides = list(RideSearchIndex.objects.filter(driver__in=self.drivers,seats_available__gt=0).order_by('?')[:2000])
+        self.locations = list(Location.objects.filter(rides_as_source__driver__in=self.drivers).distinct()[:500])
+        if not (self.drivers and self.passengers and self.rides and len(self.locations) > 1):
+            raise ValueError("No benchmark dataset found, run bench_seed first.")
+        self.vehicles = dict(Vehicle.objects.filter(owner__in=self.drivers).values_list('owner_id','id'))
+        self.tokens = {}
+
+    def token(self, user):
+        if user.id not in self.tokens:
+            self.tokens[user.id] = access_token(user)
+        return self.tokens[user.id]
+
+
+def ride_list(data, count):
+    return [Request('GET','/ride/',token=data.token(random.choice(data.passengers))) for _ in range(count)]
+
+
+def ride_search(data, count):
+    requests = []
+    for _ in range(count):
+        ride = random.choice(data.rides)
+        params = {'source': ride.source_name,'date': localtime(ride.start_time).date().isoformat()}
+        requests.append(Request('GET',f"/ride/?{urlencode(params)}",token=data.token(random.choice(data.passengers))))
+    return requests
+
+
+def ride_search_nearby(data, count):
+    requests = []
+    for _ in range(count):
+        ride = random.choice(data.rides)
+        params = {'near_source': f"{ride.source_latitude},{ride.source_longitude}",'radius_km': 5}
+        requests.append(Request('GET',f"/ride/?{urlencode(params)}",token=data.token(random.choice(data.passengers))))
+    return requests
+
+
+def ride_create(data, count):
+    requests = []
+    base = timezone.now() + timedelta(days=90)
+    for _ in range(count):
+        driver = random.choice(data.drivers)
+        source, destination = random.sample(data.locations,2)
+        start = base + timedelta(minutes=random.randrange(365 * 24 * 60))
+        requests.append(Request('POST','/ride/',body={
+            'vehicle_id': data.vehicles[driver.id],
+            'source': source.name,
+            'destination': destination.name,
+            'boarding_points': [source.name],
+            'dropping_points': [destination.name],
+            'fare': '350.00',
+            'seats_offered': 3,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=2)).isoformat(),
+        },token=data.token(driver),expected=(201,400)))  # 400: overlaps another ride of the driver
+    return requests
+
+
+def booking_create(data, count):
+    # Passengers can book a ride only once, so pick pairs that are still free
+    taken = set(Booking.objects.filter(ride__in=[ride.ride_id for ride in data.rides]).values_list('passenger_id','ride_id'))
+    requests = []
+    while len(requests) < count:
+        ride, passenger = random.choice(data.rides), random.choice(data.passengers)
+        if (passenger.id,ride.ride_id) in taken:
+            continue
+        taken.add((passenger.id,ride.ride_id))
+        requests.append(Request('POST','/bookings/',body={
+            'ride': ride.ride_id,
+            'boarding_point': ride.boarding_points[0],
+            'dropping_point': ride.dropping_points[0],
+            'seats_booked': 1,
+        },token=data.token(passenger),expected=(201,400)))  # 400: sold out meanwhile
+    return requests
+
+
+def booking_cancel(data, count):
+    # Every cancel needs its own confirmed booking, created up front
+    rides = list(Ride.objects.filter(id__in=[ride.ride_id for ride in data.rides]))
+    bookings = create_bookings(rides,data.passengers,count)
+    passengers = {passenger.id: passenger for passenger in data.passengers}
+    return [
+        Request('POST',f"/bookings/{booking.id}/cancel_booking/",token=data.token(passengers[booking.passenger_id]))
+        for booking in bookings
+    ]
+
+
+def token_obtain(data, count):
+    return [
+        Request('POST','/api/token/',body={'email': user.email,'password': BENCHMARK_PASSWORD})
+        for user in random.choices(data.passengers,k=count)
+    ]
+
+
+def token_refresh(data, count):
+    return [
+        Request('POST','/api/token/refresh/',body={'refresh': str(refresh_token(user))})
+        for user in random.choices(data.passengers,k=count)
+    ]
+
+
+SCENARIOS = {
+    'ride_list': ride_list,
+    'ride_search': ride_search,
+    'ride_search_nearby': ride_search_nearby,
+    'ride_create': ride_create,
+    'booking_create': booking_create,
+    'booking_cancel': booking_cancel,
+    'token_obtain': token_obtain,
+    'token_refresh': token_refresh,
+}
+
+
+@contextmanager
+def in_process_side_effects():
+    # Celery tasks run inline and mail stays in memory, so the numbers are the
+    # API's own and nothing needs a broker or SMTP server.
+    eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,'testserver'],
+        ):
+            yield
+    finally:
+        celery_app.conf.task_always_eager = eager
+
+
+def run_scenario(requests, make_transport, concurrency):
+    pending = list(reversed(requests))
+    lock = threading.Lock()
+    latencies, queries, statuses, unexpected = [], [], Counter(), 0
+
+    def worker(close=True):
+        nonlocal unexpected
+        transport = make_transport()
+        try:
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    request = pending.pop()
+                started = time.perf_counter()
+                try:
+                    status, timing = transport.request(request.method,request.path,request.body,request.token)
+                except (OSError,http.client.HTTPException):
+                    status, timing = 0, ''
+                elapsed = (time.perf_counter() - started) * 1000
+                match = SERVER_TIMING_QUERIES.search(timing)
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+                    unexpected += status not in request.expected
+                    if match:
+                        queries.append(int(match.group(1)))
+        finally:
+            if close:
+                transport.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        # Same thread and connection as the caller, so data inside an open
+        # transaction (tests) is visible
+        worker(close=False)
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies,queries or None,elapsed)
+    summary['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+    summary['errors'] = unexpected
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git','rev-parse','--short','HEAD'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scenarios, requests=200, concurrency=4, base_url=None, prefix='bench'):
+    data = Dataset(prefix)
+    if base_url:
+        make_transport = lambda: HttpTransport(base_url)
+        context = nullcontext()
+    else:
+        make_transport = InProcessTransport
+        context = in_process_side_effects()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": timezone.now().isoformat(),
+            "transport": 'http' if base_url else 'inprocess',
+            "base_url": base_url,
+            "concurrency": concurrency,
+            "requests_per_scenario": requests,
+            "database": connection.vendor,
+        },
+        "scenarios": {},
+    }
+    with context:
+        for name in scenarios:
+            prepared = SCENARIOS[name](data,requests)
+            report["scenarios"][name] = run_scenario(prepared,make_transport,concurrency)
+    return report
+
+
+def compare_reports(baseline, current, tolerance=0.10, min_ms=1.0):
+    # Regressions: slower p95 (beyond tolerance and min_ms), lower throughput,
+    # more queries per request or more unexpected responses
+    regressions, rows = [], []
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        checks = []
+        if new["p95_ms"] > old["p95_ms"] * (1 + tolerance) and new["p95_ms"] - old["p95_ms"] > min_ms:
+            checks.append(f"p95 {old['p95_ms']} -> {new['p95_ms']} ms")
+        if old.get("throughput_rps") and new.get("throughput_rps",0) < old["throughput_rps"] * (1 - tolerance):
+            checks.append(f"throughput {old['throughput_rps']} -> {new.get('throughput_rps',0)} rps")
+        if new.get("queries_per_request",0) > old.get("queries_per_request",0):
+            checks.append(f"queries {old.get('queries_per_request',0)} -> {new['queries_per_request']} per request")
+        if new.get("errors",0) > old.get("errors",0):
+            checks.append(f"errors {old.get('errors',0)} -> {new['errors']}")
+        rows.append((name,old,new))
+        regressions += [f"{name}: {check}" for check in checks]
+    return regressions, rows
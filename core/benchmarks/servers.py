@@ -0,0 +1,166 @@
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.timezone import localtime
+
+from .runner import Dataset, git_revision
+from .stats import summarize
+
+# Sync WSGI vs async ASGI under many concurrent keep-alive connections. Each
+# target is started as a real server process on the benchmark database, then
+# an asyncio load generator holds --connections connections open and cycles
+# through the hot read endpoints for a fixed time.
+
+# Deployment profiles, also documented in the README. {workers}, {threads},
+# {host} and {port} are filled in per run.
+SERVER_PROFILES = {
+    # Classic deployment: a thread per in-flight request
+    'wsgi': ['gunicorn','core.wsgi:application','--worker-class','gthread','--workers','{workers}','--threads','{threads}',
+             '--bind','{host}:{port}','--backlog','2048','--keep-alive','30'],
+    # Event loop per worker; Django has no lifespan support
+    'asgi': ['uvicorn','core.asgi:application','--workers','{workers}','--host','{host}','--port','{port}',
+             '--backlog','2048','--no-access-log','--lifespan','off','--timeout-keep-alive','30'],
+}
+# target: (server profile, path prefix of the endpoints)
+TARGETS = {
+    'wsgi': ('wsgi',''),
+    'asgi-sync': ('asgi',''),
+    'asgi': ('asgi','/async'),
+}
+
+
+def read_paths(data, count):
+    # (path, token) pairs over list, search, detail, my_bookings and my_rides
+    paths = []
+    for _ in range(count):
+        ride, passenger, driver = random.choice(data.rides), random.choice(data.passengers), random.choice(data.drivers)
+        search = urlencode({'source': ride.source_name,'date': localtime(ride.start_time).date().isoformat()})
+        paths += [
+            ('/ride/',data.token(passenger)),
+            (f"/ride/?{search}",data.token(passenger)),
+            (f"/ride/{ride.ride_id}/",data.token(passenger)),
+            ('/bookings/my_bookings/',data.token(passenger)),
+            ('/ride/my_rides/',data.token(driver)),
+        ]
+    random.shuffle(paths)
+    return paths
+
+
+def start_server(profile, host, port, workers, threads):
+    command = [part.format(workers=workers,threads=threads,host=host,port=port) for part in SERVER_PROFILES[profile]]
+    process = subprocess.Popen(command,cwd=settings.BASE_DIR,stdout=subprocess.DEVNULL,stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command[0]} exited: {process.stderr.read().decode()[-2000:]}")
+        try:
+            socket.create_connection((host,port),timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{command[0]} did not start listening on {host}:{port}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length, chunked = 0, False
+    while (line := await reader.readline()) not in (b'\r\n',b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while size := int((await reader.readline()).split(b';')[0],16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def drive(host, port, requests, connections, duration, warmup):
+    # Every connection sends its next request as soon as the previous answer is
+    # read; only responses finished inside the measured window are counted
+    latencies, statuses = [], Counter()
+    started = time.perf_counter()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+
+    async def connection_loop(offset):
+        position, reader, writer = offset, None, None
+        while time.perf_counter() < stop_at:
+            path, token = requests[position % len(requests)]
+            position += connections
+            sent = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host,port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\nAccept: application/json\r\n\r\n".encode())
+                status = await asyncio.wait_for(read_response(reader),timeout=60)
+            except (OSError,ValueError,IndexError,asyncio.IncompleteReadError,asyncio.TimeoutError):
+                status = 0
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+            finished = time.perf_counter()
+            if measure_from <= finished <= stop_at:
+                latencies.append((finished - sent) * 1000)
+                statuses[status] += 1
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(connection_loop(offset) for offset in range(connections)))
+    summary = summarize(latencies,elapsed=duration)
+    summary['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+    summary['errors'] = sum(count for status, count in statuses.items() if not 200 <= status < 400)
+    return summary
+
+
+def run_server_benchmark(targets, connections=1000, duration=20, warmup=5, workers=2, threads=32,
+                         host='127.0.0.1', port=8765, prefix='bench'):
+    data = Dataset(prefix)
+    paths = read_paths(data,2000)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": timezone.now().isoformat(),
+            "connections": connections,
+            "duration_s": duration,
+            "workers": workers,
+            "wsgi_threads": threads,
+            "database": connection.vendor,
+            "python": sys.version.split()[0],
+        },
+        "targets": {},
+    }
+    # The servers open their own connections; SQLite must not see a write lock from here
+    connection.close()
+    for name in targets:
+        profile, path_prefix = TARGETS[name]
+        requests = [(path_prefix + path,token) for path, token in paths]
+        process = start_server(profile,host,port,workers,threads)
+        try:
+            report["targets"][name] = asyncio.run(drive(host,port,requests,connections,duration,warmup))
+        finally:
+            stop_server(process)
+    return report
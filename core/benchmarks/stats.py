@@ -0,0 +1,45 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies_ms, queries=None, elapsed=None):
+    summary = {
+        "requests": len(latencies_ms),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3) if latencies_ms else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+    }
+    if queries is not None:
+        summary["queries_per_request"] = round(statistics.fmean(queries), 2) if queries else 0.0
+    if elapsed:
+        summary["throughput_rps"] = round(len(latencies_ms) / elapsed, 2)
+    return summary
+
+
+@contextmanager
+def measure():
+    # Yields a dict filled with elapsed milliseconds and the number of queries run
+    result = {}
+    reset_queries()  # a full query log would make every count read 0
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        yield result
+        result["ms"] = (time.perf_counter() - started) * 1000
+    result["queries"] = len(captured)
+
+
+class Rollback(Exception):
+    pass
@@ -0,0 +1,26 @@
+from django.test import TestCase
+
+from .fixtures import create_dataset
+from .runner import SCENARIOS, compare_reports, run_benchmark
+
+# Create your tests here.
+
+class BenchmarkRunnerTests(TestCase):
+    def test_every_scenario_runs_in_process(self):
+        create_dataset(drivers=3,passengers=10,locations=6,rides=20,bookings=10)
+
+        report = run_benchmark(list(SCENARIOS),requests=2,concurrency=1)
+
+        self.assertEqual(set(report["scenarios"]),set(SCENARIOS))
+        for name, summary in report["scenarios"].items():
+            self.assertEqual(summary["requests"],2,name)
+            self.assertEqual(summary["errors"],0,f"{name}: {summary['statuses']}")
+            self.assertIn("queries_per_request",summary)
+
+    def test_compare_flags_slower_and_chattier_scenarios(self):
+        baseline = {"scenarios": {"ride_list": {"p95_ms": 10.0,"throughput_rps": 100,"queries_per_request": 1,"errors": 0}}}
+        current = {"scenarios": {"ride_list": {"p95_ms": 30.0,"throughput_rps": 100,"queries_per_request": 3,"errors": 0}}}
+
+        regressions, _ = compare_reports(baseline,current)
+        self.assertEqual(len(regressions),2)
+        self.assertEqual(compare_reports(baseline,baseline)[0],[])
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Booking, Payment
+from .models import Booking, Payment, SeatLedger, SeatSnapshot
 
 
 # Register your models here.
@@ -10,4 +10,15 @@ class BookingAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ['id','booking','amount','status','transaction_id','payment_method','created_at','updated_at']
\ No newline at end of file
+    list_display = ['id','booking','amount','status','transaction_id','payment_method','created_at','updated_at']
+
+@admin.register(SeatLedger)
+class SeatLedgerAdmin(admin.ModelAdmin):
+    list_display = ['id','ride','booking','kind','delta','created_at']
+    list_filter = ['kind']
+    raw_id_fields = ['ride','booking']
+
+@admin.register(SeatSnapshot)
+class SeatSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['ride','seats_booked','last_event_id','taken_at']
+    raw_id_fields = ['ride']
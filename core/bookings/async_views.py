@@ -0,0 +1,21 @@
+from core.async_views import AsyncAPIView
+from core.pagination import IdCursorPagination
+
+from .serializers import BookingSerializer
+from .views import BookingViewSet
+
+# Async variant of BookingViewSet.my_bookings (see core.async_views)
+
+
+class AsyncMyBookingsView(AsyncAPIView):
+    serializer_class = BookingSerializer
+    pagination_class = IdCursorPagination
+
+    async def get(self, request):
+        flat = self.flat_serializer
+        bookings = await self.paginate_queryset(flat.values(BookingViewSet.queryset.filter(passenger=self.request.user)))
+        return self.render({
+            "my-bookings":flat.serialize(bookings),
+            "next":self.paginator.get_next_link(),
+            "previous":self.paginator.get_previous_link()
+        })
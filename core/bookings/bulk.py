@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from rides.models import Ride
+from rides.segments import ride_leg
+
+from . import inventory
+from .cards import fill_card
+from .models import Booking, Payment
+from .reservations import leg_seats_available, reserve_seats, tracked_leg
+
+# Many bookings of one passenger in a single transaction: the rides are locked
+# in id order (two bulk requests over the same rides can't deadlock), seats are
+# allocated against the locked rows, every ride gets one guarded UPDATE for its
+# whole delta and the Booking/Payment rows are bulk inserted.
+
+BULK_BOOKING_LIMIT = 50
+
+
+def book_many(passenger, items):
+    # items: validated dicts (ride id, boarding/dropping point, seats_booked).
+    # Returns (item index -> Booking, item index -> error message).
+    errors = {}
+    if not items:
+        return {}, errors
+    ride_ids = sorted({item['ride'] for item in items})
+    with transaction.atomic():
+        rides = {ride.id: ride for ride in Ride.objects.select_for_update(of=('self',)).select_related('source','destination').filter(id__in=ride_ids).order_by('id')}
+        booked_before = set(Booking.objects.filter(
+            passenger=passenger,ride__in=ride_ids,status=Booking.BookingStatus.CONFIRMED
+        ).values_list('ride_id',flat=True))
+
+        allocated, accepted, legs = defaultdict(int), defaultdict(list), {}
+        for index, item in enumerate(items):
+            ride = rides.get(item['ride'])
+            error = leg = None
+            if ride is None:
+                error = "Ride does not exist."
+            elif ride.status != Ride.RideStatus.OPEN:
+                error = "Ride is not open for booking."
+            elif item['boarding_point'] not in ride.boarding_points:
+                error = "Please give correct boarding point."
+            elif item['dropping_point'] not in ride.dropping_points:
+                error = "Please give correct dropping point."
+            elif (leg := ride_leg(ride.boarding_points,ride.dropping_points,item['boarding_point'],item['dropping_point'])) is None:
+                error = "Dropping point should come after the boarding point."
+            elif ride.id in booked_before or accepted[ride.id]:
+                error = "You have already booked this ride."
+            elif leg_seats_available(ride,tracked_leg(ride,*leg)) - allocated[ride.id] < item['seats_booked']:
+                error = "Not enough seats available."
+            if error:
+                errors[index] = error
+                continue
+            legs[index] = leg
+            allocated[ride.id] += item['seats_booked']
+            accepted[ride.id].append(index)
+
+        for ride_id in [ride_id for ride_id, indexes in accepted.items() if indexes]:
+            # One booking per ride and passenger, so a per-segment ride has a single leg
+            leg = tracked_leg(rides[ride_id],*legs[accepted[ride_id][0]])
+            # Can only fail if the lock was not honoured (e.g. SQLite)
+            if not reserve_seats(ride_id,allocated[ride_id],leg=leg):
+                errors.update((index,"Not enough seats available.") for index in accepted.pop(ride_id))
+
+        indexes = sorted(index for ride_indexes in accepted.values() for index in ride_indexes)
+        profile = passenger.profile if indexes else None
+        bookings = Booking.objects.bulk_create([
+            fill_card(Booking(
+                passenger = passenger,
+                ride = rides[items[index]['ride']],
+                boarding_point = items[index]['boarding_point'],
+                dropping_point = items[index]['dropping_point'],
+                seats_booked = items[index]['seats_booked'],
+                board_stop = legs[index][0],
+                drop_stop = legs[index][1],
+                status = Booking.BookingStatus.CONFIRMED
+            ),rides[items[index]['ride']],profile)
+            for index in indexes
+        ])
+        # Simulated payment success, as in BookingSerializer.create
+        Payment.objects.bulk_create([
+            Payment(booking=booking,amount=booking.ride.fare,status=Payment.PaymentStatus.SUCCESS)
+            for booking in bookings
+        ])
+        # The hot counters reload from the database on their next use
+        transaction.on_commit(lambda: inventory.forget(list(accepted)))
+    return dict(zip(indexes,bookings)), errors
@@ -0,0 +1,72 @@
+from django.db.models import Case, F, Q, Value, When
+from django.utils.timezone import localtime
+
+from rides.models import Ride
+from users.models import Profile
+
+from .models import Booking
+
+# Booking cards: the ride and passenger text BookingSerializer lists, stored on
+# the Booking row so list endpoints read one table. New bookings get theirs
+# from fill_card (bookings.signals, or the bulk insert); ride, location and
+# profile edits rewrite the affected cards with batched CASE updates.
+
+BATCH_SIZE = 500
+
+
+def ride_card(ride):
+    start = localtime(ride.start_time)
+    return {
+        "ride_display": f"Trip from {ride.source} to {ride.destination}",
+        "ride_date": start.date(),
+        "ride_time": start.time().strftime("%I:%M %p"),
+    }
+
+
+def passenger_card(profile):
+    return {"passenger_display": f"{profile.first_name} {profile.last_name}"}
+
+
+def fill_card(booking, ride, profile):
+    for field, value in {**ride_card(ride),**passenger_card(profile)}.items():
+        setattr(booking,field,value)
+    return booking
+
+
+def rewrite(key, cards):
+    # cards: key value -> card. One UPDATE per batch, each field set with
+    # CASE key WHEN .. THEN .. END like rides.tasks.increment_counters
+    if not cards:
+        return 0
+    fields = next(iter(cards.values()))
+    return Booking.objects.filter(**{f"{key}__in": list(cards)}).update(**{
+        field: Case(
+            *[When(**{key: pk},then=Value(card[field])) for pk, card in cards.items()],
+            default=F(field),
+            output_field=Booking._meta.get_field(field)
+        )
+        for field in fields
+    })
+
+
+def refresh_ride_cards(ride_ids):
+    ride_ids = list(ride_ids)
+    updated = 0
+    for i in range(0,len(ride_ids),BATCH_SIZE):
+        rides = Ride.objects.filter(id__in=ride_ids[i:i+BATCH_SIZE]).select_related('source','destination')
+        updated += rewrite('ride_id',{ride.id: ride_card(ride) for ride in rides})
+    return updated
+
+
+def refresh_location_cards(location_id):
+    ride_ids = Booking.objects.filter(Q(ride__source=location_id) | Q(ride__destination=location_id)).values_list('ride_id',flat=True).distinct()
+    return refresh_ride_cards(ride_ids)
+
+
+def refresh_passenger_cards(user_ids):
+    user_ids = list(user_ids)
+    updated = 0
+    for i in range(0,len(user_ids),BATCH_SIZE):
+        profiles = Profile.objects.filter(user_id__in=user_ids[i:i+BATCH_SIZE]).only('user_id','first_name','last_name')
+        updated += rewrite('passenger_id',{profile.user_id: passenger_card(profile) for profile in profiles})
+    return updated
@@ -0,0 +1,17 @@
+# (dedup_key, subject, body, recipients) tuples for notifications.outbox
+
+def booking_confirmation_email(booking, passenger_email):
+    return (
+        f"booking-confirmed:{booking.id}",
+        "Booking confirmation mail",
+        f"Your booking from {booking.boarding_point} to {booking.dropping_point} has been confirmed",
+        [passenger_email],
+    )
+
+def booking_cancellation_email(booking, passenger_email):
+    return (
+        f"booking-cancelled:{booking.id}",
+        "Booking cancellation mail",
+        f"Your booking from {booking.boarding_point} to {booking.dropping_point} has been cancelled.",
+        [passenger_email],
+    )
@@ -7,8 +7,8 @@ class BookingsFilter(django_filters.FilterSet):
     boarding_point = django_filters.CharFilter(field_name='boarding_point',lookup_expr='iexact')
     dropping_point = django_filters.CharFilter(field_name='dropping_point',lookup_expr='iexact')
     status = django_filters.CharFilter(field_name='status',lookup_expr='iexact')
-    date = django_filters.DateFilter(field_name='ride__start_time',lookup_expr='date')
-    date_range = django_filters.DateFromToRangeFilter(field_name='ride__start_time')
+    date = django_filters.DateFilter(field_name='ride_date')
+    date_range = django_filters.DateFromToRangeFilter(field_name='ride_date')
     class Meta:
         model = Booking
         fields = ['boarding_point','dropping_point','status','date','date_range']
\ No newline at end of file
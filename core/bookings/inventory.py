@@ -0,0 +1,176 @@
+import logging
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from core.redis_client import get_redis
+from rides.models import Ride
+
+logger = logging.getLogger(__name__)
+
+# Hot seat inventory in Redis, keyed by ride id. It is an admission cache in
+# front of the guarded UPDATE in reservations.py: sold-out rides are rejected
+# without touching the database, and the database stays the source of truth.
+# Counters only change once a booking or cancellation has committed.
+# Every function returns None when Redis is unavailable so callers fall back
+# to the database path.
+
+KEY = "ride:{}:seats_available"
+RETRY_AFTER_ERROR = 30  # seconds to skip Redis after a connection failure
+
+# Returns the seats left after adding ARGV[1] (negative to take seats), -2 when the ride is not cached
+ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -2 end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+_unavailable_until = 0
+
+
+def _client():
+    if not settings.SEAT_INVENTORY_ENABLED or time.monotonic() < _unavailable_until:
+        return None
+    return get_redis()
+
+
+def _failed(error):
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + RETRY_AFTER_ERROR
+    logger.warning(f"Seat inventory unavailable, using database only: {error}")
+
+
+def load(ride_ids):
+    # Seeds missing keys from the database; SET NX never clobbers a live counter
+    client = _client()
+    if client is None:
+        return None
+    rides = Ride.objects.filter(id__in=list(ride_ids),status=Ride.RideStatus.OPEN).values_list('id','seats_offered','seats_booked')
+    try:
+        pipe = client.pipeline(transaction=False)
+        for ride_id, offered, booked in rides:
+            pipe.set(KEY.format(ride_id),max(offered - booked,0),nx=True,ex=settings.SEAT_INVENTORY_TTL)
+        pipe.execute()
+    except RedisError as e:
+        _failed(e)
+        return None
+    return True
+
+
+def has_seats(ride_id, seats):
+    # True/False when the cache decided, None when the caller must ask the database
+    client = _client()
+    if client is None:
+        return None
+    try:
+        available = client.get(KEY.format(ride_id))
+        if available is None:
+            if load([ride_id]) is None:
+                return None
+            available = client.get(KEY.format(ride_id))
+    except RedisError as e:
+        _failed(e)
+        return None
+    if available is None:
+        # Ride is not open, let the database reject it
+        return None
+    return int(available) >= seats
+
+
+def adjust(ride_id, seats):
+    # Write-through of committed reservations (negative seats) and releases.
+    # Call it from transaction.on_commit: a rolled back booking must leave the
+    # counter alone.
+    client = _client()
+    if client is None:
+        return None
+    try:
+        left = client.eval(ADJUST_SCRIPT,1,KEY.format(ride_id),seats)
+        if left < 0 and left != -2:
+            # Took more than the cache held: it drifted, reload it next time
+            client.delete(KEY.format(ride_id))
+    except RedisError as e:
+        _failed(e)
+        return None
+    return left >= 0
+
+
+def take(ride_id, seats):
+    return adjust(ride_id,-seats)
+
+
+def release(ride_id, seats):
+    return adjust(ride_id,seats)
+
+
+def forget(ride_ids):
+    # Drops cached counters so the next reservation reloads them from the database
+    client = _client()
+    if client is None or not ride_ids:
+        return None
+    try:
+        return client.delete(*[KEY.format(ride_id) for ride_id in ride_ids])
+    except RedisError as e:
+        _failed(e)
+        return None
+
+
+def available(ride_ids):
+    # {ride_id: seats} for cached rides only
+    client = _client()
+    ride_ids = list(ride_ids)
+    if client is None or not ride_ids:
+        return {}
+    try:
+        values = client.mget([KEY.format(ride_id) for ride_id in ride_ids])
+    except RedisError as e:
+        _failed(e)
+        return {}
+    return {ride_id: int(value) for ride_id, value in zip(ride_ids,values) if value is not None}
+
+
+def repair(batch_size=500):
+    # Corrects drift between cached counters and the database and drops
+    # counters of rides that are no longer open.
+    client = _client()
+    if client is None:
+        return None
+    repaired = removed = checked = 0
+    try:
+        batch = []
+        for key in client.scan_iter(match=KEY.format('*'),count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                result = _repair_batch(client,batch)
+                repaired, removed, checked = repaired + result[0], removed + result[1], checked + len(batch)
+                batch = []
+        if batch:
+            result = _repair_batch(client,batch)
+            repaired, removed, checked = repaired + result[0], removed + result[1], checked + len(batch)
+    except RedisError as e:
+        _failed(e)
+        return None
+    logger.info(f"Seat inventory repair: {checked} checked, {repaired} repaired, {removed} removed.")
+    return {"checked": checked, "repaired": repaired, "removed": removed}
+
+
+def _repair_batch(client, keys):
+    ride_ids = [int(key.decode().split(':')[1]) for key in keys]
+    cached = dict(zip(ride_ids,client.mget(keys)))
+    rides = {
+        ride_id: max(offered - booked,0)
+        for ride_id, offered, booked in Ride.objects.filter(
+            id__in=ride_ids,status=Ride.RideStatus.OPEN
+        ).values_list('id','seats_offered','seats_booked')
+    }
+    repaired = removed = 0
+    pipe = client.pipeline(transaction=False)
+    for ride_id, value in cached.items():
+        if ride_id not in rides:
+            pipe.delete(KEY.format(ride_id))
+            removed += 1
+        elif value is not None and int(value) != rides[ride_id]:
+            pipe.set(KEY.format(ride_id),rides[ride_id],xx=True,keepttl=True)
+            repaired += 1
+    pipe.execute()
+    return repaired, removed
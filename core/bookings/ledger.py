@@ -0,0 +1,122 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.metrics import registry
+from rides.models import Ride
+from rides.segments import SegmentTree
+
+from .models import Booking, SeatLedger, SeatSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Event-sourced seat counts. reserve_seats/release_seats append a SeatLedger
+# row next to their guarded UPDATE, in the same transaction; a ride's seat
+# count is its snapshot plus the events after it, so reads cost O(tail).
+# Snapshots are rolled forward periodically, and reconcile() checks ledger,
+# Ride.seats_booked and the confirmed bookings against each other.
+
+BATCH_SIZE = 1000
+SNAPSHOT_BATCH_SIZE = 200  # rides locked per snapshot transaction
+
+registry.describe("seat_ledger_snapshots_total","counter","Ride seat snapshots rolled forward.")
+registry.describe("seat_ledger_mismatched_rides","gauge","Rides whose counter, ledger and confirmed bookings disagreed in the last reconciliation.")
+
+
+def record(ride_id, seats, booking_id=None):
+    # seats > 0 reserves, < 0 releases
+    # bulk_create skips the save() machinery; this runs on every booking
+    kind = SeatLedger.EventKind.RESERVE if seats > 0 else SeatLedger.EventKind.RELEASE
+    SeatLedger.objects.bulk_create([SeatLedger(ride_id=ride_id,booking_id=booking_id,kind=kind,delta=seats)])
+
+
+def snapshot_event_id():
+    return Coalesce(Subquery(SeatSnapshot.objects.filter(ride=OuterRef('ride')).values('last_event_id')[:1]),Value(0))
+
+
+def seats_booked(ride_ids):
+    # {ride_id: seats booked} from the ledger, for every ride asked for
+    ride_ids = list(ride_ids)
+    counts = dict.fromkeys(ride_ids,0)
+    counts.update(SeatSnapshot.objects.filter(ride_id__in=ride_ids).values_list('ride_id','seats_booked'))
+    tails = SeatLedger.objects.filter(ride_id__in=ride_ids,id__gt=snapshot_event_id()).values('ride_id').annotate(delta=Sum('delta')).order_by()
+    for tail in tails:
+        counts[tail['ride_id']] += tail['delta']
+    return counts
+
+
+def take_snapshots(batch_size=SNAPSHOT_BATCH_SIZE):
+    # Rolls the snapshot of every ride with events past it forward. Ids are
+    # handed out at insert, not at commit, so a ride's tail is only read while
+    # holding its row lock: every writer updates the Ride row before appending
+    # its event, so under the lock all of that ride's events are committed and
+    # no new one can slip in below the snapshot.
+    ride_ids = list(SeatLedger.objects.filter(id__gt=snapshot_event_id()).order_by('ride_id').values_list('ride_id',flat=True).distinct())
+    for i in range(0,len(ride_ids),batch_size):
+        with transaction.atomic():
+            locked = list(Ride.objects.select_for_update().filter(id__in=ride_ids[i:i+batch_size]).order_by('id').values_list('id',flat=True))
+            tails = list(SeatLedger.objects.filter(ride_id__in=locked,id__gt=snapshot_event_id()).values('ride_id').annotate(delta=Sum('delta'),last=Max('id')).order_by('ride_id'))
+            current = dict(SeatSnapshot.objects.filter(ride_id__in=locked).values_list('ride_id','seats_booked'))
+            SeatSnapshot.objects.bulk_create([
+                SeatSnapshot(ride_id=tail['ride_id'],seats_booked=current.get(tail['ride_id'],0) + tail['delta'],last_event_id=tail['last'])
+                for tail in tails
+            ],update_conflicts=True,unique_fields=['ride'],update_fields=['seats_booked','last_event_id','taken_at'])
+    registry.inc("seat_ledger_snapshots_total",len(ride_ids))
+    return len(ride_ids)
+
+
+def busiest_segments(states):
+    # {ride_id: seats on the busiest segment} rebuilt from the confirmed
+    # bookings of rides tracked per segment (states: {ride_id: tree state})
+    trees = {ride_id: SegmentTree(state['segments']) for ride_id, state in states.items()}
+    bookings = Booking.objects.filter(ride_id__in=list(trees),status=Booking.BookingStatus.CONFIRMED).values_list('ride_id','board_stop','drop_stop','seats_booked')
+    for ride_id, board, drop, seats in bookings:
+        tree = trees[ride_id]
+        tree.add(board or 0,tree.segments if drop is None else drop,seats)
+    return {ride_id: max(tree.busiest(),0) for ride_id, tree in trees.items()}
+
+
+def mismatches(rides):
+    # rides: [(ride_id, seats_booked, segment_seats)] -> [(ride_id, counter, ledger, bookings)]
+    # where they disagree. The ledger and the bookings count every booked
+    # seat; the counter holds the busiest segment, the same number unless
+    # the ride is tracked per segment.
+    ride_ids = [ride_id for ride_id, *_ in rides]
+    ledger = seats_booked(ride_ids)
+    booked = dict(Booking.objects.filter(
+        ride_id__in=ride_ids,status=Booking.BookingStatus.CONFIRMED
+    ).values('ride_id').annotate(total=Sum('seats_booked')).order_by().values_list('ride_id','total'))
+    busiest = busiest_segments({ride_id: state for ride_id, _, state in rides if state})
+    return [
+        (ride_id,counter,ledger[ride_id],booked.get(ride_id,0))
+        for ride_id, counter, _ in rides
+        if ledger[ride_id] != booked.get(ride_id,0) or counter != busiest.get(ride_id,booked.get(ride_id,0))
+    ]
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    # Streams every ride in id order and compares it chunk by chunk
+    checked, suspects = 0, []
+    chunk = []
+    rides = Ride.objects.order_by('id').values_list('id','seats_booked','segment_seats').iterator(chunk_size=batch_size)
+    for ride in rides:
+        chunk.append(ride)
+        if len(chunk) >= batch_size:
+            suspects += [mismatch[0] for mismatch in mismatches(chunk)]
+            checked, chunk = checked + len(chunk), []
+    if chunk:
+        suspects += [mismatch[0] for mismatch in mismatches(chunk)]
+        checked += len(chunk)
+
+    # The three reads above aren't one snapshot, so a booking committing in
+    # between looks like drift; only rides that still disagree are reported
+    mismatched = []
+    for i in range(0,len(suspects),batch_size):
+        mismatched += mismatches(list(Ride.objects.filter(id__in=suspects[i:i+batch_size]).values_list('id','seats_booked','segment_seats')))
+    for ride_id, counter, ledger, booked in mismatched:
+        logger.error(f"Seat count mismatch on ride {ride_id}: counter {counter}, ledger {ledger}, confirmed bookings {booked}.")
+    registry.set("seat_ledger_mismatched_rides",len(mismatched))
+    logger.info(f"Seat ledger reconciliation: {checked} rides checked, {len(mismatched)} mismatched.")
+    return {"checked": checked, "mismatched": [mismatch[0] for mismatch in mismatched]}
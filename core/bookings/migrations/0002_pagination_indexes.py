@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+        ('rides', '0004_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['passenger', 'id'], name='booking_passenger_id_idx'),
+        ),
+    ]
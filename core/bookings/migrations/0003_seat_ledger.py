@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_snapshots(apps, schema_editor):
+    # Existing counts become the starting point; the ledger records changes from here on
+    Ride = apps.get_model('rides', 'Ride')
+    SeatSnapshot = apps.get_model('bookings', 'SeatSnapshot')
+    snapshots = []
+    for ride_id, seats_booked in Ride.objects.filter(seats_booked__gt=0).values_list('id', 'seats_booked').iterator(chunk_size=2000):
+        snapshots.append(SeatSnapshot(ride_id=ride_id, seats_booked=seats_booked, last_event_id=0))
+        if len(snapshots) >= 2000:
+            SeatSnapshot.objects.bulk_create(snapshots)
+            snapshots = []
+    SeatSnapshot.objects.bulk_create(snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_pagination_indexes'),
+        ('rides', '0006_location_aliases_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatSnapshot',
+            fields=[
+                ('ride', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_snapshot', serialize=False, to='rides.ride')),
+                ('seats_booked', models.IntegerField(default=0)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('taken_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeatLedger',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('reserve', 'Reserve'), ('release', 'Release')], max_length=10)),
+                ('delta', models.SmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='seat_events', to='bookings.booking')),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_events', to='rides.ride')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ride', 'id'], name='seat_ledger_ride_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_snapshots, migrations.RunPython.noop),
+    ]
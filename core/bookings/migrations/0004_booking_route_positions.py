@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+from rides.segments import has_intermediate_stops, ride_leg, segment_tree
+
+
+def backfill_route_positions(apps, schema_editor):
+    # Positions of existing bookings, and per-segment seats for rides with intermediate stops
+    Ride = apps.get_model('rides', 'Ride')
+    Booking = apps.get_model('bookings', 'Booking')
+    rides = Ride.objects.filter(id__in=Booking.objects.values('ride_id')).values_list('id', 'boarding_points', 'dropping_points')
+    for ride_id, boarding_points, dropping_points in rides.iterator(chunk_size=500):
+        tree = segment_tree(boarding_points, dropping_points)
+        bookings = list(Booking.objects.filter(ride_id=ride_id))
+        for booking in bookings:
+            booking.board_stop, booking.drop_stop = ride_leg(boarding_points, dropping_points, booking.boarding_point, booking.dropping_point) or (0, tree.segments)
+            if booking.status == 'confirmed' and tree.segments:
+                tree.add(booking.board_stop, booking.drop_stop, booking.seats_booked)
+        Booking.objects.bulk_update(bookings, ['board_stop', 'drop_stop'])
+        if has_intermediate_stops(boarding_points, dropping_points):
+            Ride.objects.filter(id=ride_id).update(segment_seats=tree.dump(), seats_booked=max(tree.busiest(), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_seat_ledger'),
+        ('rides', '0008_ride_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='board_stop',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='drop_stop',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_route_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:48
+
+from django.db import migrations, models
+from django.utils.timezone import localtime
+
+
+def backfill_cards(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    rows = Booking.objects.values_list(
+        'id', 'ride__source__name', 'ride__destination__name', 'ride__start_time',
+        'passenger__profile__first_name', 'passenger__profile__last_name'
+    )
+    bookings = []
+    for pk, source, destination, start_time, first_name, last_name in rows.iterator(chunk_size=2000):
+        start = localtime(start_time)
+        bookings.append(Booking(
+            id=pk, passenger_display=f"{first_name} {last_name}", ride_display=f"Trip from {source} to {destination}",
+            ride_date=start.date(), ride_time=start.time().strftime("%I:%M %p")
+        ))
+        if len(bookings) >= 2000:
+            Booking.objects.bulk_update(bookings, ['passenger_display', 'ride_display', 'ride_date', 'ride_time'])
+            bookings = []
+    Booking.objects.bulk_update(bookings, ['passenger_display', 'ride_display', 'ride_date', 'ride_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_route_positions'),
+        ('rides', '0010_ride_driver_schedule_index'),
+        ('users', '0002_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='passenger_display',
+            field=models.CharField(blank=True, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ride_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ride_display',
+            field=models.CharField(blank=True, max_length=220),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ride_time',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+        migrations.RunPython(backfill_cards, migrations.RunPython.noop),
+    ]
@@ -18,7 +18,16 @@ class Booking(models.Model):
     boarding_point = models.CharField(max_length=250)
     dropping_point = models.CharField(max_length=250)
     seats_booked = models.IntegerField(validators=[MinValueValidator(1)])
+    # Route positions of the two points (rides.segments); the seats are taken on [board_stop, drop_stop)
+    board_stop = models.PositiveSmallIntegerField(blank=True,null=True)
+    drop_stop = models.PositiveSmallIntegerField(blank=True,null=True)
     status = models.CharField(choices=BookingStatus.choices,default=BookingStatus.PENDING)
+    # Booking card as listed by BookingSerializer, copied from the ride and the
+    # passenger's profile so lists need no joins; kept current by bookings.cards
+    passenger_display = models.CharField(max_length=101,blank=True)
+    ride_display = models.CharField(max_length=220,blank=True)
+    ride_date = models.DateField(blank=True,null=True)  # local date of ride.start_time
+    ride_time = models.CharField(max_length=8,blank=True)  # local time, e.g. 08:30 AM
 
     class Meta:
         constraints = [
@@ -28,6 +37,10 @@ class Booking(models.Model):
                 name = "unique_active_booking_per_ride"
             )
         ]
+        indexes = [
+            # Keyset pagination of my_bookings ordered by id
+            models.Index(fields=['passenger','id'],name='booking_passenger_id_idx'),
+        ]
     def __str__(self):
         return f"Trip to {self.ride.destination} of {self.passenger.profile.first_name}"
     
@@ -43,3 +56,35 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=50,default='wallet')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+class SeatLedger(models.Model):
+    # Append-only history of seat changes per ride: +seats on reserve, -seats on release
+    class EventKind(models.TextChoices):
+        RESERVE = 'reserve', 'Reserve'
+        RELEASE = 'release', 'Release'
+
+    id = models.BigAutoField(primary_key=True)
+    ride = models.ForeignKey(Ride,on_delete=models.CASCADE,related_name='seat_events')
+    booking = models.ForeignKey(Booking,on_delete=models.SET_NULL,blank=True,null=True,related_name='seat_events')
+    kind = models.CharField(max_length=10,choices=EventKind.choices)
+    delta = models.SmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Tail reads: a ride's events after its snapshot
+            models.Index(fields=['ride','id'],name='seat_ledger_ride_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {abs(self.delta)} on ride {self.ride_id}"
+
+class SeatSnapshot(models.Model):
+    # Seats booked on a ride counting every ledger event up to last_event_id
+    ride = models.OneToOneField(Ride,on_delete=models.CASCADE,primary_key=True,related_name='seat_snapshot')
+    seats_booked = models.IntegerField(default=0)
+    last_event_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ride {self.ride_id}: {self.seats_booked} seats up to event {self.last_event_id}"
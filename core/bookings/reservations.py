@@ -0,0 +1,89 @@
+from django.db.models import F
+from django.utils import timezone
+
+from rides.models import Ride
+from rides.search_index import adjust_search_index_seats, set_search_index_segments
+from rides.segments import has_intermediate_stops, route, segment_tree
+
+from . import ledger
+
+# Seat reservation without holding a row lock across the booking transaction.
+# Each change is one conditional UPDATE whose WHERE clause re-checks capacity,
+# so two racing bookings can never both take the last seat: the database
+# serializes the two statements and the loser matches zero rows. Successful
+# changes are also appended to the seat ledger (see ledger.py).
+#
+# Rides with intermediate stops track seats per segment instead (leg given):
+# the segment tree is read, checked over the leg and written back only if
+# segment_version hasn't moved, else re-read and retried.
+
+SEGMENT_RETRIES = 20
+
+def tracked_leg(ride, board_stop, drop_stop):
+    # The leg to reserve per segment, None for rides tracked as a whole
+    if not has_intermediate_stops(ride.boarding_points,ride.dropping_points):
+        return None
+    if board_stop is None or drop_stop is None:
+        # Booked before positions were recorded: the whole route
+        return 0, len(route(ride.boarding_points,ride.dropping_points)) - 1
+    return board_stop, drop_stop
+
+def leg_seats_available(ride, leg):
+    # From the loaded ride; the reservation re-checks against the database
+    if leg is None:
+        return ride.seats_available
+    return ride.seats_offered - segment_tree(ride.boarding_points,ride.dropping_points,ride.segment_seats).max(*leg)
+
+def reserve_seats(ride_id, seats, booking_id=None, leg=None):
+    if leg is not None:
+        return change_segment_seats(ride_id,seats,leg,booking_id)
+    now = timezone.now()
+    updated = Ride.objects.filter(
+        id = ride_id,
+        status = Ride.RideStatus.OPEN,
+        seats_booked__lte = F('seats_offered') - seats
+    ).update(seats_booked=F('seats_booked') + seats, updated_at=now)
+    if updated:
+        ledger.record(ride_id,seats,booking_id)
+        adjust_search_index_seats(ride_id,seats,now)
+    return updated == 1
+
+def release_seats(ride_id, seats, booking_id=None, leg=None):
+    if leg is not None:
+        return change_segment_seats(ride_id,-seats,leg,booking_id)
+    now = timezone.now()
+    updated = Ride.objects.filter(
+        id = ride_id,
+        seats_booked__gte = seats
+    ).update(seats_booked=F('seats_booked') - seats, updated_at=now)
+    if updated:
+        ledger.record(ride_id,-seats,booking_id)
+        adjust_search_index_seats(ride_id,-seats,now)
+    return updated == 1
+
+def change_segment_seats(ride_id, seats, leg, booking_id=None):
+    # seats > 0 reserves the leg (board, drop), < 0 releases it
+    board, drop = leg
+    rides = Ride.objects.filter(id=ride_id)
+    if seats > 0:
+        rides = rides.filter(status=Ride.RideStatus.OPEN)
+    for _ in range(SEGMENT_RETRIES):
+        ride = rides.values('seats_offered','boarding_points','dropping_points','segment_seats','segment_version').first()
+        if ride is None:
+            return False
+        tree = segment_tree(ride['boarding_points'],ride['dropping_points'],ride['segment_seats'])
+        taken = tree.max(board,drop)
+        if taken + seats > ride['seats_offered'] or taken + seats < 0:
+            return False
+        tree.add(board,drop,seats)
+        now = timezone.now()
+        busiest = tree.busiest()
+        updated = Ride.objects.filter(id=ride_id,segment_version=ride['segment_version']).update(
+            segment_seats=tree.dump(),segment_version=F('segment_version') + 1,seats_booked=busiest,updated_at=now
+        )
+        if updated:
+            ledger.record(ride_id,seats,booking_id)
+            set_search_index_segments(ride_id,ride['seats_offered'],tree.occupancy(),now)
+            return True
+    # Lost every race; the caller reports it like a full ride
+    return False
@@ -1,34 +1,24 @@
 from django.db import transaction
-from django.db.models import F
-from django.utils.timezone import localtime
 from rest_framework import serializers
 
 from rides.models import Ride
+from rides.segments import ride_leg
 
+from . import inventory
+from .bulk import BULK_BOOKING_LIMIT
 from .models import Booking, Payment
+from .reservations import leg_seats_available, reserve_seats, tracked_leg
 
 class BookingSerializer(serializers.ModelSerializer):
-    passenger_display = serializers.SerializerMethodField(read_only=True)
-    ride_display = serializers.SerializerMethodField(read_only=True)
-    date = serializers.SerializerMethodField(read_only=True)
-    time = serializers.SerializerMethodField(read_only=True)
-
-    def get_passenger_display(self,obj):
-        return f"{obj.passenger.profile.first_name} {obj.passenger.profile.last_name}"
-    
-    def get_ride_display(self,obj):
-        return f"Trip from {obj.ride.source} to {obj.ride.destination}"
-    
-    def get_date(self,obj):
-        return localtime(obj.ride.start_time).date()
-    
-    def get_time(self,obj):
-        return localtime(obj.ride.start_time).time().strftime("%I:%M %p")
+    # The display fields are the booking card columns (bookings.cards), no joins needed
+    ride = serializers.PrimaryKeyRelatedField(queryset=Ride.objects.select_related('source','destination'))
+    date = serializers.DateField(source='ride_date',read_only=True)
+    time = serializers.CharField(source='ride_time',read_only=True)
     
     class Meta:
         model = Booking
         fields = ['id','passenger','passenger_display','ride','ride_display','date','time','boarding_point','dropping_point','seats_booked','status']
-        read_only_fields = ['id','passenger','status']
+        read_only_fields = ['id','passenger','passenger_display','ride_display','status']
 
     def validate_seats_booked(self,value):
         if value <= 0:
@@ -38,46 +28,60 @@ class BookingSerializer(serializers.ModelSerializer):
         boarding_point = attrs.get('boarding_point')
         dropping_point = attrs.get('dropping_point')
         ride = attrs.get('ride')
+        if ride.status != Ride.RideStatus.OPEN:
+            raise serializers.ValidationError("Ride is not open for booking.")
         if boarding_point not in ride.boarding_points:
             raise serializers.ValidationError("Please give correct boarding point.")
         if dropping_point not in ride.dropping_points:
             raise serializers.ValidationError("Please give correct dropping point.")
+        leg = ride_leg(ride.boarding_points,ride.dropping_points,boarding_point,dropping_point)
+        if leg is None:
+            raise serializers.ValidationError("Dropping point should come after the boarding point.")
+        attrs['board_stop'], attrs['drop_stop'] = leg
         return attrs
     
     def create(self, validated_data):
-        ride_id = validated_data.get('ride').id
+        ride = validated_data.get('ride')
         booked_seats = validated_data.get('seats_booked')
-        with transaction.atomic():
-            # Locks ride row to avoid race condition
-            ride = Ride.objects.select_for_update().get(id=ride_id)
-            if ride.seats_available < booked_seats:
-                raise serializers.ValidationError("Not enough seats available.")
-            
-            booking = Booking.objects.create(**validated_data)
+        leg = tracked_leg(ride,validated_data['board_stop'],validated_data['drop_stop'])
+        # Cheap early reject from the hot inventory, None if Redis can't answer.
+        # It counts whole-ride seats, so per-segment rides skip it.
+        cached = inventory.has_seats(ride.id,booked_seats) if leg is None else None
+        if cached is False or leg_seats_available(ride,leg) < booked_seats:
+            raise serializers.ValidationError("Not enough seats available.")
 
-            # Create pending payment linked to this booking
-            payment = Payment.objects.create(
+        with transaction.atomic():
+            # Simulate payment success, so booking and payment are written final
+            # Later replace this with real gateway logic
+            booking = Booking.objects.create(**validated_data,status=Booking.BookingStatus.CONFIRMED)
+            Payment.objects.create(
                 booking = booking,
                 amount = ride.fare,
-                status = Payment.PaymentStatus.PENDING
+                status = Payment.PaymentStatus.SUCCESS
             )
 
-            # Simulate payment success
-            # Later replace this with real gateway logic
-            payment.status = Payment.PaymentStatus.SUCCESS
-            payment.save()
-
-            # Confirm booking only after payment success
-            if payment.status == Payment.PaymentStatus.SUCCESS:
-                booking.status = Booking.BookingStatus.CONFIRMED
-                booking.save()
-                ride.seats_booked = F('seats_booked') + booked_seats
-                ride.save()
-            else:
-                booking.status = Booking.BookingStatus.CANCELLED
-                booking.save()
+            # Guarded seat decrement runs last, so the ride row is only locked
+            # from this statement until commit instead of for the whole transaction
+            if not reserve_seats(ride.id,booked_seats,booking.id,leg):
+                raise serializers.ValidationError("Not enough seats available.")
+        # Write-through once the outermost transaction (perform_create's) commits;
+        # a rollback leaves the cached counter untouched
+        if cached is None:
+            transaction.on_commit(lambda: inventory.forget([ride.id]))
+        else:
+            transaction.on_commit(lambda: inventory.take(ride.id,booked_seats))
         return booking
     
+class BulkBookingItemSerializer(serializers.Serializer):
+    ride = serializers.IntegerField()
+    boarding_point = serializers.CharField(max_length=250)
+    dropping_point = serializers.CharField(max_length=250)
+    seats_booked = serializers.IntegerField(min_value=1,error_messages={'min_value': "You must book at least 1 seat."})
+
+class BulkBookingSerializer(serializers.Serializer):
+    # Items are validated one by one in the view, so one bad item doesn't fail the rest
+    bookings = serializers.ListField(child=serializers.DictField(),min_length=1,max_length=BULK_BOOKING_LIMIT)
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from rides.models import Location, Ride
+from users.models import Profile
+
+from .cards import fill_card, refresh_location_cards, refresh_passenger_cards, refresh_ride_cards
+from .models import Booking
+
+
+@receiver(pre_save,sender=Booking)
+def fill_booking_card(sender,instance,**kwargs):
+    # bulk_create skips this, bulk inserts call fill_card themselves
+    if instance._state.adding and not instance.ride_display:
+        fill_card(instance,instance.ride,instance.passenger.profile)
+
+@receiver(post_save,sender=Ride)
+def update_ride_cards(sender,instance,created,update_fields,**kwargs):
+    if not created and (update_fields is None or {'source','destination','start_time'} & set(update_fields)):
+        refresh_ride_cards([instance.id])
+
+@receiver(post_save,sender=Location)
+def update_location_cards(sender,instance,created,update_fields,**kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        refresh_location_cards(instance.id)
+
+@receiver(post_save,sender=Profile)
+def update_passenger_cards(sender,instance,created,update_fields,**kwargs):
+    if not created and (update_fields is None or {'first_name','last_name'} & set(update_fields)):
+        refresh_passenger_cards([instance.user_id])
@@ -1,3 +1,376 @@
-from django.test import TestCase
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.runner import access_token
+from core.testing import query_budget
+from notifications.models import OutboxEmail
+from rides.models import Ride
+from rides.segments import SegmentTree
+
+from . import inventory, ledger
+from .models import Booking, SeatLedger
+from .reservations import release_seats, reserve_seats
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 # Create your tests here.
+
+def run_concurrently(workers, target):
+    # Starts every worker at the same instant and waits for all of them
+    barrier = threading.Barrier(len(workers))
+    def run(arg):
+        barrier.wait()
+        try:
+            target(arg)
+        finally:
+            connection.close()
+    threads = [threading.Thread(target=run,args=(arg,)) for arg in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def retry_locked(func, *args):
+    # SQLite's shared-cache test database raises "table is locked" under
+    # contention instead of waiting; that is not a capacity decision, so retry.
+    # Atomic like the booking views, so a failed attempt leaves nothing behind.
+    for _ in range(200):
+        try:
+            with transaction.atomic():
+                return func(*args)
+        except OperationalError:
+            time.sleep(0.002)
+    raise AssertionError("Database stayed locked")
+
+class SeatReservationConcurrencyTests(TransactionTestCase):
+    THREADS = 12
+
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        vehicles = create_vehicles(drivers)
+        locations = create_locations(2)
+        # Four free seats (create_rides offers four)
+        self.ride = create_rides(vehicles,locations,1,prebooked=False)[0]
+
+    def test_racing_for_last_seats_never_overbooks(self):
+        results = []
+        run_concurrently(range(self.THREADS),lambda _: results.append(retry_locked(reserve_seats,self.ride.id,1)))
+
+        self.ride.refresh_from_db()
+        self.assertEqual(results.count(True),4)
+        self.assertEqual(self.ride.seats_booked,4)
+
+    def test_multi_seat_requests_never_exceed_capacity(self):
+        results = []
+        run_concurrently([3,2,2,1,1,3],lambda seats: results.append((seats,retry_locked(reserve_seats,self.ride.id,seats))))
+
+        self.ride.refresh_from_db()
+        booked = sum(seats for seats, ok in results if ok)
+        self.assertLessEqual(booked,4)
+        self.assertEqual(self.ride.seats_booked,booked)
+
+    def test_release_never_goes_negative(self):
+        self.assertTrue(reserve_seats(self.ride.id,2))
+        self.assertTrue(release_seats(self.ride.id,2))
+        self.assertFalse(release_seats(self.ride.id,1))
+        self.ride.refresh_from_db()
+        self.assertEqual(self.ride.seats_booked,0)
+
+@unittest.skipUnless(fakeredis,"fakeredis is not installed")
+class SeatInventoryTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        vehicles = create_vehicles(drivers)
+        locations = create_locations(2)
+        self.ride = create_rides(vehicles,locations,1)[0]
+        Ride.objects.filter(id=self.ride.id).update(seats_offered=3,seats_booked=0)
+        self.redis = fakeredis.FakeRedis()
+        for patcher in (
+            mock.patch.object(inventory,'get_redis',return_value=self.redis),
+            mock.patch.object(inventory,'_unavailable_until',0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_counter_loads_from_database_and_rejects_when_sold_out(self):
+        self.assertTrue(inventory.has_seats(self.ride.id,3))
+        self.assertTrue(inventory.take(self.ride.id,2))
+        self.assertFalse(inventory.has_seats(self.ride.id,2))
+        self.assertTrue(inventory.take(self.ride.id,1))
+        self.assertEqual(inventory.available([self.ride.id]),{self.ride.id: 0})
+
+    def test_release_restores_seats(self):
+        inventory.has_seats(self.ride.id,3)
+        inventory.take(self.ride.id,3)
+        inventory.release(self.ride.id,2)
+        self.assertEqual(inventory.available([self.ride.id]),{self.ride.id: 2})
+
+    def test_repair_corrects_drift_and_drops_closed_rides(self):
+        inventory.has_seats(self.ride.id,1)
+        inventory.take(self.ride.id,1)
+        self.assertEqual(inventory.repair(),{"checked": 1, "repaired": 1, "removed": 0})
+        self.assertEqual(inventory.available([self.ride.id]),{self.ride.id: 3})
+
+        Ride.objects.filter(id=self.ride.id).update(status=Ride.RideStatus.CANCELLED)
+        self.assertEqual(inventory.repair()["removed"],1)
+        self.assertEqual(inventory.available([self.ride.id]),{})
+
+    def test_unavailable_redis_falls_back_to_database(self):
+        with mock.patch.object(self.redis,'get',side_effect=inventory.RedisError("down")):
+            self.assertIsNone(inventory.has_seats(self.ride.id,1))
+        self.assertIsNone(inventory.has_seats(self.ride.id,1))
+
+    def book(self):
+        client = APIClient()
+        client.force_authenticate(create_users(1,'passenger')[0])
+        return client.post(reverse('booking-list'),{
+            'ride': self.ride.id,'boarding_point': self.ride.boarding_points[0],'dropping_point': self.ride.dropping_points[0],'seats_booked': 2
+        },format='json')
+
+    def test_counter_follows_committed_bookings_only(self):
+        # The confirmation email fails after the booking was written: the whole request rolls back
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('bookings.views.enqueue_email',side_effect=RuntimeError("outbox down")):
+            self.assertRaises(RuntimeError,self.book)
+        self.assertEqual(inventory.available([self.ride.id]),{self.ride.id: 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.book().status_code,201)
+        self.assertEqual(inventory.available([self.ride.id]),{self.ride.id: 1})
+
+class BookingQueryBudgetTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        rides = create_rides(create_vehicles(drivers),create_locations(4),5)
+        self.passenger = create_users(1,'passenger')[0]
+        Booking.objects.bulk_create([
+            Booking(passenger=self.passenger,ride=ride,boarding_point='A',dropping_point='B',seats_booked=1,status=Booking.BookingStatus.CONFIRMED)
+            for ride in rides
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.passenger)
+        self.headers = {'Authorization': f"Bearer {access_token(self.passenger)}"}
+
+    def test_booking_list(self):
+        with query_budget(1):
+            response = self.client.get(reverse('booking-list'))
+        self.assertEqual(len(response.data['results']),5)
+
+    def test_my_bookings(self):
+        with query_budget(1):
+            response = self.client.get(reverse('booking-my-bookings'))
+        self.assertEqual(len(response.data['my-bookings']),5)
+
+    def test_my_bookings_pages_round_trip(self):
+        expected = list(Booking.objects.filter(passenger=self.passenger).order_by('id').values_list('id',flat=True))
+        first = self.client.get(reverse('booking-my-bookings'),{'page_size': 2}).json()
+        pages = [first]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        self.assertEqual([row['id'] for page in pages for row in page['my-bookings']],expected)
+        self.assertEqual(self.client.get(pages[1]['previous']).json()['my-bookings'],first['my-bookings'])
+        self.assertEqual(self.client.get(reverse('booking-my-bookings'),{'cursor': 'not-a-cursor'}).status_code,404)
+
+    def test_async_my_bookings(self):
+        get = async_to_sync(self.async_client.get)
+        get(reverse('async-booking-my-bookings'),headers=self.headers)  # caches the token state
+        with query_budget(1):
+            response = get(reverse('async-booking-my-bookings'),headers=self.headers)
+        self.assertEqual(response.json()['my-bookings'],self.client.get(reverse('booking-my-bookings')).json()['my-bookings'])
+
+
+class BookingCardTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        self.ride = create_rides(create_vehicles(drivers),create_locations(2),1,prebooked=False)[0]
+        self.passenger = create_users(1,'passenger')[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.passenger)
+        response = self.client.post(reverse('booking-list'),{
+            'ride': self.ride.id,'boarding_point': self.ride.boarding_points[0],'dropping_point': self.ride.dropping_points[0],'seats_booked': 1
+        },format='json')
+        self.booking_id = response.data['id']
+
+    def card(self):
+        return self.client.get(reverse('booking-my-bookings')).data['my-bookings'][0]
+
+    def expected(self):
+        ride = Ride.objects.select_related('source','destination').get(id=self.ride.id)
+        profile = self.passenger.profile
+        profile.refresh_from_db()
+        start = timezone.localtime(ride.start_time)
+        return {
+            'passenger_display': f"{profile.first_name} {profile.last_name}",
+            'ride_display': f"Trip from {ride.source} to {ride.destination}",
+            'date': start.date().isoformat(),
+            'time': start.time().strftime("%I:%M %p"),
+        }
+
+    def assertCardCurrent(self):
+        card = self.card()
+        self.assertEqual({field: card[field] for field in self.expected()},self.expected())
+
+    def test_card_follows_ride_location_and_profile_edits(self):
+        self.assertCardCurrent()
+        self.ride.start_time += timedelta(days=1,hours=3)
+        self.ride.end_time += timedelta(days=1,hours=3)
+        self.ride.save()
+        self.assertCardCurrent()
+        self.ride.source.name = 'Renamed Chowk'
+        self.ride.source.save(update_fields=['name'])
+        self.assertCardCurrent()
+        profile = self.passenger.profile
+        profile.first_name = 'Zoya'
+        profile.save()
+        self.assertCardCurrent()
+        self.assertIn('Zoya',self.card()['passenger_display'])
+        self.assertEqual(self.client.get(reverse('booking-list'),{'date': self.expected()['date']}).data['results'][0]['id'],self.booking_id)
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        self.rides = create_rides(create_vehicles(drivers),create_locations(4),3,prebooked=False)
+        self.passenger = create_users(1,'passenger')[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.passenger)
+
+    def item(self, ride, seats=1, **overrides):
+        return {'ride': ride.id,'boarding_point': ride.boarding_points[0],'dropping_point': ride.dropping_points[0],'seats_booked': seats,**overrides}
+
+    def test_reports_each_item_and_books_the_valid_ones(self):
+        first, second, third = self.rides
+        response = self.client.post(reverse('booking-bulk'),{'bookings': [
+            self.item(first,2),
+            self.item(second),
+            self.item(third,third.seats_offered + 1),
+            self.item(first),
+            self.item(second,boarding_point='Nowhere'),
+            self.item(second,seats=0),
+        ]},format='json')
+
+        self.assertEqual(response.status_code,207)
+        self.assertEqual([result['status'] for result in response.data['results']],['booked','booked','failed','failed','failed','failed'])
+        self.assertEqual(response.data['results'][2]['errors']['non_field_errors'],["Not enough seats available."])
+        self.assertEqual(response.data['results'][3]['errors']['non_field_errors'],["You have already booked this ride."])
+        self.assertIn('seats_booked',response.data['results'][5]['errors'])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.seats_booked,second.seats_booked),(2,1))
+        bookings = Booking.objects.filter(passenger=self.passenger)
+        self.assertEqual(bookings.filter(payment__status='success').count(),2)
+        self.assertEqual(
+            sorted(OutboxEmail.objects.filter(recipients=[self.passenger.email]).values_list('dedup_key',flat=True)),
+            sorted(f"booking-confirmed:{result['booking']['id']}" for result in response.data['results'][:2])
+        )
+
+    def test_nothing_booked(self):
+        ride = self.rides[0]
+        Ride.objects.filter(id=ride.id).update(status=Ride.RideStatus.CANCELLED)
+        response = self.client.post(reverse('booking-bulk'),{'bookings': [self.item(ride)]},format='json')
+        self.assertEqual(response.status_code,400)
+        self.assertEqual(response.data['results'][0]['errors']['non_field_errors'],["Ride is not open for booking."])
+        self.assertFalse(OutboxEmail.objects.exists())
+
+
+class SeatLedgerTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        self.ride = create_rides(create_vehicles(drivers),create_locations(2),1,prebooked=False)[0]
+        self.passengers = create_users(2,'passenger')
+        self.client = APIClient()
+
+    def book(self, passenger, seats):
+        self.client.force_authenticate(passenger)
+        return self.client.post(reverse('booking-list'),{
+            'ride': self.ride.id,'boarding_point': self.ride.boarding_points[0],
+            'dropping_point': self.ride.dropping_points[0],'seats_booked': seats
+        },format='json')
+
+    def test_bookings_and_cancellations_are_recorded(self):
+        first = self.book(self.passengers[0],2).data['id']
+        second = self.book(self.passengers[1],1).data['id']
+        self.client.force_authenticate(self.passengers[0])
+        self.client.post(reverse('booking-cancel-booking',args=[first]))
+
+        self.assertEqual(
+            list(SeatLedger.objects.filter(ride=self.ride).values_list('kind','delta','booking_id')),
+            [('reserve',2,first),('reserve',1,second),('release',-2,first)]
+        )
+        self.assertEqual(ledger.seats_booked([self.ride.id]),{self.ride.id: 1})
+
+        self.assertEqual(ledger.take_snapshots(),1)
+        self.assertEqual(ledger.take_snapshots(),0)
+        self.assertEqual(self.ride.seat_snapshot.seats_booked,1)
+        self.book(self.passengers[0],3)
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.seats_booked([self.ride.id]),{self.ride.id: 4})
+        self.assertEqual(ledger.reconcile(),{"checked": 1, "mismatched": []})
+
+    def test_reconcile_reports_drift(self):
+        self.book(self.passengers[0],2)
+        Ride.objects.filter(id=self.ride.id).update(seats_booked=3)
+        with self.assertLogs('bookings.ledger','ERROR') as logs:
+            self.assertEqual(ledger.reconcile(batch_size=1)["mismatched"],[self.ride.id])
+        self.assertIn("counter 3, ledger 2, confirmed bookings 2",logs.output[0])
+
+
+class SegmentSeatTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        self.ride = create_rides(create_vehicles(drivers),create_locations(2),1,prebooked=False)[0]
+        # Pune -> Lonavala -> Mumbai, with people getting off and on at Lonavala
+        self.ride.boarding_points, self.ride.dropping_points, self.ride.seats_offered = ['Pune','Lonavala'], ['Lonavala','Mumbai'], 1
+        self.ride.save()
+        self.passengers = create_users(3,'passenger')
+        self.client = APIClient()
+
+    def book(self, passenger, boarding_point, dropping_point):
+        self.client.force_authenticate(passenger)
+        return self.client.post(reverse('booking-list'),{
+            'ride': self.ride.id,'boarding_point': boarding_point,'dropping_point': dropping_point,'seats_booked': 1
+        },format='json')
+
+    def segments(self):
+        return [segment['seats_available'] for segment in self.client.get(reverse('ride-detail',args=[self.ride.id])).json()['segments']]
+
+    def test_seats_are_freed_downstream(self):
+        first = self.book(self.passengers[0],'Pune','Lonavala')
+        self.assertEqual(first.status_code,201)
+        self.assertEqual(self.book(self.passengers[1],'Lonavala','Mumbai').status_code,201)
+        self.assertEqual(self.book(self.passengers[2],'Pune','Mumbai').data,["Not enough seats available."])
+        self.assertEqual(self.book(self.passengers[2],'Lonavala','Lonavala').data['non_field_errors'],["Dropping point should come after the boarding point."])
+
+        self.ride.refresh_from_db()
+        self.assertEqual((self.ride.seats_booked,self.ride.seats_available),(1,0))
+        self.assertEqual(Booking.objects.get(id=first.data['id']).drop_stop,1)
+        self.assertEqual(self.segments(),[0,0])
+
+        self.client.force_authenticate(self.passengers[0])
+        self.client.post(reverse('booking-cancel-booking',args=[first.data['id']]))
+        self.assertEqual(self.segments(),[1,0])
+        self.assertEqual(self.book(self.passengers[2],'Pune','Lonavala').status_code,201)
+        self.assertEqual(ledger.reconcile()["mismatched"],[])
+
+    def test_bulk_books_a_leg(self):
+        self.book(self.passengers[0],'Pune','Lonavala')
+        self.client.force_authenticate(self.passengers[1])
+        response = self.client.post(reverse('booking-bulk'),{'bookings': [
+            {'ride': self.ride.id,'boarding_point': 'Lonavala','dropping_point': 'Mumbai','seats_booked': 1},
+        ]},format='json')
+        self.assertEqual(response.status_code,201)
+        self.ride.refresh_from_db()
+        self.assertEqual(SegmentTree.load(self.ride.segment_seats).occupancy(),[1,1])
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import AsyncMyBookingsView
 from .views import BookingViewSet, PaymentViewSet
 
 router = DefaultRouter()
@@ -9,4 +10,9 @@ router.register('payments',PaymentViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+
+# Mounted under /async/ by core.urls
+async_urlpatterns = [
+    path('bookings/my_bookings/',AsyncMyBookingsView.as_view(),name='async-booking-my-bookings'),
+]
@@ -1,6 +1,5 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models import F
 from django.shortcuts import render
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -8,27 +7,35 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter
 
+from core.flat import compile_serializer
+from notifications.outbox import enqueue_email, enqueue_emails
 from rides.models import Ride
 
+from . import inventory
+from .bulk import book_many
+from .emails import booking_cancellation_email, booking_confirmation_email
 from .filters import BookingsFilter
 from .models import Booking, Payment
 from .permissions import IsPassenger
-from .serializers import BookingSerializer, PaymentSerializer
-from .tasks import (send_booking_cancellation_email,
-                    send_booking_confirmation_email)
+from .reservations import release_seats, tracked_leg
+from .serializers import (BookingSerializer, BulkBookingItemSerializer,
+                          BulkBookingSerializer, PaymentSerializer)
 
 # Create your views here.
 
 User = get_user_model()
 
 class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.select_related('ride','passenger__profile')
+    # Lists render from the booking card columns alone
+    queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     http_method_names = ['get','post']
     filterset_class = BookingsFilter
     search_fields = ['boarding_point','dropping_point']
     def get_queryset(self):
         qs = self.queryset
+        if self.action not in ['list','my_bookings']:
+            qs = qs.select_related('ride')
         user = self.request.user
         if user.role == User.Roles.PASSENGER:
             qs = qs.filter(passenger=user)
@@ -39,7 +46,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         return qs
 
     def get_permissions(self):
-        if self.action in ['create','cancel_booking']:
+        if self.action in ['create','bulk','cancel_booking']:
             permissions = [IsAuthenticated,IsPassenger]
         else:
             permissions = [IsAuthenticated]
@@ -47,9 +54,10 @@ class BookingViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         user = self.request.user
-        booking = serializer.save(passenger=user)
-        print("Sending booking confirmation email...")
-        send_booking_confirmation_email.delay(user.email,booking.id)
+        with transaction.atomic():
+            booking = serializer.save(passenger=user)
+            print("Queueing booking confirmation email...")
+            enqueue_email(*booking_confirmation_email(booking,user.email))
         return serializer.data
     
     @action(detail=True,methods=['POST'])
@@ -59,29 +67,75 @@ class BookingViewSet(viewsets.ModelViewSet):
         user = request.user
         if booking.passenger != user:
             return Response({"error":"Not your trip"},status=status.HTTP_400_BAD_REQUEST)
-        elif booking.ride.status != Ride.StatusChoices.OPEN:
+        elif booking.ride.status != Ride.RideStatus.OPEN:
             return Response({"error":"Trip is active you can't cancel it"},status=status.HTTP_400_BAD_REQUEST)
         elif booking.status == Booking.BookingStatus.CANCELLED:
             return Response({"error":"Booking already cancelled."},status=status.HTTP_400_BAD_REQUEST)
         
         with transaction.atomic():
-            ride = Ride.objects.select_for_update().get(id=booking.ride.id)
-            
-            booking.status = Booking.BookingStatus.CANCELLED
-            booking.save()
-
-            ride.seats_booked = F('seats_booked') - booking.seats_booked
-            ride.save() 
-            send_booking_cancellation_email.delay(user.email,booking.id)
-            ride.refresh_from_db()
+            # Guarded status flip: a concurrent cancel of the same booking matches no row
+            cancelled = Booking.objects.filter(id=booking.id).exclude(
+                status=Booking.BookingStatus.CANCELLED
+            ).update(status=Booking.BookingStatus.CANCELLED)
+            if not cancelled:
+                return Response({"error":"Booking already cancelled."},status=status.HTTP_400_BAD_REQUEST)
+            release_seats(booking.ride_id,booking.seats_booked,booking.id,tracked_leg(booking.ride,booking.board_stop,booking.drop_stop))
+            # Write-through to the hot inventory once the release is durable
+            transaction.on_commit(lambda: inventory.release(booking.ride_id,booking.seats_booked))
+            enqueue_email(*booking_cancellation_email(booking,user.email))
 
         return Response({"message":"Booking cancelled successfully..!"})
 
+    @action(detail=False,methods=['POST'])
+    def bulk(self,request):
+        serializer = BulkBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results, valid = {}, []
+        for index, data in enumerate(serializer.validated_data['bookings']):
+            item = BulkBookingItemSerializer(data=data)
+            if item.is_valid():
+                valid.append((index,item.validated_data))
+            else:
+                results[index] = {"index":index,"status":"failed","errors":item.errors}
+
+        with transaction.atomic():
+            booked, errors = book_many(request.user,[data for _, data in valid])
+            # One outbox write for all confirmations, sent in one dispatcher batch
+            enqueue_emails(booking_confirmation_email(booking,request.user.email) for booking in booked.values())
+        for position, (index, _) in enumerate(valid):
+            if position in booked:
+                results[index] = {"index":index,"status":"booked","booking":BookingSerializer(booked[position]).data}
+            else:
+                results[index] = {"index":index,"status":"failed","errors":{"non_field_errors":[errors[position]]}}
+        failed = len(results) - len(booked)
+        if not booked:
+            status_code = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            status_code = status.HTTP_207_MULTI_STATUS
+        else:
+            status_code = status.HTTP_201_CREATED
+        return Response({
+            "booked":len(booked),
+            "failed":failed,
+            "results":[results[index] for index in sorted(results)]
+        },status=status_code)
+
+    def list(self, request, *args, **kwargs):
+        # Rows as values() dicts through the flat serializer (core.flat), same output
+        flat = compile_serializer(self.get_serializer_class())
+        page = self.paginate_queryset(flat.values(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(flat.serialize(page))
+
     @action(detail=False)
     def my_bookings(self,request):
-        bookings = Booking.objects.filter(passenger=request.user)
-        serializer = self.get_serializer(bookings,many=True)
-        return Response({"my-bookings":serializer.data},status=status.HTTP_200_OK)
+        flat = compile_serializer(self.get_serializer_class())
+        bookings = self.paginate_queryset(flat.values(self.queryset.filter(passenger=request.user)))
+        return Response({
+            "my-bookings":flat.serialize(bookings),
+            "next":self.paginator.get_next_link(),
+            "previous":self.paginator.get_previous_link()
+        },status=status.HTTP_200_OK)
     
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
@@ -0,0 +1,64 @@
+import asyncio
+from weakref import WeakKeyDictionary
+
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache, RedisSerializer
+
+# Cache access for the async views. Django's a* cache methods run the sync
+# client in a thread; with the Redis backend (CACHE_BACKEND=redis) the same
+# keys and encoding are read with redis.asyncio instead, so a request waiting
+# on Redis holds no thread. The in-process backends are called directly, the
+# rest fall back to the a* methods.
+
+_clients = WeakKeyDictionary()  # per event loop, connections can't be shared between loops
+_serializer = RedisSerializer()
+
+
+def redis_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        location = settings.CACHES[DEFAULT_CACHE_ALIAS]['LOCATION']
+        _clients[loop] = redis.asyncio.Redis.from_url(location,socket_timeout=0.5,socket_connect_timeout=0.5)
+    return _clients[loop]
+
+
+def native():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS],RedisCache)
+
+
+def in_process():
+    # No I/O, so no reason to hop to a thread
+    return isinstance(caches[DEFAULT_CACHE_ALIAS],(LocMemCache,DummyCache))
+
+
+async def aget_many(keys):
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    if in_process():
+        return cache.get_many(keys)
+    if not native():
+        return await cache.aget_many(keys)
+    values = await redis_client().mget([cache.make_and_validate_key(key) for key in keys])
+    return {key: _serializer.loads(value) for key, value in zip(keys,values) if value is not None}
+
+
+async def aget(key, default=None):
+    return (await aget_many([key])).get(key,default)
+
+
+async def aset(key, value, timeout=DEFAULT_TIMEOUT):
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    if in_process():
+        return cache.set(key,value,timeout)
+    if not native():
+        return await cache.aset(key,value,timeout)
+    timeout = cache.get_backend_timeout(timeout)
+    key = cache.make_and_validate_key(key)
+    if timeout == 0:
+        await redis_client().delete(key)
+    else:
+        await redis_client().set(key,_serializer.dumps(value),ex=timeout)
@@ -0,0 +1,75 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from users.authentication import ClaimsJWTAuthentication
+
+from .flat import compile_serializer
+
+# Async variants of the hot read endpoints, mounted under /async/ and served
+# by the ASGI deployment (see README). Same output as the DRF viewsets, but
+# token state, cache lookups and page queries are awaited, so a slow database
+# or Redis round trip parks a coroutine instead of a worker thread. Filters
+# that run queries while the queryset is built (blocking_filters) still go
+# through sync_to_async.
+
+
+def json_renderer():
+    return next(renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES if renderer.format == 'json')
+
+
+class AsyncAPIView(View):
+    http_method_names = ['get','options']
+    serializer_class = None
+    pagination_class = None
+    filterset_class = None
+    search_fields = ()
+    filter_backends = api_settings.DEFAULT_FILTER_BACKENDS
+    blocking_filters = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        # A DRF request for the filter backends, paginator and serializers;
+        # authentication is done here instead of lazily on request.user
+        self.request = Request(request)
+        self.renderer = json_renderer()
+        self.metric_name = request.resolver_match.url_name
+        try:
+            authenticator = ClaimsJWTAuthentication()
+            authenticated = await authenticator.aauthenticate(request)
+            if authenticated is None:
+                raise exceptions.NotAuthenticated()
+            self.request.user, self.request.auth = authenticated
+            return await super().dispatch(request,*args,**kwargs)
+        except exceptions.APIException as exc:
+            response = self.render(exc.detail if isinstance(exc.detail,(list,dict)) else {"detail": exc.detail},exc.status_code)
+            if isinstance(exc,(exceptions.NotAuthenticated,exceptions.AuthenticationFailed)):
+                response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+
+    def render(self, data, status=200):
+        return HttpResponse(self.renderer.render(data),status=status,content_type=self.renderer.media_type)
+
+    def get_serializer(self, *args, **kwargs):
+        return self.serializer_class(*args,context={'request': self.request,'view': self},**kwargs)
+
+    @property
+    def flat_serializer(self):
+        # List pages are read as values() dicts, see core.flat
+        return compile_serializer(self.serializer_class)
+
+    async def filter_queryset(self, queryset):
+        def apply():
+            filtered = queryset
+            for backend in self.filter_backends:
+                filtered = backend().filter_queryset(self.request,filtered,self)
+            return filtered
+        if any(name in self.request.query_params for name in self.blocking_filters):
+            return await sync_to_async(apply)()
+        return apply()
+
+    async def paginate_queryset(self, queryset):
+        self.paginator = self.pagination_class()
+        return await self.paginator.apaginate_queryset(queryset,self.request,view=self)
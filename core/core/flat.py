@@ -0,0 +1,117 @@
+import re
+from functools import cache
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+# Fast path for read-only list endpoints. compile_serializer turns a
+# serializer class into the values() lookups it reads plus one accessor per
+# output field, so a page is fetched as dicts and turned into the same output
+# without model instances or DRF's per-field bind/get_attribute machinery.
+# Typed fields (dates, decimals) still format through the serializer's own
+# field objects. Output that is not a plain column (SerializerMethodFields,
+# properties, a relation's __str__) is declared on the serializer as
+#   flat_fields = {"name" or "nested.name": (lookups, function)}
+# with lookups relative to the (nested) serializer's model and function
+# called with their values.
+
+SKIP = object()  # field left out of the output, as DRF does for a missing reverse one-to-one
+PASSTHROUGH = (serializers.IntegerField,serializers.BooleanField,serializers.JSONField,serializers.ReadOnlyField,serializers.ChoiceField,PrimaryKeyRelatedField)
+TEXT_FIELDS = (models.CharField,models.TextField)
+DISPLAY_SOURCE = re.compile(r'^get_(\w+)_display$')
+
+
+class FlatSerializer:
+    def __init__(self, lookups, steps):
+        self.lookups = lookups
+        self.steps = steps  # (name, accessor(row))
+
+    def values(self, queryset):
+        # pk for ETags, plus the annotations the filters added (cursor position on distance ordering)
+        return queryset.values(*dict.fromkeys(['pk',*self.lookups,*queryset.query.annotations]))
+
+    def row(self, row):
+        return {name: value for name, accessor in self.steps if (value := accessor(row)) is not SKIP}
+
+    def serialize(self, rows):
+        return [self.row(row) for row in rows]
+
+
+def resolve(model, source):
+    # Model field at the end of a dotted source, and its values() lookup
+    parts = source.split('.')
+    field = None
+    for i, part in enumerate(parts):
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f"{model.__name__}.{part} is not a column; declare it in flat_fields.")
+        if i < len(parts) - 1:
+            model = field.related_model
+    return field, '__'.join(parts)
+
+
+def column(key, convert=None):
+    if convert is None:
+        return lambda row: row[key]
+    return lambda row: None if (value := row[key]) is None else convert(value)
+
+
+def computed(keys, function):
+    return lambda row: function(*[row[key] for key in keys])
+
+
+def nested(key, missing, build):
+    return lambda row: missing if row[key] is None else build(row)
+
+
+def compile_fields(serializer, model, prefix, path, overrides, lookups):
+    steps = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        dotted = f"{path}{name}"
+        if dotted in overrides:
+            keys, function = overrides[dotted]
+            keys = [prefix + key for key in keys]
+            lookups += keys
+            steps.append((name,computed(keys,function)))
+        elif isinstance(field,serializers.ListSerializer):
+            raise ImproperlyConfigured(f"{dotted}: nested lists have no flat form; declare it in flat_fields.")
+        elif isinstance(field,serializers.BaseSerializer):
+            if field.source == '*':
+                inner = compile_fields(field,model,prefix,f"{dotted}.",overrides,lookups)
+                steps.append((name,lambda row, inner=inner: {key: value for key, accessor in inner if (value := accessor(row)) is not SKIP}))
+                continue
+            relation, lookup = resolve(model,field.source)
+            inner = compile_fields(field,relation.related_model,prefix + lookup + '__',f"{dotted}.",overrides,lookups)
+            lookups.append(prefix + lookup)
+            # A null foreign key renders None, a missing reverse one-to-one is left out
+            missing = SKIP if relation.auto_created and not relation.concrete and not field.allow_null else None
+            steps.append((name,nested(prefix + lookup,missing,lambda row, inner=inner: {key: value for key, accessor in inner if (value := accessor(row)) is not SKIP})))
+        elif isinstance(field,serializers.SerializerMethodField):
+            raise ImproperlyConfigured(f"{dotted} is a SerializerMethodField; declare it in flat_fields.")
+        elif match := DISPLAY_SOURCE.match(field.source):
+            choices_field, lookup = resolve(model,match.group(1))
+            labels = {value: str(label) for value, label in choices_field.flatchoices}
+            lookups.append(prefix + lookup)
+            steps.append((name,column(prefix + lookup,lambda value, labels=labels: labels.get(value,value))))
+        else:
+            model_field, lookup = resolve(model,field.source)
+            # values() gives a relation's key, which is what a PrimaryKeyRelatedField or an *_id source renders
+            if model_field.is_relation and not (isinstance(field,PrimaryKeyRelatedField) or field.source.split('.')[-1] == model_field.attname):
+                raise ImproperlyConfigured(f"{dotted} renders a related object; declare it in flat_fields.")
+            lookups.append(prefix + lookup)
+            plain = isinstance(field,PASSTHROUGH) or (isinstance(field,serializers.CharField) and isinstance(model_field,TEXT_FIELDS))
+            steps.append((name,column(prefix + lookup,None if plain else field.to_representation)))
+    return steps
+
+
+@cache
+def compile_serializer(serializer_class):
+    serializer = serializer_class()
+    lookups = []
+    steps = compile_fields(serializer,serializer_class.Meta.model,'','',getattr(serializer_class,'flat_fields',{}),lookups)
+    return FlatSerializer(list(dict.fromkeys(lookups)),steps)
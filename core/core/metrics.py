@@ -0,0 +1,119 @@
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# In-process metrics registry rendered in the Prometheus text format. Every
+# worker process keeps its own numbers; scrape each one (or sum them).
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.types = {}
+        self.values = defaultdict(float)
+        self.histograms = {}
+        self.collectors = []
+
+    def collector(self,func):
+        # func(registry) runs before every render, for values read from shared
+        # state (database, cache) instead of counted in this process
+        self.collectors.append(func)
+        return func
+
+    def describe(self,name,kind,text):
+        self.types[name] = kind
+        self.help[name] = text
+
+    def inc(self,name,value=1,**labels):
+        key = (name,tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] += value
+
+    def set(self,name,value,**labels):
+        key = (name,tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self,name,value,**labels):
+        key = (name,tuple(sorted(labels.items())))
+        with self.lock:
+            buckets,total = self.histograms.get(key,([0] * len(LATENCY_BUCKETS),[0,0.0]))
+            for i,bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            total[0] += 1
+            total[1] += value
+            self.histograms[key] = (buckets,total)
+
+    def get(self,name,**labels):
+        return self.values.get((name,tuple(sorted(labels.items()))),0)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+            self.histograms.clear()
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect(self)
+            except Exception:
+                logger.exception(f"Metrics collector {collect.__name__} failed")
+        lines = []
+        with self.lock:
+            values = sorted(self.values.items())
+            histograms = sorted(self.histograms.items())
+        described = set()
+
+        def header(name):
+            if name not in described and name in self.types:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+
+        for (name,labels),value in values:
+            header(name)
+            lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for (name,labels),(buckets,(count,total)) in histograms:
+            header(name)
+            for bound,bucket in zip(LATENCY_BUCKETS,buckets):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le',f'{bound:g}'),))} {bucket}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le','+Inf'),))} {count}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total:g}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = ((key,str(value).replace('\\','\\\\').replace('"','\\"')) for key,value in labels)
+    pairs = ",".join(f'{key}="{value}"' for key,value in escaped)
+    return "{" + pairs + "}"
+
+
+registry = Registry()
+
+registry.describe("http_requests_total","counter","Requests served, by view and status.")
+registry.describe("http_request_duration_seconds","histogram","Wall time per request, by view.")
+registry.describe("http_db_queries_total","counter","SQL queries issued, by view.")
+registry.describe("http_db_seconds_total","counter","Time spent in SQL, by view.")
+registry.describe("http_app_seconds_total","counter","Time spent in the view outside SQL (serializers, permissions), by view.")
+registry.describe("http_render_seconds_total","counter","Time spent rendering the response body, by view.")
+registry.describe("http_response_bytes_total","counter","Response body bytes, by view.")
+
+
+def metrics_view(request):
+    # Staff sessions or scrapers from METRICS_ALLOWED_IPS only
+    allowed = getattr(settings,'METRICS_ALLOWED_IPS',[])
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR') in allowed):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),content_type="text/plain; version=0.0.4; charset=utf-8")
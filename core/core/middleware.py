@@ -0,0 +1,148 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.view_started = self.view_ended = None
+        self.db_at_view_start = self.db_at_view_end = 0.0
+        self.render = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: counts and times every SQL statement
+        started = time.perf_counter()
+        try:
+            return execute(sql,params,many,context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def view_done(self):
+        if self.view_ended is None:
+            self.view_ended = time.perf_counter()
+            self.db_at_view_end = self.db
+
+    @property
+    def app(self):
+        # View time not spent in SQL: serializers, permissions, Python work
+        if self.view_started is None:
+            return 0.0
+        view = self.view_ended - self.view_started
+        return max(view - (self.db_at_view_end - self.db_at_view_start),0.0)
+
+
+# Under ASGI the queries of a request run in worker threads (sync_to_async),
+# each with its own connection, so a per-connection wrapper installed for the
+# request can't see them. Every connection gets record_query instead, which
+# reports to the timings of the request in the current context.
+current_timings = ContextVar('request_timings',default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql,params,many,context)
+    return timings(execute,sql,params,many,context)
+
+
+def install_record_query(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_record_query)
+
+
+class QueryMetricsMiddleware:
+    """
+    Records SQL query count, DB time, view time outside SQL ("app": serializers,
+    permissions, Python work), render time and response size per view/action.
+    Numbers go to the Server-Timing header and the /metrics/ registry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # The hooks only read the clock; no thread hop for them
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings,'REQUEST_METRICS_ENABLED',True):
+            return self.get_response(request)
+        timings = request._timings = RequestTimings()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timings):
+            response = self.get_response(request)
+        return self.finish(request,response,timings,started)
+
+    async def __acall__(self, request):
+        if not getattr(settings,'REQUEST_METRICS_ENABLED',True):
+            return await self.get_response(request)
+        timings = request._timings = RequestTimings()
+        started = time.perf_counter()
+        token = current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request,response,timings,started)
+
+    def finish(self, request, response, timings, started):
+        timings.view_done()
+        total = time.perf_counter() - started
+
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        registry.inc("http_requests_total",view=view,method=request.method,status=response.status_code)
+        registry.observe("http_request_duration_seconds",total,view=view)
+        registry.inc("http_db_queries_total",timings.queries,view=view)
+        registry.inc("http_db_seconds_total",timings.db,view=view)
+        registry.inc("http_app_seconds_total",timings.app,view=view)
+        registry.inc("http_render_seconds_total",timings.render,view=view)
+        registry.inc("http_response_bytes_total",size,view=view)
+
+        response['Server-Timing'] = ", ".join([
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+            f'app;dur={timings.app * 1000:.2f}',
+            f'render;dur={timings.render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f};desc="{size} bytes"',
+        ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = getattr(request,'_timings',None)
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+            timings.db_at_view_start = timings.db
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that separately
+        timings = getattr(request,'_timings',None)
+        if timings is not None:
+            timings.view_done()
+            render_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: setattr(timings,'render',time.perf_counter() - render_started))
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return QueryMetricsMiddleware.process_view(self,request,view_func,view_args,view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return QueryMetricsMiddleware.process_template_response(self,request,response)
@@ -0,0 +1,48 @@
+from rest_framework.pagination import CursorPagination
+
+# Keyset pagination: every page is an indexed range scan from the cursor
+# position, so the cost does not grow with how deep the client has paged.
+
+
+class FetchPage(Exception):
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+
+class PageQuery:
+    # Stands in for the queryset inside CursorPagination.paginate_queryset, so
+    # the async views can fetch the page with the async ORM: the first pass
+    # stops at the page slice with the final query, the second replays the
+    # same steps over the fetched rows
+    def __init__(self, queryset, rows=None):
+        self.queryset = queryset
+        self.rows = rows
+
+    @property
+    def query(self):
+        return self.queryset.query
+
+    def order_by(self, *fields):
+        return PageQuery(self.queryset.order_by(*fields),self.rows)
+
+    def filter(self, *args, **kwargs):
+        return PageQuery(self.queryset.filter(*args,**kwargs),self.rows)
+
+    def __getitem__(self, key):
+        if self.rows is None:
+            raise FetchPage(self.queryset[key])
+        return self.rows
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = ('id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        try:
+            return self.paginate_queryset(PageQuery(queryset),request,view)
+        except FetchPage as fetch:
+            rows = [row async for row in fetch.queryset]
+        return self.paginate_queryset(PageQuery(queryset,rows),request,view)
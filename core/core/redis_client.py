@@ -0,0 +1,11 @@
+import redis
+from django.conf import settings
+
+_clients = {}
+
+def get_redis(url=None):
+    # One pooled client per URL and process
+    url = url or settings.REDIS_URL
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url,socket_timeout=0.5,socket_connect_timeout=0.5)
+    return _clients[url]
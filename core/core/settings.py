@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -36,7 +37,7 @@ ALLOWED_HOSTS = []
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':[
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'users.authentication.ClaimsJWTAuthentication'
     ],
     'DEFAULT_PERMISSION_CLASSES':[
         'rest_framework.permissions.AllowAny'
@@ -45,13 +46,22 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer'
+    ],
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.IdCursorPagination",
+    "PAGE_SIZE": 20,
     "DATETIME_FORMAT": "%Y-%m-%dT%H:%M:%S%z",
     "DEFAULT_SCHEMA_CLASS" : "drf_spectacular.openapi.AutoSchema",
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=8)
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=8),
+    # Tokens carry role/profile claims, so authenticated requests skip the user query
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.ClaimsTokenRefreshSerializer",
 }
 
 # Application definition
@@ -59,19 +69,86 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = 'django-db' 
 
+# Same Redis server as the broker, separate database for application data
+REDIS_URL = "redis://localhost:6379/1"
+SEAT_INVENTORY_ENABLED = True
+SEAT_INVENTORY_TTL = 60 * 60
+
+# Per-request query count/timing (Server-Timing header, /metrics/)
+REQUEST_METRICS_ENABLED = True
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+GEOCODER_BACKEND = "rides.geocoding.NominatimBackend"
+GEOCODER_USER_AGENT = "carpool_app"
+GEOCODER_RATE_LIMIT = 1.0  # requests per second shared by all workers (Nominatim policy)
+GEOCODER_BATCH_SIZE = 50
+
 load_dotenv()
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# For local testing: EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend,
+# or a debugging SMTP server (python -m aiosmtpd -n -l localhost:1025) with
+# SMTP_HOST=localhost SMTP_PORT=1025 SMTP_USE_TLS=0
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND',"django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.getenv('SMTP_HOST',"smtp.gmail.com")
+EMAIL_PORT = int(os.getenv('SMTP_PORT',587))
+EMAIL_USE_TLS = os.getenv('SMTP_USE_TLS','1') == '1'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST')
 EMAIL_HOST_PASSWORD = os.getenv('SMTP_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Redis by default, so cached claims, token state and ride responses (and
+# their invalidations) are shared by every worker. CACHE_BACKEND=locmem keeps
+# the cache per process: CACHE_SHARED is then off and those caches are read
+# through to the database. The test runner is a single process on locmem.
+TESTING = sys.argv[1:2] == ['test']
+CACHE_BACKEND = os.getenv('CACHE_BACKEND','locmem' if TESTING else 'redis')
+if CACHE_BACKEND == 'redis':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache','LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+CACHE_SHARED = CACHE_BACKEND == 'redis' or TESTING
+AUTH_CLAIMS_TTL = 5 * 60
+# Rendered ride list/detail responses (rides.response_cache)
+RIDE_RESPONSE_CACHE_TTL = int(os.getenv('RIDE_RESPONSE_CACHE_TTL',30))
+
 CELERY_BEAT_SCHEDULE = {
     "mark-completed-rides-every-5-mins":{
         "task":"rides.tasks.mark_completed_rides",
         "schedule": crontab(minute='*/5')
+    },
+    # Keeps recurring rides scheduled rides.recurring.HORIZON ahead
+    "generate-recurring-rides-hourly":{
+        "task":"rides.tasks.generate_recurring_rides_task",
+        "schedule": crontab(minute=15)
+    },
+    "geocode-pending-locations-every-minute":{
+        "task":"rides.tasks.geocode_pending_locations_task",
+        "schedule": crontab(minute='*')
+    },
+    "repair-seat-inventory-every-5-mins":{
+        "task":"bookings.tasks.repair_seat_inventory",
+        "schedule": crontab(minute='*/5')
+    },
+    "snapshot-seat-ledger-every-10-mins":{
+        "task":"bookings.tasks.snapshot_seat_ledger",
+        "schedule": crontab(minute='*/10')
+    },
+    "reconcile-seat-ledger-hourly":{
+        "task":"bookings.tasks.reconcile_seat_ledger",
+        "schedule": crontab(minute=30)
+    },
+    "sync-ride-search-index-every-10-mins":{
+        "task":"rides.tasks.sync_ride_search_index_task",
+        "schedule": crontab(minute='*/10')
+    },
+    # Safety net for emails whose on-commit dispatch was lost or is backing off
+    "dispatch-outbox-every-minute":{
+        "task":"notifications.tasks.dispatch_outbox_task",
+        "schedule": crontab(minute='*')
+    },
+    # Publishes task intents whose on-commit relay failed or never ran
+    "relay-task-intents-every-minute":{
+        "task":"notifications.tasks.relay_task_intents_task",
+        "schedule": crontab(minute='*')
     }
 }
 
@@ -90,9 +167,13 @@ INSTALLED_APPS = [
     'users',
     'rides',
     'bookings',
+    'notifications',
+    'exports',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
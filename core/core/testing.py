@@ -0,0 +1,52 @@
+from contextlib import ContextDecorator
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """
+    Fails when the wrapped test (or block) runs more than max_queries SQL
+    queries, listing the statements so an N+1 shows up right in the CI log:
+
+        @query_budget(3)
+        def test_listing(self): ...
+    """
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+
+    def __enter__(self):
+        self.captured = CaptureQueriesContext(connection)
+        self.captured.__enter__()
+        return self.captured
+
+    def __exit__(self, exc_type, exc, tb):
+        self.captured.__exit__(exc_type,exc,tb)
+        if exc_type is None and len(self.captured) > self.max_queries:
+            statements = "\n".join(f"{i}. {query['sql']}" for i,query in enumerate(self.captured.captured_queries,start=1))
+            raise QueryBudgetExceeded(f"{len(self.captured)} queries run, budget is {self.max_queries}:\n{statements}")
+        return False
+
+
+def shared_caches(count=2):
+    # One RedisCache client per simulated worker, all on the same in-memory
+    # Redis server (needs fakeredis)
+    server = fakeredis.FakeServer()
+    return [RedisCache('redis://workers/0',{'OPTIONS': {'connection_class': fakeredis.FakeConnection,'server': server}}) for _ in range(count)]
+
+
+def process_caches(count=2):
+    # One private local-memory cache per simulated worker (CACHE_BACKEND=locmem)
+    return [LocMemCache(f'worker-{i}',{}) for i in range(count)]
@@ -18,15 +18,22 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from bookings.urls import async_urlpatterns as booking_async_urls
+from core.metrics import metrics_view
+from rides.urls import async_urlpatterns as ride_async_urls
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('user/', include('users.urls')),
     path('', include('rides.urls')),
     path('', include('bookings.urls')),
+    path('', include('exports.urls')),
+    # Async variants of the hot read endpoints, for the ASGI deployment
+    path('async/', include(ride_async_urls + booking_async_urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_view'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh_view'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
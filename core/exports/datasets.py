@@ -0,0 +1,99 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from bookings.models import Booking, Payment
+from rides.models import Ride
+
+# What the analytics exports contain. Columns are values_list() lookups, so
+# rows stream off the cursor as tuples without building model instances;
+# date_field is what the --since/--until range and the partitions filter on.
+
+CHUNK_SIZE = 5000
+
+
+class ExportDataset:
+    def __init__(self, model, date_field, columns):
+        self.model = model
+        self.date_field = date_field
+        self.columns = columns  # (name, lookup)
+
+    @property
+    def names(self):
+        return [name for name, _ in self.columns]
+
+    @property
+    def fields(self):
+        # Model field behind every column, for the typed formats
+        fields = []
+        for _, lookup in self.columns:
+            model, *path, last = [self.model,*lookup.split('__')]
+            for name in path:
+                model = model._meta.get_field(name).related_model
+            fields.append(model._meta.get_field(last))
+        return fields
+
+    def queryset(self, since=None, until=None):
+        rows = self.model.objects.all()
+        if since:
+            rows = rows.filter(**{f"{self.date_field}__gte": start_of(since)})
+        if until:
+            rows = rows.filter(**{f"{self.date_field}__lt": start_of(until)})
+        return rows.order_by('pk').values_list(*[lookup for _, lookup in self.columns])
+
+    def batches(self, since=None, until=None, chunk_size=CHUNK_SIZE):
+        # Lists of row tuples read through a server-side cursor (chunked
+        # fetches on SQLite), so memory stays flat however big the table is
+        batch = []
+        for row in self.queryset(since,until).iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def partitions(self, period, since=None, until=None):
+        # (label, since, until) for every day or month from the first row to
+        # the last one in the range, in local time
+        bounds = self.queryset(since,until).aggregate(first=Min(self.date_field),last=Max(self.date_field))
+        if bounds['first'] is None:
+            return
+        start, last = timezone.localtime(bounds['first']).date(), timezone.localtime(bounds['last']).date()
+        if period == 'month':
+            start = start.replace(day=1)
+        while start <= last:
+            if period == 'day':
+                end, label = start + timedelta(days=1), start.isoformat()
+            else:
+                end, label = (start.replace(day=28) + timedelta(days=4)).replace(day=1), start.strftime('%Y-%m')
+            yield label, max(start,since) if since else start, min(end,until) if until else end
+            start = end
+
+
+def start_of(day):
+    return timezone.make_aware(datetime.combine(day,time.min))
+
+
+DATASETS = {
+    'rides': ExportDataset(Ride,'start_time',[
+        ('id','id'),('driver_id','driver_id'),('vehicle_id','vehicle_id'),
+        ('source','source__name'),('destination','destination__name'),
+        ('boarding_points','boarding_points'),('dropping_points','dropping_points'),
+        ('fare','fare'),('seats_offered','seats_offered'),('seats_booked','seats_booked'),('status','status'),
+        ('start_time','start_time'),('end_time','end_time'),('created_at','created_at'),('updated_at','updated_at'),
+    ]),
+    # Bookings have no timestamp of their own; they go with their ride's date
+    'bookings': ExportDataset(Booking,'ride__start_time',[
+        ('id','id'),('passenger_id','passenger_id'),('ride_id','ride_id'),
+        ('boarding_point','boarding_point'),('dropping_point','dropping_point'),
+        ('seats_booked','seats_booked'),('board_stop','board_stop'),('drop_stop','drop_stop'),('status','status'),
+        ('ride_start_time','ride__start_time'),
+    ]),
+    'payments': ExportDataset(Payment,'created_at',[
+        ('id','id'),('booking_id','booking_id'),('amount','amount'),('status','status'),
+        ('transaction_id','transaction_id'),('payment_method','payment_method'),
+        ('created_at','created_at'),('updated_at','updated_at'),
+    ]),
+}
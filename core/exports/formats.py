@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+
+from django.db import models
+
+from .datasets import CHUNK_SIZE
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Encoders turn batches of row tuples into a stream of bytes, one piece per
+# batch (Parquet: per row group), so an export can be written to a file or
+# sent as a StreamingHttpResponse without ever holding the whole table.
+
+ROW_GROUP_SIZE = 100000
+
+
+class ExportError(Exception):
+    pass
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def json_text(value):
+    return json.dumps(value) if value is not None else None
+
+
+def row_converter(fields, conversions):
+    # Applies conversions (field class -> function) to the matching columns
+    converters = [next((convert for kind, convert in conversions.items() if isinstance(field,kind)),None) for field in fields]
+    if not any(converters):
+        return lambda row: row
+    pairs = list(enumerate(converters))
+    return lambda row: [convert(row[i]) if convert else row[i] for i, convert in pairs]
+
+
+def drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data.encode()
+
+
+def encode_csv(names, fields, batches):
+    convert = row_converter(fields,{models.DateTimeField: isoformat,models.JSONField: json_text})
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    yield drain(buffer)
+    for batch in batches:
+        writer.writerows(map(convert,batch))
+        yield drain(buffer)
+
+
+def encode_ndjson(names, fields, batches):
+    # Decimals as strings, like the API
+    convert = row_converter(fields,{models.DateTimeField: isoformat,models.DecimalField: str})
+    encode = json.JSONEncoder(separators=(',',':'),ensure_ascii=False).encode
+    for batch in batches:
+        yield "".join(encode(dict(zip(names,convert(row)))) + "\n" for row in batch).encode()
+
+
+def arrow_type(field):
+    if isinstance(field,models.DecimalField):
+        return pyarrow.decimal128(field.max_digits,field.decimal_places)
+    if isinstance(field,models.DateTimeField):
+        return pyarrow.timestamp('us',tz='UTC')
+    if isinstance(field,models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field,(models.IntegerField,models.ForeignKey)):
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+class Drain(io.RawIOBase):
+    # File-like sink for ParquetWriter whose bytes are handed out after every row group
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def encode_parquet(names, fields, batches):
+    schema = pyarrow.schema([(name,arrow_type(field)) for name, field in zip(names,fields)])
+    convert = row_converter(fields,{models.JSONField: json_text})
+    sink = Drain()
+    writer = pyarrow.parquet.ParquetWriter(sink,schema,compression='zstd')
+
+    def row_group(rows):
+        columns = list(zip(*rows))
+        writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column,type=kind) for column, kind in zip(columns,schema.types)],schema=schema))
+        return sink.drain()
+
+    pending = []
+    for batch in batches:
+        pending += map(convert,batch)
+        if len(pending) >= ROW_GROUP_SIZE:
+            yield row_group(pending)
+            pending = []
+    if pending:
+        yield row_group(pending)
+    writer.close()
+    yield sink.drain()
+
+
+class ExportFormat:
+    def __init__(self, encode, content_type, extension, requires=None):
+        self.encode = encode
+        self.content_type = content_type
+        self.extension = extension
+        self.requires = requires
+
+    def check(self):
+        if self.requires == 'pyarrow' and pyarrow is None:
+            raise ExportError("Parquet exports need pyarrow (pip install pyarrow).")
+
+
+FORMATS = {
+    'csv': ExportFormat(encode_csv,'text/csv; charset=utf-8','csv'),
+    'ndjson': ExportFormat(encode_ndjson,'application/x-ndjson','ndjson'),
+    'parquet': ExportFormat(encode_parquet,'application/vnd.apache.parquet','parquet',requires='pyarrow'),
+}
+
+
+def stream_export(dataset, file_format, since=None, until=None, chunk_size=CHUNK_SIZE, stats=None):
+    # Bytes of one export; stats (a dict), if given, counts the rows as they go
+    export_format = FORMATS[file_format]
+    export_format.check()
+
+    def counted(batches):
+        for batch in batches:
+            stats['rows'] += len(batch)
+            yield batch
+
+    batches = dataset.batches(since,until,chunk_size)
+    if stats is not None:
+        stats.setdefault('rows',0)
+        batches = counted(batches)
+    return export_format.encode(dataset.names,dataset.fields,batches)
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exports.datasets import CHUNK_SIZE, DATASETS
+from exports.formats import FORMATS, ExportError, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream rides, bookings and payments to CSV, NDJSON or Parquet files, optionally one file per day or month."
+
+    def add_arguments(self, parser):
+        parser.add_argument('datasets',nargs='+',choices=list(DATASETS))
+        parser.add_argument('--format',choices=list(FORMATS),default='csv')
+        parser.add_argument('--since',type=date.fromisoformat,help="First local date to export (inclusive).")
+        parser.add_argument('--until',type=date.fromisoformat,help="Local date to stop at (exclusive).")
+        parser.add_argument('--partition',choices=['none','day','month'],default='none',
+                            help="Write <output>/<dataset>/<day or month>.<ext> files instead of one file per dataset.")
+        parser.add_argument('--output',default='-',help="Directory for the files, or - for stdout (one dataset, no partitions).")
+        parser.add_argument('--chunk-size',type=int,default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until']
+        if since and until and since >= until:
+            raise CommandError("--since should be before --until.")
+        to_stdout = options['output'] == '-'
+        if to_stdout and (len(options['datasets']) > 1 or options['partition'] != 'none'):
+            raise CommandError("Several datasets or partitions need an --output directory.")
+        try:
+            FORMATS[options['format']].check()
+        except ExportError as e:
+            raise CommandError(e)
+
+        extension = FORMATS[options['format']].extension
+        for name in options['datasets']:
+            dataset = DATASETS[name]
+            if to_stdout:
+                self.write(dataset,None,since,until,options)
+            elif options['partition'] == 'none':
+                self.write(dataset,Path(options['output']) / f"{name}.{extension}",since,until,options)
+            else:
+                for label, start, end in dataset.partitions(options['partition'],since,until):
+                    self.write(dataset,Path(options['output']) / name / f"{label}.{extension}",start,end,options)
+
+    def write(self, dataset, path, since, until, options):
+        stats = {}
+        started = time.perf_counter()
+        chunks = stream_export(dataset,options['format'],since,until,options['chunk_size'],stats)
+        if path is None:
+            size = 0
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+                size += len(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            # Written next to the target and renamed when complete, so readers
+            # never pick up a half-written file
+            path.parent.mkdir(parents=True,exist_ok=True)
+            partial = path.with_name(path.name + '.partial')
+            with open(partial,'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                size = f.tell()
+            if stats['rows'] or options['partition'] == 'none':
+                os.replace(partial,path)
+            else:
+                # A day or month without rows in range
+                partial.unlink()
+                return
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"{path or 'stdout'}: {stats['rows']} rows, {size / 2**20:.1f} MiB in {elapsed:.1f}s")
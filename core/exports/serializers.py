@@ -0,0 +1,12 @@
+from rest_framework import serializers
+
+
+class ExportRangeSerializer(serializers.Serializer):
+    # Local dates; since is inclusive, until exclusive
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('since') and attrs.get('until') and attrs['since'] >= attrs['until']:
+            raise serializers.ValidationError("since should be before until.")
+        return attrs
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import tempfile
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks.fixtures import create_bookings, create_locations, create_rides, create_users, create_vehicles
+from benchmarks.runner import access_token
+from bookings.models import Booking
+from rides.models import Ride
+from users.models import User
+
+from .datasets import DATASETS
+from .formats import pyarrow, stream_export
+
+# Create your tests here.
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.rides = create_rides(create_vehicles(create_users(2,'driver')),create_locations(4),6,prebooked=False)
+        # Three rides this month, three next month
+        first = timezone.localtime().replace(day=1,hour=10) + timedelta(days=40)
+        for i, ride in enumerate(self.rides):
+            ride.start_time = first.replace(day=1) + timedelta(days=i // 3 * 31,hours=i)
+            ride.end_time = ride.start_time + timedelta(hours=1)
+        Ride.objects.bulk_update(self.rides,['start_time','end_time'])
+        create_bookings(self.rides,create_users(10,'passenger'),12)
+
+    def export(self, name, file_format, **kwargs):
+        return b"".join(stream_export(DATASETS[name],file_format,chunk_size=5,**kwargs))
+
+    def test_formats_hold_every_row(self):
+        ids = sorted(Booking.objects.values_list('id',flat=True))
+        rows = list(csv.DictReader(io.StringIO(self.export('bookings','csv').decode())))
+        self.assertEqual([int(row['id']) for row in rows],ids)
+        lines = [json.loads(line) for line in self.export('rides','ndjson').decode().splitlines()]
+        self.assertEqual(lines[0]['boarding_points'],self.rides[0].boarding_points)
+        self.assertEqual(Decimal(lines[0]['fare']),self.rides[0].fare)
+
+    @unittest.skipUnless(pyarrow,"pyarrow is not installed")
+    def test_parquet_is_typed(self):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(io.BytesIO(self.export('payments','parquet')))
+        self.assertEqual(table.num_rows,Booking.objects.count())
+        self.assertEqual(str(table.schema.field('amount').type),'decimal128(8, 2)')
+
+    def test_command_partitions_by_month(self):
+        with tempfile.TemporaryDirectory() as output:
+            call_command('export_data','rides','bookings','--partition','month','--output',output,stderr=io.StringIO())
+            files = sorted(Path(output,'rides').iterdir())
+            self.assertEqual(len(files),2)
+            self.assertEqual([len(path.read_text().splitlines()) - 1 for path in files],[3,3])
+            bookings = sum(len(path.read_text().splitlines()) - 1 for path in Path(output,'bookings').iterdir())
+            self.assertEqual(bookings,Booking.objects.count())
+
+    def test_endpoint_streams_to_admins_only(self):
+        client = APIClient()
+        client.force_authenticate(create_users(1,'passenger')[0])
+        self.assertEqual(client.get(reverse('export',args=['rides','csv'])).status_code,403)
+
+        admin = create_users(1,'admin')[0]
+        admin.is_staff = True
+        client.force_authenticate(admin)
+        since = timezone.localtime(self.rides[3].start_time).date()
+        response = client.get(reverse('export',args=['rides','ndjson']),{'since': since.isoformat()})
+        self.assertTrue(response.streaming)
+        self.assertIn('rides-',response['Content-Disposition'])
+        ids = [json.loads(line)['id'] for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(ids,[ride.id for ride in self.rides[3:]])
+        self.assertEqual(client.get(reverse('export',args=['users','csv'])).status_code,404)
+        self.assertEqual(client.get(reverse('export',args=['rides','csv']),{'since': '2026-02-01','until': '2026-01-01'}).status_code,400)
+
+    async def test_endpoint_streams_chunk_by_chunk_under_asgi(self):
+        admin = (await sync_to_async(create_users)(1,'admin'))[0]
+        await User.objects.filter(id=admin.id).aupdate(is_staff=True)
+        admin.is_staff = True
+        headers = {'Authorization': f"Bearer {await sync_to_async(access_token)(admin)}"}
+        response = await self.async_client.get(reverse('export',args=['bookings','csv']),headers=headers)
+        # Sent as it's produced, not collected into a list first
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        ids = [int(row['id']) for row in csv.DictReader(io.StringIO(b"".join(chunks).decode()))]
+        self.assertEqual(ids,sorted(await sync_to_async(list)(Booking.objects.values_list('id',flat=True))))
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import ExportView
+
+urlpatterns = [
+    path('exports/<str:dataset>.<str:file_format>',ExportView.as_view(),name='export'),
+]
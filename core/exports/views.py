@@ -0,0 +1,54 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from .datasets import DATASETS
+from .formats import FORMATS, ExportError, stream_export
+from .serializers import ExportRangeSerializer
+
+# Create your views here.
+
+END = object()
+
+
+async def aiterate(stream):
+    # Under ASGI, Django buffers a sync iterator whole before sending it.
+    # Each chunk is produced on the request's sync thread instead (where the
+    # export's queries and its connection live) and sent as soon as it's ready.
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(stream,END)) is not END:
+            yield chunk
+    finally:
+        await sync_to_async(stream.close)()
+
+class ExportView(APIView):
+    # GET /exports/bookings.csv?since=2026-01-01&until=2026-02-01
+    permission_classes = [IsAuthenticated,IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The file format comes from the URL; errors are rendered as JSON
+        renderer = JSONRenderer()
+        return renderer, renderer.media_type
+
+    def get(self, request, dataset, file_format):
+        if dataset not in DATASETS or file_format not in FORMATS:
+            raise NotFound(f"Exports: {', '.join(DATASETS)} as {', '.join(FORMATS)}.")
+        params = ExportRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since, until = params.validated_data.get('since'), params.validated_data.get('until')
+        try:
+            stream = stream_export(DATASETS[dataset],file_format,since,until)
+        except ExportError as e:
+            raise ValidationError({"format": str(e)})
+
+        name = "-".join([dataset,*(day.isoformat() for day in (since,until) if day)])
+        if isinstance(request._request,ASGIRequest):
+            stream = aiterate(stream)
+        response = StreamingHttpResponse(stream,content_type=FORMATS[file_format].content_type)
+        response['Content-Disposition'] = f'attachment; filename="{name}.{FORMATS[file_format].extension}"'
+        return response
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import OutboxEmail, TaskIntent
+
+
+# Register your models here.
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['id','subject','recipients','status','attempts','next_attempt_at','sent_at','created_at']
+    list_filter = ['status']
+    search_fields = ['dedup_key','subject']
+    readonly_fields = ['created_at','sent_at']
+
+
+@admin.register(TaskIntent)
+class TaskIntentAdmin(admin.ModelAdmin):
+    list_display = ['id','task_name','idempotency_key','status','attempts','created_at','published_at','completed_at']
+    list_filter = ['status','task_name']
+    search_fields = ['idempotency_key','task_name']
+    readonly_fields = ['created_at','published_at','completed_at']
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import BATCH_SIZE, dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = "Send due outbox emails without Celery, once or in a loop (local SMTP debugging)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',type=int,default=BATCH_SIZE)
+        parser.add_argument('--loop',action='store_true',help="Keep polling until interrupted.")
+        parser.add_argument('--interval',type=float,default=5,help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent = dispatch_outbox(batch_size=options['batch_size'])
+            self.stdout.write(f"{sent} emails sent.")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
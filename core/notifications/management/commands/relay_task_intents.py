@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.relay import BATCH_SIZE, relay_intents
+
+
+class Command(BaseCommand):
+    help = "Publish pending task intents to the broker, once or in a loop (a relay process independent of the beat)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',type=int,default=BATCH_SIZE)
+        parser.add_argument('--loop',action='store_true',help="Keep polling until interrupted.")
+        parser.add_argument('--interval',type=float,default=1,help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            published = relay_intents(batch_size=options['batch_size'])
+            self.stdout.write(f"{published} task intents published.")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
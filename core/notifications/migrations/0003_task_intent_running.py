@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_task_intent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskintent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('published', 'Published'), ('running', 'Running'), ('done', 'Done')], default='pending', max_length=10),
+        ),
+    ]
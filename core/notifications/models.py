@@ -0,0 +1,62 @@
+from django.db import models
+from django.utils import timezone
+
+# Create your models here.
+
+class OutboxEmail(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    # Same key, same email: enqueueing twice (task retries, double submits) sends once
+    dedup_key = models.CharField(max_length=200,unique=True)
+    subject = models.CharField(max_length=250)
+    body = models.TextField()
+    from_email = models.CharField(max_length=250,blank=True,null=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10,choices=StatusChoices.choices,default=StatusChoices.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True,null=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher's scan: due pending rows, oldest first
+            models.Index(fields=['status','next_attempt_at'],name='outbox_email_due_idx'),
+            models.Index(fields=['sent_at'],name='outbox_email_sent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+class TaskIntent(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        PUBLISHED = 'published', 'Published'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+
+    # Also the Celery task id, so the worker can find its intent
+    idempotency_key = models.CharField(max_length=200,unique=True)
+    task_name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10,choices=StatusChoices.choices,default=StatusChoices.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True,null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(blank=True,null=True)
+    completed_at = models.DateTimeField(blank=True,null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status','available_at'],name='task_intent_due_idx'),
+            models.Index(fields=['published_at'],name='task_intent_published_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} {self.idempotency_key} ({self.status})"
@@ -0,0 +1,127 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.metrics import registry
+
+from .models import OutboxEmail, TaskIntent
+from .relay import enqueue_task
+
+logger = logging.getLogger(__name__)
+
+# Transactional email outbox. Callers write OutboxEmail rows inside their own
+# transaction (a rolled back booking sends nothing); the dispatcher claims due
+# rows in batches, sends them over one SMTP connection and retries failures
+# with exponential backoff. Delivery is at-least-once: a worker that dies
+# mid-batch leaves its rows to be claimed again after CLAIM_TIMEOUT.
+
+BATCH_SIZE = 100
+MAX_BATCHES = 10  # per dispatch run, so one task never runs for long
+MAX_ATTEMPTS = 8
+RETRY_BASE = 30  # seconds, doubled after every failed attempt
+RETRY_MAX = 60 * 60
+CLAIM_TIMEOUT = timedelta(minutes=5)
+DISPATCH_TASK = 'notifications.tasks.dispatch_outbox_task'
+
+registry.describe("outbox_emails_total","counter","Outbox emails handled by this process's dispatcher, by result (sent, retry, failed).")
+registry.describe("outbox_emails_sent_last_minute","gauge","Outbox emails sent in the last minute, all workers.")
+registry.describe("outbox_emails_pending","gauge","Outbox emails waiting to be sent.")
+registry.describe("outbox_emails_failed","gauge","Outbox emails that gave up after MAX_ATTEMPTS.")
+
+
+def enqueue_emails(emails):
+    # emails: iterable of (dedup_key, subject, body, recipients). Keys already
+    # in the outbox are skipped.
+    OutboxEmail.objects.bulk_create([
+        OutboxEmail(dedup_key=key,subject=subject,body=body,recipients=list(recipients),from_email=settings.DEFAULT_FROM_EMAIL)
+        for key, subject, body, recipients in emails
+    ],ignore_conflicts=True)
+    # Wake the dispatcher right after commit instead of waiting for the beat.
+    # One waiting dispatch covers every email queued before it runs; the
+    # per-minute beat picks up anything that races past it. A published one
+    # whose lease ran out may never run, so it doesn't count.
+    if not TaskIntent.objects.filter(
+        Q(status=TaskIntent.StatusChoices.PENDING) |
+        Q(status=TaskIntent.StatusChoices.PUBLISHED,available_at__gt=timezone.now()),
+        task_name=DISPATCH_TASK
+    ).exists():
+        enqueue_task(DISPATCH_TASK)
+
+
+def enqueue_email(dedup_key, subject, body, recipients):
+    enqueue_emails([(dedup_key,subject,body,recipients)])
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE * 2 ** (attempts - 1),RETRY_MAX))
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutboxEmail.StatusChoices.PENDING,next_attempt_at__lte=now
+        ).order_by('next_attempt_at','id')[:batch_size])
+        OutboxEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            attempts=F('attempts') + 1,next_attempt_at=now + CLAIM_TIMEOUT
+        )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+
+def send_batch(batch):
+    connection = get_connection()
+    for email in batch:
+        message = EmailMessage(email.subject,email.body,email.from_email,email.recipients)
+        try:
+            # No-op while the connection is up, so the whole batch shares it
+            connection.open()
+            connection.send_messages([message])
+        except Exception as error:
+            # A broken connection is reopened for the next message
+            connection.close()
+            email.last_error = f"{type(error).__name__}: {error}"
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = OutboxEmail.StatusChoices.FAILED
+                registry.inc("outbox_emails_total",result='failed')
+                logger.error(f"Outbox email {email.id} failed for good: {email.last_error}")
+            else:
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                registry.inc("outbox_emails_total",result='retry')
+        else:
+            email.status = OutboxEmail.StatusChoices.SENT
+            email.sent_at = timezone.now()
+            email.last_error = None
+            registry.inc("outbox_emails_total",result='sent')
+    connection.close()
+    OutboxEmail.objects.bulk_update(batch,['status','next_attempt_at','last_error','sent_at'])
+
+
+def dispatch_outbox(batch_size=BATCH_SIZE, max_batches=MAX_BATCHES):
+    sent = 0
+    for _ in range(max_batches):
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        send_batch(batch)
+        sent += sum(email.status == OutboxEmail.StatusChoices.SENT for email in batch)
+        if len(batch) < batch_size:
+            break
+    if sent:
+        logger.info(f"Outbox: {sent} emails sent.")
+    return sent
+
+
+@registry.collector
+def collect_outbox_metrics(registry):
+    # From the table, so the numbers cover every worker process
+    counts = dict(OutboxEmail.objects.exclude(status=OutboxEmail.StatusChoices.SENT).values_list('status').annotate(count=Count('id')))
+    registry.set("outbox_emails_pending",counts.get(OutboxEmail.StatusChoices.PENDING,0))
+    registry.set("outbox_emails_failed",counts.get(OutboxEmail.StatusChoices.FAILED,0))
+    registry.set("outbox_emails_sent_last_minute",OutboxEmail.objects.filter(sent_at__gte=timezone.now() - timedelta(minutes=1)).count())
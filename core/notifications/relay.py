@@ -0,0 +1,177 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from celery import Task, current_app
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Q, Value, When
+from django.utils import timezone
+
+from core.metrics import registry
+
+from .models import TaskIntent
+
+logger = logging.getLogger(__name__)
+
+# Task outbox. Callers record a TaskIntent in their own transaction instead of
+# calling .delay(), so a worker never sees an id whose row isn't committed yet
+# and a rolled back request publishes nothing. After commit the intents of that
+# transaction are published in one go; whatever the hook misses (broker down,
+# process killed) is picked up by the relay task/command. The intent's key is
+# the Celery task id. IdempotentTask claims the intent (RUNNING) before the
+# body and marks it done after, each in its own short update, so a
+# redelivered message does nothing and no transaction spans the body's I/O.
+# A PUBLISHED intent holds a lease too (lost message, failed body that is not
+# retried): once it runs out the relay publishes the intent again.
+
+BATCH_SIZE = 200
+CLAIM_TIMEOUT = timedelta(minutes=2)
+RETRY_BASE = 5  # seconds, doubled after every failed publish
+RETRY_MAX = 10 * 60
+KEEP_DONE = timedelta(days=7)
+RUN_TIMEOUT = timedelta(minutes=15)  # a RUNNING intent older than this belongs to a dead worker
+PUBLISH_TIMEOUT = timedelta(minutes=10)  # a PUBLISHED intent not run by then is published again
+
+registry.describe("task_relay_published_total","counter","Task intents published to the broker by this process, by task.")
+registry.describe("task_relay_errors_total","counter","Failed attempts to publish a task intent, by task.")
+registry.describe("task_relay_lag_seconds","histogram","Seconds between recording a task intent and publishing it.")
+registry.describe("task_intents_pending","gauge","Task intents not yet published.")
+registry.describe("task_intents_oldest_pending_seconds","gauge","Age of the oldest unpublished task intent.")
+registry.describe("task_intents_published_last_minute","gauge","Task intents published in the last minute, all processes.")
+
+
+def enqueue_tasks(intents):
+    # intents: iterable of (task_name, args, kwargs, key); key None means a
+    # fresh uuid. Keys already recorded are skipped, so callers pass a natural
+    # key (e.g. "ride-created:12") when the same intent may be recorded twice.
+    intents = [
+        TaskIntent(idempotency_key=key or uuid.uuid4().hex,task_name=task_name,args=list(args),kwargs=kwargs or {})
+        for task_name, args, kwargs, key in intents
+    ]
+    TaskIntent.objects.bulk_create(intents,ignore_conflicts=True)
+    keys = [intent.idempotency_key for intent in intents]
+    transaction.on_commit(lambda: relay_intents(keys=keys))
+    return keys
+
+
+def enqueue_task(task_name, args=(), kwargs=None, key=None):
+    return enqueue_tasks([(task_name,args,kwargs,key)])[0]
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE * 2 ** (attempts - 1),RETRY_MAX))
+
+
+def claim_batch(batch_size, keys=None):
+    now = timezone.now()
+    with transaction.atomic():
+        intents = TaskIntent.objects.select_for_update(skip_locked=True).filter(
+            status__in=[TaskIntent.StatusChoices.PENDING,TaskIntent.StatusChoices.PUBLISHED],available_at__lte=now
+        )
+        if keys is not None:
+            intents = intents.filter(idempotency_key__in=keys)
+        batch = list(intents.order_by('available_at','id')[:batch_size])
+        TaskIntent.objects.filter(id__in=[intent.id for intent in batch]).update(
+            attempts=F('attempts') + 1,available_at=now + CLAIM_TIMEOUT
+        )
+    for intent in batch:
+        intent.attempts += 1
+    return batch
+
+
+def get_task(name):
+    # Web processes only import the task modules they use themselves
+    if name not in current_app.tasks:
+        current_app.loader.import_default_modules()
+    return current_app.tasks[name]
+
+
+def publish_batch(batch):
+    published = []
+    for intent in batch:
+        try:
+            # apply_async rather than send_task, so eager mode runs it inline
+            get_task(intent.task_name).apply_async(
+                args=intent.args,kwargs=intent.kwargs,task_id=intent.idempotency_key
+            )
+        except Exception as error:
+            intent.last_error = f"{type(error).__name__}: {error}"
+            intent.available_at = timezone.now() + retry_delay(intent.attempts)
+            registry.inc("task_relay_errors_total",task=intent.task_name)
+            logger.warning(f"Could not publish task intent {intent.idempotency_key}: {intent.last_error}")
+            TaskIntent.objects.filter(id=intent.id).update(last_error=intent.last_error,available_at=intent.available_at)
+            continue
+        intent.published_at = timezone.now()
+        registry.inc("task_relay_published_total",task=intent.task_name)
+        registry.observe("task_relay_lag_seconds",(intent.published_at - intent.created_at).total_seconds())
+        published.append(intent)
+    now = timezone.now()
+    # A fast (or eager) worker may already have claimed it or marked it done
+    waiting = Q(status__in=[TaskIntent.StatusChoices.PENDING,TaskIntent.StatusChoices.PUBLISHED])
+    TaskIntent.objects.filter(id__in=[intent.id for intent in published]).update(
+        published_at=now,last_error=None,
+        status=Case(When(waiting,then=Value(TaskIntent.StatusChoices.PUBLISHED)),default=F('status')),
+        available_at=Case(When(waiting,then=Value(now + PUBLISH_TIMEOUT)),default=F('available_at')),
+    )
+    return len(published)
+
+
+def relay_intents(batch_size=BATCH_SIZE, keys=None):
+    published = 0
+    while True:
+        batch = claim_batch(batch_size,keys)
+        if not batch:
+            break
+        published += publish_batch(batch)
+        if len(batch) < batch_size:
+            break
+    return published
+
+
+def purge_done_intents():
+    return TaskIntent.objects.filter(
+        status=TaskIntent.StatusChoices.DONE,completed_at__lt=timezone.now() - KEEP_DONE
+    ).delete()[0]
+
+
+class IdempotentTask(Task):
+    """
+    Base class for tasks published through the relay. A delivery runs only
+    if it can move the intent to RUNNING; a message whose intent is done or
+    running elsewhere is acknowledged without running. The body runs outside
+    any transaction, so it must tolerate being run again after a crash.
+    Calls that didn't come from an intent (.delay(), beat) run as usual.
+    """
+
+    def __call__(self, *args, **kwargs):
+        key = self.request.id
+        if key is None:
+            return super().__call__(*args,**kwargs)
+        now = timezone.now()
+        intents = TaskIntent.objects.filter(idempotency_key=key)
+        claimed = intents.filter(
+            Q(status__in=[TaskIntent.StatusChoices.PENDING,TaskIntent.StatusChoices.PUBLISHED]) |
+            Q(status=TaskIntent.StatusChoices.RUNNING,available_at__lt=now)
+        ).update(status=TaskIntent.StatusChoices.RUNNING,available_at=now + RUN_TIMEOUT)
+        if not claimed:
+            if intents.exists():
+                logger.info(f"Skipping duplicate delivery of {self.name} ({key}).")
+                return None
+            return super().__call__(*args,**kwargs)
+        try:
+            result = super().__call__(*args,**kwargs)
+        except Exception:
+            # Let a retry of the same message claim it again, or the relay
+            # publish it again once the lease runs out
+            intents.filter(status=TaskIntent.StatusChoices.RUNNING).update(status=TaskIntent.StatusChoices.PUBLISHED,available_at=timezone.now() + PUBLISH_TIMEOUT)
+            raise
+        intents.update(status=TaskIntent.StatusChoices.DONE,completed_at=timezone.now())
+        return result
+
+
+@registry.collector
+def collect_relay_metrics(registry):
+    pending = TaskIntent.objects.filter(status=TaskIntent.StatusChoices.PENDING).aggregate(count=Count('id'),oldest=Min('created_at'))
+    registry.set("task_intents_pending",pending['count'])
+    registry.set("task_intents_oldest_pending_seconds",(timezone.now() - pending['oldest']).total_seconds() if pending['oldest'] else 0)
+    registry.set("task_intents_published_last_minute",TaskIntent.objects.filter(published_at__gte=timezone.now() - timedelta(minutes=1)).count())
@@ -0,0 +1,17 @@
+from celery import shared_task
+
+from .outbox import dispatch_outbox
+from .relay import IdempotentTask, purge_done_intents, relay_intents
+
+
+@shared_task(base=IdempotentTask)
+def dispatch_outbox_task():
+    return dispatch_outbox()
+
+
+@shared_task
+def relay_task_intents_task():
+    # Publishes what the on-commit hooks missed
+    published = relay_intents()
+    purge_done_intents()
+    return published
@@ -0,0 +1,173 @@
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
+
+from celery import current_app
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.metrics import registry
+
+from . import outbox, relay
+from .models import OutboxEmail, TaskIntent
+from .tasks import dispatch_outbox_task
+
+# Create your tests here.
+
+class OutboxTests(TestCase):
+    def enqueue(self, count, prefix='test'):
+        outbox.enqueue_emails(
+            (f"{prefix}:{i}","Subject",f"Body {i}",[f"user{i}@example.com"])
+            for i in range(count)
+        )
+
+    def test_enqueue_is_transactional_and_deduplicated(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.enqueue(2,'rolled-back')
+            raise ValueError
+        self.enqueue(3)
+        self.enqueue(3)
+        self.assertEqual(OutboxEmail.objects.count(),3)
+
+    def test_dispatch_sends_a_batch_over_one_connection(self):
+        self.enqueue(5)
+        with mock.patch.object(outbox,'get_connection',wraps=get_connection) as connect:
+            self.assertEqual(outbox.dispatch_outbox(),5)
+        connect.assert_called_once()
+        self.assertEqual(len(mail.outbox),5)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.StatusChoices.SENT).exists())
+        self.assertEqual(outbox.dispatch_outbox(),0)
+
+        registry.clear()
+        self.assertIn("outbox_emails_sent_last_minute 5",registry.render())
+
+    def test_failures_back_off_then_give_up(self):
+        self.enqueue(1)
+        with mock.patch.object(EmailBackend,'send_messages',side_effect=SMTPException("421 try later")):
+            self.assertEqual(outbox.dispatch_outbox(),0)
+            email = OutboxEmail.objects.get()
+            self.assertEqual((email.status,email.attempts),(OutboxEmail.StatusChoices.PENDING,1))
+            self.assertGreater(email.next_attempt_at,timezone.now() + timedelta(seconds=25))
+            self.assertIn("421",email.last_error)
+
+            # Not due yet, so not retried
+            self.assertEqual(outbox.dispatch_outbox(),0)
+            self.assertEqual(OutboxEmail.objects.get().attempts,1)
+
+            for _ in range(outbox.MAX_ATTEMPTS - 1):
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                outbox.dispatch_outbox()
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status,email.attempts),(OutboxEmail.StatusChoices.FAILED,outbox.MAX_ATTEMPTS))
+        self.assertEqual(len(mail.outbox),0)
+
+
+class TaskRelayTests(TestCase):
+    def setUp(self):
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr,current_app.conf,'task_always_eager',eager)
+
+    def test_intents_follow_the_transaction(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='rolled-back')
+            raise ValueError
+        relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='once')
+        relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='once')
+        self.assertEqual(list(TaskIntent.objects.values_list('idempotency_key',flat=True)),['once'])
+
+    def test_relay_publishes_and_runs_once(self):
+        outbox.enqueue_email("relay:1","Subject","Body",["user@example.com"])
+        key = TaskIntent.objects.get().idempotency_key
+
+        self.assertEqual(relay.relay_intents(),1)
+        self.assertEqual(len(mail.outbox),1)
+        intent = TaskIntent.objects.get()
+        self.assertEqual(intent.status,TaskIntent.StatusChoices.DONE)
+        self.assertIsNotNone(intent.published_at)
+        self.assertEqual(relay.relay_intents(),0)
+
+        # A redelivered message is acknowledged without running the body
+        with mock.patch('notifications.tasks.dispatch_outbox') as dispatch:
+            dispatch_outbox_task.apply(task_id=key)
+            dispatch_outbox_task.apply()
+        self.assertEqual(dispatch.call_count,1)
+
+    def test_one_dispatch_intent_covers_queued_emails(self):
+        for i in range(3):
+            outbox.enqueue_email(f"coalesced:{i}","Subject","Body",["user@example.com"])
+        self.assertEqual(TaskIntent.objects.count(),1)
+        self.assertEqual(relay.relay_intents(),1)
+        self.assertEqual(len(mail.outbox),3)
+        # Once that one has run, the next email records a new one
+        outbox.enqueue_email("coalesced:3","Subject","Body",["user@example.com"])
+        self.assertEqual(TaskIntent.objects.filter(status=TaskIntent.StatusChoices.PENDING).count(),1)
+
+    def test_body_runs_after_the_claim_and_failures_release_it(self):
+        key = relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='claimed')
+        statuses = []
+        with mock.patch('notifications.tasks.dispatch_outbox',side_effect=lambda: statuses.append(TaskIntent.objects.get().status)):
+            with mock.patch('notifications.tasks.dispatch_outbox',side_effect=SMTPException("down")):
+                self.assertIsInstance(dispatch_outbox_task.apply(task_id=key).result,SMTPException)
+            self.assertEqual(TaskIntent.objects.get().status,TaskIntent.StatusChoices.PUBLISHED)
+            # Another worker is running it
+            TaskIntent.objects.update(status=TaskIntent.StatusChoices.RUNNING,available_at=timezone.now() + relay.RUN_TIMEOUT)
+            dispatch_outbox_task.apply(task_id=key)
+            self.assertEqual(statuses,[])
+            # ...until its lease runs out
+            TaskIntent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+            dispatch_outbox_task.apply(task_id=key)
+        self.assertEqual(statuses,[TaskIntent.StatusChoices.RUNNING])
+        self.assertEqual(TaskIntent.objects.get().status,TaskIntent.StatusChoices.DONE)
+
+    def test_stale_published_intents_are_published_again(self):
+        outbox.enqueue_email("lost:1","Subject","Body",["user@example.com"])
+        # The broker accepts the message but it never reaches a worker
+        with mock.patch.object(dispatch_outbox_task,'apply_async'):
+            self.assertEqual(relay.relay_intents(),1)
+        intent = TaskIntent.objects.get()
+        self.assertEqual(intent.status,TaskIntent.StatusChoices.PUBLISHED)
+        self.assertEqual(relay.relay_intents(),0)
+        outbox.enqueue_email("lost:2","Subject","Body",["user@example.com"])
+        self.assertEqual(TaskIntent.objects.count(),1)
+
+        # Once its lease runs out it no longer holds back the wake-up, and is published again
+        TaskIntent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        outbox.enqueue_email("lost:3","Subject","Body",["user@example.com"])
+        self.assertEqual(TaskIntent.objects.count(),2)
+        self.assertEqual(relay.relay_intents(),2)
+        self.assertEqual(len(mail.outbox),3)
+        self.assertEqual(set(TaskIntent.objects.values_list('status',flat=True)),{TaskIntent.StatusChoices.DONE})
+
+    def test_failed_bodies_are_published_again(self):
+        key = relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='flaky')
+        with mock.patch('notifications.tasks.dispatch_outbox',side_effect=SMTPException("down")):
+            dispatch_outbox_task.apply(task_id=key)
+        self.assertEqual(relay.relay_intents(),0)
+        TaskIntent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        with mock.patch('notifications.tasks.dispatch_outbox') as dispatch:
+            self.assertEqual(relay.relay_intents(),1)
+        self.assertEqual(dispatch.call_count,1)
+        self.assertEqual(TaskIntent.objects.get().status,TaskIntent.StatusChoices.DONE)
+
+    def test_broker_errors_back_off(self):
+        relay.enqueue_task('notifications.tasks.dispatch_outbox_task',key='unlucky')
+        with mock.patch.object(dispatch_outbox_task,'apply_async',side_effect=ConnectionError("broker down")):
+            self.assertEqual(relay.relay_intents(),0)
+        intent = TaskIntent.objects.get()
+        self.assertEqual((intent.status,intent.attempts),(TaskIntent.StatusChoices.PENDING,1))
+        self.assertGreater(intent.available_at,timezone.now())
+        self.assertIn("broker down",intent.last_error)
+        # Not due yet
+        self.assertEqual(relay.relay_intents(),0)
+
+        TaskIntent.objects.update(available_at=timezone.now())
+        self.assertEqual(relay.relay_intents(),1)
+        registry.clear()
+        output = registry.render()
+        self.assertIn("task_intents_pending 0",output)
+        self.assertIn("task_intents_published_last_minute 1",output)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Ride, Vehicle, VehicleMake, VehicleModel, Location
+from .models import GeocodeCache, LocationAlias, Ride, RideTemplate, Vehicle, VehicleMake, VehicleModel, Location
 
 # Register your models here.
 
@@ -20,8 +20,25 @@ class VehicleAdmin(admin.ModelAdmin):
 class RideAdmin(admin.ModelAdmin):
     list_display = ['id','driver','vehicle','source','destination','fare','seats_offered','seats_booked','seats_available','status','start_time','end_time']
 
+@admin.register(RideTemplate)
+class RideTemplateAdmin(admin.ModelAdmin):
+    list_display = ['id','driver','source','destination','rrule','start_time','is_active','generated_until']
+    raw_id_fields = ['driver','vehicle','source','destination']
+
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
-    list_display = ['id','name','latitude','longitude','is_verified']
+    list_display = ['id','name','normalized_name','latitude','longitude','is_verified','geocoded_at']
+    search_fields = ['normalized_name']
+
+@admin.register(LocationAlias)
+class LocationAliasAdmin(admin.ModelAdmin):
+    list_display = ['id','name','location','created_at']
+    search_fields = ['name']
+    raw_id_fields = ['location']
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ['id','query','latitude','longitude','found','provider','updated_at']
+    search_fields = ['query']
 
 
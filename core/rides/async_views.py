@@ -0,0 +1,54 @@
+from rest_framework import exceptions
+
+from core.async_views import AsyncAPIView
+
+from .filters import RideSearchIndexFilter
+from .models import Ride, RideSearchIndex
+from .pagination import RideCursorPagination
+from .response_cache import acached_response, adetail_key, alist_key
+from .serializers import RideSearchSerializer, RideSerializer
+from .views import RideViewset
+
+# Async variants of RideViewset list, retrieve and my_rides (see core.async_views)
+
+
+class AsyncRideListView(AsyncAPIView):
+    serializer_class = RideSearchSerializer
+    pagination_class = RideCursorPagination
+    filterset_class = RideSearchIndexFilter
+    search_fields = ['source_name','destination_name']
+    # Resolve locations and stop names with queries of their own
+    blocking_filters = ('near_source','near_destination','board_at','drop_at','via')
+
+    async def get(self, request):
+        async def build():
+            flat = self.flat_serializer
+            page = await self.paginate_queryset(flat.values(await self.filter_queryset(RideSearchIndex.objects.all())))
+            return self.paginator.get_paginated_response(flat.serialize(page)).data, page
+        return await acached_response(self,await alist_key(self.request),build)
+
+
+class AsyncRideDetailView(AsyncAPIView):
+    serializer_class = RideSerializer
+
+    async def get(self, request, pk):
+        async def build():
+            ride = await RideViewset.queryset.filter(pk=pk,status=Ride.RideStatus.OPEN).afirst()
+            if ride is None:
+                raise exceptions.NotFound("No Ride matches the given query.")
+            return self.get_serializer(ride).data, [ride]
+        return await acached_response(self,await adetail_key(self.request,pk),build)
+
+
+class AsyncMyRidesView(AsyncAPIView):
+    serializer_class = RideSerializer
+    pagination_class = RideCursorPagination
+
+    async def get(self, request):
+        flat = self.flat_serializer
+        rides = await self.paginate_queryset(flat.values(RideViewset.queryset.filter(driver=self.request.user)))
+        return self.render({
+            "my_rides":flat.serialize(rides),
+            "next":self.paginator.get_next_link(),
+            "previous":self.paginator.get_previous_link()
+        })
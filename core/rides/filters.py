@@ -1,12 +1,79 @@
 import django_filters
+from rest_framework.exceptions import ValidationError
 
-from .models import Ride
+from .geo import parse_point
+from .locations import matching_locations
+from .models import Ride, RideSearchIndex
+from .stops import rides_through, rides_via
+from .utils import distance_km, near_cells
+
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 100
 
 
 class RideFilter(django_filters.FilterSet):
-    source = django_filters.CharFilter(field_name='source',lookup_expr='iexact')
-    destination = django_filters.CharFilter(field_name='destination',lookup_expr='iexact')
+    # Matched on the canonical name and aliases, so "mumbai" finds "Mumbai, MH"
+    source = django_filters.CharFilter(method='filter_location')
+    destination = django_filters.CharFilter(method='filter_location')
     date = django_filters.DateFilter(field_name='start_time',lookup_expr='date')
+    # Proximity search: ?near_source=18.52,73.85&radius_km=2
+    near_source = django_filters.CharFilter(method='filter_near_source')
+    near_destination = django_filters.CharFilter(method='filter_near_destination')
+    radius_km = django_filters.NumberFilter(method='filter_radius_km')
+    # Route search over the stop index: ?board_at=Hinjewadi&drop_at=Station&departs_after=...
+    board_at = django_filters.CharFilter(method='filter_route')
+    drop_at = django_filters.CharFilter(method='filter_route')
+    via = django_filters.CharFilter(method='filter_via')
+    departs_after = django_filters.IsoDateTimeFilter(field_name='start_time',lookup_expr='gte')
     class Meta:
         model = Ride
-        fields = ['source','destination','date']
\ No newline at end of file
+        fields = ['source','destination','date','near_source','near_destination','radius_km','board_at','drop_at','via','departs_after']
+
+    def filter_location(self, queryset, name, value):
+        return queryset.filter(**{f"{name}__in": matching_locations(value)})
+
+    def filter_route(self, queryset, name, value):
+        board_at = self.form.cleaned_data.get('board_at')
+        drop_at = self.form.cleaned_data.get('drop_at')
+        if name == 'drop_at' and board_at:
+            # Already applied together with board_at
+            return queryset
+        return queryset.filter(pk__in=rides_through(board_at or None,drop_at or None))
+
+    def filter_via(self, queryset, name, value):
+        return queryset.filter(pk__in=rides_via(value))
+
+    def filter_radius_km(self, queryset, name, value):
+        # Only a parameter of the near_* filters
+        return queryset
+
+    def filter_near_source(self, queryset, name, value):
+        return self.filter_near(queryset,'source',value)
+
+    def filter_near_destination(self, queryset, name, value):
+        return self.filter_near(queryset,'destination',value)
+
+    def filter_near(self, queryset, field, value):
+        try:
+            latitude, longitude = parse_point(value)
+        except ValueError as e:
+            raise ValidationError({f"near_{field}": str(e)})
+        radius_km = self.form.cleaned_data.get('radius_km') or DEFAULT_RADIUS_KM
+        if radius_km <= 0 or radius_km > MAX_RADIUS_KM:
+            raise ValidationError({"radius_km": f"Radius should be in range 0-{MAX_RADIUS_KM} km."})
+
+        # Geohash cells narrow the rows, the exact distance is computed in SQL
+        distance_field = f"{field}_distance_km"
+        queryset = queryset.filter(near_cells(latitude,longitude,float(radius_km),f"{field}__")).annotate(**{
+            distance_field: distance_km(latitude,longitude,f"{field}__")
+        }).filter(**{f"{distance_field}__lte": float(radius_km)})
+        # Closest pickup first, then closest drop, then earliest departure
+        ordering = [f for f in queryset.query.order_by if f.endswith('_distance_km')]
+        return queryset.order_by(*ordering,distance_field,'start_time','pk')
+
+class RideSearchIndexFilter(RideFilter):
+    # Same query parameters as RideFilter, answered from the denormalized columns
+    date = django_filters.DateFilter(field_name='start_date')
+    class Meta:
+        model = RideSearchIndex
+        fields = ['source','destination','date','near_source','near_destination','radius_km','board_at','drop_at','via','departs_after']
@@ -0,0 +1,125 @@
+import math
+
+# Geohash helpers used to index Location coordinates. A geohash prefix is a
+# rectangular cell, so "everything near a point" becomes a handful of
+# index range scans over Location.geohash instead of a haversine over every row.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE_MAP = {char: index for index, char in enumerate(BASE32)}
+# Sorts after every base32 character, used as the exclusive upper bound of a prefix range
+PREFIX_END = '{'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def decode_bounds(geohash):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return lat_range, lng_range
+
+
+def cell_size(precision):
+    # (lat_degrees, lng_degrees) covered by a single cell of the given precision
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def neighbours(geohash):
+    # The cell itself plus the 8 cells around it (fewer near the poles)
+    (lat_min, lat_max), (lng_min, lng_max) = decode_bounds(geohash)
+    lat_step = lat_max - lat_min
+    lng_step = lng_max - lng_min
+    center_lat = (lat_min + lat_max) / 2
+    center_lng = (lng_min + lng_max) / 2
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        lat = center_lat + d_lat * lat_step
+        if lat < -90 or lat > 90:
+            continue
+        for d_lng in (-1, 0, 1):
+            lng = center_lng + d_lng * lng_step
+            lng = (lng + 180) % 360 - 180
+            cells.add(encode(lat, lng, len(geohash)))
+    return sorted(cells)
+
+
+def covering_cells(latitude, longitude, radius_km):
+    # Pick the finest precision whose cells are at least radius_km on each side,
+    # then the 3x3 block around the point is guaranteed to contain the circle.
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lng_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lng_size = cell_size(candidate)
+        if lat_size >= lat_delta and lng_size >= lng_delta:
+            precision = candidate
+            break
+    return neighbours(encode(latitude, longitude, precision))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    d_lat = lat2 - lat1
+    d_lng = lng2 - lng1
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_point(value):
+    # "18.52,73.85" -> (18.52, 73.85); raises ValueError on anything else
+    parts = [part.strip() for part in str(value).split(',')]
+    if len(parts) != 2:
+        raise ValueError("Expected coordinates as 'latitude,longitude'.")
+    latitude, longitude = float(parts[0]), float(parts[1])
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError("Coordinates are out of range.")
+    return latitude, longitude
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from geopy.exc import GeocoderServiceError
+from redis.exceptions import RedisError
+
+from core.redis_client import get_redis
+
+from .models import GeocodeCache, Location
+from .names import fuzzy_key, normalize_location_name
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_LEASE = timedelta(minutes=5)  # longer than one rate-limited lookup
+
+# Geocoding pipeline: normalized-name cache -> shared rate limiter -> backend.
+# Locations are geocoded in batches by rides.tasks.geocode_pending_locations;
+# cache hits resolve synchronously when the ride is created.
+
+
+class NominatimBackend:
+    def __init__(self):
+        from geopy.geocoders import Nominatim
+        self.client = Nominatim(user_agent=settings.GEOCODER_USER_AGENT,timeout=10)
+
+    def geocode(self, query):
+        result = self.client.geocode(query)
+        if result:
+            return result.latitude, result.longitude
+        return None
+
+
+class StubBackend:
+    # Offline backend for tests and local development, reads GEOCODER_STUB_RESULTS
+    def geocode(self, query):
+        results = {normalize_location_name(name): point for name, point in getattr(settings,'GEOCODER_STUB_RESULTS',{}).items()}
+        return results.get(normalize_location_name(query))
+
+
+_backends = {}
+
+def get_geocoder():
+    path = settings.GEOCODER_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+class TokenBucket:
+    # Shared across workers through Redis; falls back to a per-process bucket
+    SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], 3600)
+    return tostring(wait)
+    """
+
+    def __init__(self, key, rate, capacity=1):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _take_shared(self):
+        return float(get_redis().eval(self.SCRIPT,1,self.key,self.rate,self.capacity))
+
+    def _take_local(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            try:
+                wait = self._take_shared()
+            except RedisError:
+                wait = self._take_local()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+
+def get_rate_limiter():
+    rate = settings.GEOCODER_RATE_LIMIT
+    if rate not in _rate_limiters:
+        _rate_limiters[rate] = TokenBucket("geocoder:rate",rate)
+    return _rate_limiters[rate]
+
+
+def lookup_cache(name):
+    # Exact normalized match first, then the word-order-insensitive key
+    query = normalize_location_name(name)
+    entry = GeocodeCache.objects.filter(query=query).first()
+    if entry is None:
+        entry = GeocodeCache.objects.filter(token_key=fuzzy_key(name),found=True).first()
+    return entry
+
+
+def geocode(name):
+    # Returns (latitude, longitude) or None; results, including misses, are cached
+    entry = lookup_cache(name)
+    if entry is not None:
+        return (entry.latitude, entry.longitude) if entry.found else None
+
+    get_rate_limiter().acquire()
+    point = get_geocoder().geocode(name)
+    GeocodeCache.objects.update_or_create(
+        query = normalize_location_name(name),
+        defaults = {
+            'token_key': fuzzy_key(name),
+            'latitude': point[0] if point else None,
+            'longitude': point[1] if point else None,
+            'found': point is not None,
+            'provider': settings.GEOCODER_BACKEND.rsplit('.',1)[-1],
+        }
+    )
+    return point
+
+
+def apply_point(location, point):
+    location.geocoded_at = timezone.now()
+    location.geocode_lease_until = None
+    if point:
+        location.latitude, location.longitude = point
+        location.is_verified = True
+    location.save(update_fields=['latitude','longitude','is_verified','geocoded_at','geocode_lease_until'])
+    return location
+
+
+def geocode_location(location):
+    return apply_point(location,geocode(location.name))
+
+
+def geocode_pending_locations(batch_size=None, max_batches=20):
+    # Drains unverified locations in groups. Each row is claimed with a guarded
+    # UPDATE first, so concurrent workers never geocode the same location. The
+    # claim is a lease: a worker that dies before apply_point leaves the row to
+    # be picked up again once it expires.
+    batch_size = batch_size or settings.GEOCODER_BATCH_SIZE
+    geocoded = verified = 0
+    for _ in range(max_batches):
+        now = timezone.now()
+        unclaimed = Q(geocode_lease_until__isnull=True) | Q(geocode_lease_until__lt=now)
+        pending = list(Location.objects.filter(unclaimed,is_verified=False,geocoded_at__isnull=True).order_by('id')[:batch_size])
+        if not pending:
+            break
+        for location in pending:
+            claimed = Location.objects.filter(unclaimed,id=location.id,geocoded_at__isnull=True).update(geocode_lease_until=timezone.now() + GEOCODE_LEASE)
+            if not claimed:
+                continue
+            try:
+                point = geocode(location.name)
+            except GeocoderServiceError as e:
+                # Service trouble: release the claim and retry on the next run
+                Location.objects.filter(id=location.id).update(geocode_lease_until=None)
+                logger.info(e)
+                return {"geocoded": geocoded, "verified": verified}
+            apply_point(location,point)
+            geocoded += 1
+            verified += point is not None
+    logger.info(f"Geocoded {geocoded} locations, {verified} verified.")
+    return {"geocoded": geocoded, "verified": verified}
@@ -0,0 +1,161 @@
+import logging
+import math
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from bookings.cards import refresh_ride_cards
+
+from .models import Location, LocationAlias, LocationTrigram, Ride, RideTemplate
+from .names import canonical_location_name, similarity, trigrams
+from .search_index import refresh_ride_search_index
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 20
+MIN_SIMILARITY = 0.3
+COMMON_TRIGRAM_ROWS = 1000  # grams in more rows than this are too common to scan
+TRIGRAM_COUNT_TTL = 3600
+NAME_PREFIX_END = "\uffff"  # sorts after every character a normalized name can hold
+
+
+def matching_locations(name):
+    # Locations a free-text name refers to: same canonical name or a known alias
+    canonical = canonical_location_name(name)
+    return Location.objects.filter(
+        Q(normalized_name=canonical) | Q(id__in=LocationAlias.objects.filter(name=canonical).values('location'))
+    )
+
+
+def resolve_location(name):
+    location = Location.objects.filter(name=name).first()
+    if location is None:
+        location = matching_locations(name).order_by('-is_verified','id').first()
+    return location
+
+
+def index_location_trigrams(locations):
+    locations = list(locations)
+    LocationTrigram.objects.filter(location__in=locations).delete()
+    LocationTrigram.objects.bulk_create([
+        LocationTrigram(location=location,trigram=gram)
+        for location in locations
+        for gram in trigrams(location.normalized_name)
+    ],batch_size=5000)
+
+
+def autocomplete(query, limit=AUTOCOMPLETE_LIMIT):
+    # Indexed prefix range scan on normalized names and aliases first; the
+    # trigram index only runs when nothing starts with the query (typos).
+    canonical = canonical_location_name(query)
+    if not canonical:
+        return []
+    prefix = Q(normalized_name__gte=canonical,normalized_name__lt=canonical+NAME_PREFIX_END)
+    results = list(Location.objects.filter(prefix).order_by('normalized_name','id')[:limit])
+    if len(results) < limit:
+        alias_ids = LocationAlias.objects.filter(
+            name__gte=canonical,name__lt=canonical+NAME_PREFIX_END
+        ).order_by('name').values_list('location',flat=True)[:limit]
+        results += Location.objects.filter(id__in=list(alias_ids)).exclude(id__in=[r.id for r in results])
+    if not results and len(canonical) >= 3:
+        results = similar_locations(canonical,limit)
+
+    # Unmerged duplicates share a canonical name; only show one of them
+    seen, unique = set(), []
+    for location in results:
+        if location.normalized_name not in seen:
+            seen.add(location.normalized_name)
+            unique.append(location)
+    return unique[:limit]
+
+
+def trigram_counts(grams):
+    # Posting list sizes, capped at COMMON_TRIGRAM_ROWS so counting stays cheap.
+    # They are only selectivity hints, so a cached, slightly stale value is fine.
+    # Grams are hex-encoded in the keys: they hold spaces, which memcached rejects.
+    keys = {f"location-trigram-count:{gram.encode().hex()}": gram for gram in grams}
+    counts = {keys[key]: count for key, count in cache.get_many(keys).items()}
+    missing = {
+        key: LocationTrigram.objects.filter(trigram=gram)[:COMMON_TRIGRAM_ROWS].count()
+        for key, gram in keys.items() if gram not in counts
+    }
+    cache.set_many(missing,TRIGRAM_COUNT_TTL)
+    counts.update((keys[key],count) for key, count in missing.items())
+    return counts
+
+
+def similar_locations(name, limit, exclude=(), min_similarity=MIN_SIMILARITY):
+    grams = trigrams(name)
+    if not grams:
+        return []
+    # A name sharing at least min_similarity of the query's grams must contain
+    # one of its (n - needed + 1) rarest grams, so only those posting lists are
+    # scanned. Common grams ("pun", "ne ") are skipped altogether.
+    counts = trigram_counts(grams)
+    needed = math.ceil(len(grams) * min_similarity)
+    rare = sorted(grams,key=counts.get)[:len(grams) - needed + 1]
+    rare = [gram for gram in rare if counts[gram] < COMMON_TRIGRAM_ROWS]
+    if not rare:
+        return []
+    candidate_ids = (LocationTrigram.objects
+        .filter(trigram__in=rare)
+        .exclude(location__in=exclude)
+        .values('location')
+        .annotate(hits=Count('id'))
+        .order_by('-hits')
+        .values_list('location',flat=True)[:limit * 5])
+    scored = [
+        (similarity(name,location.normalized_name),location)
+        for location in Location.objects.filter(id__in=list(candidate_ids))
+    ]
+    scored = [item for item in scored if item[0] >= min_similarity]
+    scored.sort(key=lambda item: (-item[0],item[1].normalized_name))
+    return [location for _, location in scored[:limit]]
+
+
+def duplicate_groups():
+    # Canonical name -> locations sharing it, canonical row (verified, oldest) first
+    names = (Location.objects.values('normalized_name')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('normalized_name',flat=True))
+    groups = defaultdict(list)
+    for location in Location.objects.filter(normalized_name__in=list(names)).order_by('-is_verified','id'):
+        groups[location.normalized_name].append(location)
+    return groups
+
+
+@transaction.atomic
+def merge_locations(canonical, duplicates):
+    duplicate_ids = [location.id for location in duplicates]
+    source_rides = Ride.objects.filter(source__in=duplicate_ids)
+    destination_rides = Ride.objects.filter(destination__in=duplicate_ids)
+    ride_ids = set(source_rides.values_list('id',flat=True)) | set(destination_rides.values_list('id',flat=True))
+    now = timezone.now()
+    source_rides.update(source=canonical,updated_at=now)
+    destination_rides.update(destination=canonical,updated_at=now)
+    refresh_ride_search_index(ride_ids)
+    refresh_ride_cards(ride_ids)
+    # Templates protect their locations too; future rides copy the canonical row
+    RideTemplate.objects.filter(source__in=duplicate_ids).update(source=canonical,updated_at=now)
+    RideTemplate.objects.filter(destination__in=duplicate_ids).update(destination=canonical,updated_at=now)
+
+    # Every old spelling keeps resolving to the surviving row
+    LocationAlias.objects.filter(location__in=duplicate_ids).update(location=canonical)
+    for location in duplicates:
+        if location.normalized_name != canonical.normalized_name:
+            LocationAlias.objects.get_or_create(name=location.normalized_name,defaults={'location': canonical})
+    if not canonical.is_verified:
+        verified = next((location for location in duplicates if location.is_verified),None)
+        if verified is not None:
+            canonical.latitude, canonical.longitude = verified.latitude, verified.longitude
+            canonical.is_verified = True
+            canonical.save(update_fields=['latitude','longitude','is_verified'])
+    Location.objects.filter(id__in=duplicate_ids).delete()
+    logger.info(f"Merged locations {duplicate_ids} into {canonical.id}, re-pointed {len(ride_ids)} rides.")
+    return len(ride_ids)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.locations import duplicate_groups, merge_locations
+from rides.models import Location
+
+
+class Command(BaseCommand):
+    help = "Merge locations sharing a canonical name, re-pointing rides to the surviving row and keeping old names as aliases."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids',nargs='*',type=int,help="Location ids to merge into --into.")
+        parser.add_argument('--into',type=int,help="Merge the given ids into this location instead of auto-detecting duplicates.")
+        parser.add_argument('--dry-run',action='store_true')
+
+    def handle(self, *args, **options):
+        if options['into']:
+            try:
+                canonical = Location.objects.get(id=options['into'])
+            except Location.DoesNotExist:
+                raise CommandError(f"Location {options['into']} does not exist.")
+            duplicates = list(Location.objects.filter(id__in=options['ids']).exclude(id=canonical.id))
+            groups = {canonical.normalized_name: [canonical,*duplicates]} if duplicates else {}
+        elif options['ids']:
+            raise CommandError("Pass --into together with location ids.")
+        else:
+            groups = duplicate_groups()
+
+        merged = rides = 0
+        for name, (canonical, *duplicates) in groups.items():
+            self.stdout.write(f"{name}: {', '.join(repr(location.name) for location in duplicates)} -> {canonical.name!r} ({canonical.id})")
+            if not options['dry_run']:
+                rides += merge_locations(canonical,duplicates)
+            merged += len(duplicates)
+        verb = "Would merge" if options['dry_run'] else "Merged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {merged} locations into {len(groups)}, re-pointed {rides} rides."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from rides.search_index import sync_ride_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ride search index (incremental unless --full)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full',action='store_true',help="Drop and rebuild every row.")
+        parser.add_argument('--batch-size',type=int,default=1000)
+
+    def handle(self, *args, **options):
+        result = sync_ride_search_index(full=options['full'],batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {result['refreshed']} rows, removed {result['removed']}."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+from rides.geo import encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Location = apps.get_model('rides', 'Location')
+    locations = Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for location in locations.iterator():
+        location.geohash = encode(location.latitude, location.longitude)
+        location.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
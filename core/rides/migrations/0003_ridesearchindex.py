@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0002_location_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideSearchIndex',
+            fields=[
+                ('ride', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='rides.ride')),
+                ('source_name', models.CharField(max_length=100)),
+                ('destination_name', models.CharField(max_length=100)),
+                ('source_latitude', models.FloatField(blank=True, null=True)),
+                ('source_longitude', models.FloatField(blank=True, null=True)),
+                ('destination_latitude', models.FloatField(blank=True, null=True)),
+                ('destination_longitude', models.FloatField(blank=True, null=True)),
+                ('boarding_points', models.JSONField(default=list)),
+                ('dropping_points', models.JSONField(default=list)),
+                ('start_date', models.DateField()),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('fare', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('seats_offered', models.PositiveSmallIntegerField()),
+                ('seats_booked', models.PositiveSmallIntegerField()),
+                ('seats_available', models.PositiveSmallIntegerField()),
+                ('driver_profile', models.BigIntegerField(blank=True, null=True)),
+                ('driver_name', models.CharField(max_length=101)),
+                ('driver_verified', models.BooleanField(default=False)),
+                ('driver_total_rides', models.IntegerField(default=0)),
+                ('driver_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('driver_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('vehicle_display', models.CharField(max_length=201)),
+                ('vehicle_color', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rides.location')),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rides.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_time', 'ride'], name='ridesearch_start_idx'), models.Index(fields=['start_date', 'source_name'], name='ridesearch_date_source_idx'), models.Index(fields=['start_date', 'destination_name'], name='ridesearch_date_dest_idx'), models.Index(fields=['updated_at'], name='ridesearch_updated_idx')],
+            },
+        ),
+    ]
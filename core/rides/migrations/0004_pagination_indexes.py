@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0003_ridesearchindex'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['status', 'start_time', 'id'], name='ride_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['driver', 'start_time', 'id'], name='ride_driver_start_idx'),
+        ),
+    ]
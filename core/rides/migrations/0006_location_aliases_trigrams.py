@@ -0,0 +1,83 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from rides.names import canonical_location_name, trigrams
+
+
+def backfill_normalized_names(apps, schema_editor):
+    Location = apps.get_model('rides', 'Location')
+    LocationTrigram = apps.get_model('rides', 'LocationTrigram')
+    for location in Location.objects.iterator():
+        location.normalized_name = canonical_location_name(location.name)
+        location.save(update_fields=['normalized_name'])
+        LocationTrigram.objects.bulk_create([
+            LocationTrigram(location=location, trigram=gram) for gram in trigrams(location.normalized_name)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0005_geocode_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'location aliases',
+            },
+        ),
+        migrations.CreateModel(
+            name='LocationTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='ridesearchindex',
+            name='ridesearch_date_source_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ridesearchindex',
+            name='ridesearch_date_dest_idx',
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='normalized_name',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='ridesearchindex',
+            index=models.Index(fields=['start_date', 'source'], name='ridesearch_date_source_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ridesearchindex',
+            index=models.Index(fields=['start_date', 'destination'], name='ridesearch_date_dest_idx'),
+        ),
+        migrations.AddField(
+            model_name='locationalias',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='rides.location'),
+        ),
+        migrations.AddField(
+            model_name='locationtrigram',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='rides.location'),
+        ),
+        migrations.AddIndex(
+            model_name='locationtrigram',
+            index=models.Index(fields=['trigram', 'location'], name='location_trigram_idx'),
+        ),
+        migrations.RunPython(backfill_normalized_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from rides.names import canonical_location_name
+
+
+def backfill_stops(apps, schema_editor):
+    Ride = apps.get_model('rides', 'Ride')
+    RideStop = apps.get_model('rides', 'RideStop')
+    stops = []
+    for ride_id, boarding_points, dropping_points in Ride.objects.values_list('id', 'boarding_points', 'dropping_points').iterator(chunk_size=2000):
+        route = [(name, True, False) for name in boarding_points] + [(name, False, True) for name in dropping_points]
+        stops += [
+            RideStop(ride_id=ride_id, sequence=sequence, name=name, key=canonical_location_name(name), can_board=can_board, can_drop=can_drop)
+            for sequence, (name, can_board, can_drop) in enumerate(route)
+        ]
+        if len(stops) >= 5000:
+            RideStop.objects.bulk_create(stops)
+            stops = []
+    RideStop.objects.bulk_create(stops)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0006_location_aliases_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(max_length=250)),
+                ('key', models.CharField(max_length=250)),
+                ('can_board', models.BooleanField(default=False)),
+                ('can_drop', models.BooleanField(default=False)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='rides.ride')),
+            ],
+            options={
+                'ordering': ['ride', 'sequence'],
+                'indexes': [models.Index(fields=['key', 'ride', 'sequence'], name='ride_stop_key_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ride', 'sequence'), name='unique_ride_stop_sequence')],
+            },
+        ),
+        migrations.RunPython(backfill_stops, migrations.RunPython.noop),
+    ]
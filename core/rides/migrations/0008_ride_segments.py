@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+from rides.names import canonical_location_name
+from rides.segments import has_intermediate_stops, route
+
+
+def merge_intermediate_stops(apps, schema_editor):
+    # Names in both lists are now a single stop that can board and drop
+    Ride = apps.get_model('rides', 'Ride')
+    RideStop = apps.get_model('rides', 'RideStop')
+    for ride_id, boarding_points, dropping_points in Ride.objects.values_list('id', 'boarding_points', 'dropping_points').iterator(chunk_size=2000):
+        if not has_intermediate_stops(boarding_points, dropping_points):
+            continue
+        RideStop.objects.filter(ride_id=ride_id).delete()
+        RideStop.objects.bulk_create([
+            RideStop(ride_id=ride_id, sequence=sequence, name=name, key=canonical_location_name(name), can_board=can_board, can_drop=can_drop)
+            for sequence, (name, can_board, can_drop) in enumerate(route(boarding_points, dropping_points))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0007_ride_stops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='segment_seats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='segment_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ridesearchindex',
+            name='segment_seats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(merge_intermediate_stops, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0008_ride_segments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('boarding_points', models.JSONField(default=list)),
+                ('dropping_points', models.JSONField(default=list)),
+                ('fare', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('seats_offered', models.PositiveSmallIntegerField()),
+                ('rrule', models.CharField(max_length=500)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('generated_until', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='rides.location')),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ride_templates', to=settings.AUTH_USER_MODEL)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='rides.location')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ride_templates', to='rides.vehicle')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rides', to='rides.ridetemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='ride',
+            constraint=models.UniqueConstraint(fields=('template', 'start_time'), name='unique_template_occurrence'),
+        ),
+    ]
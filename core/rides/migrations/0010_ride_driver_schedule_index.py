@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0009_ride_templates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['driver', 'status', 'start_time', 'end_time'], name='ride_driver_schedule_idx'),
+        ),
+    ]
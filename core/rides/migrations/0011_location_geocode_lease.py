@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0010_ride_driver_schedule_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geocode_lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
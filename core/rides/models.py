@@ -3,6 +3,9 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils import timezone
 
+from .geo import encode as encode_geohash
+from .names import canonical_location_name
+
 User = get_user_model()
 # Create your models here.
 class VehicleMake(models.Model):
@@ -51,13 +54,71 @@ class Vehicle(models.Model):
 
 class Location(models.Model):
     name = models.CharField(max_length=100,unique=True)
+    normalized_name = models.CharField(max_length=100,blank=True,db_index=True)  # canonical form of name
     latitude = models.FloatField(blank=True,null=True)
     longitude = models.FloatField(blank=True,null=True)
     is_verified = models.BooleanField(default=False)
+    geohash = models.CharField(max_length=12,blank=True,null=True,db_index=True)
+    geocoded_at = models.DateTimeField(blank=True,null=True)  # last geocoding attempt
+    geocode_lease_until = models.DateTimeField(blank=True,null=True)  # a worker is geocoding it until then
+
+    def save(self, *args, **kwargs):
+        # Keep the spatial index column in sync with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude,self.longitude)
+        else:
+            self.geohash = None
+        self.normalized_name = canonical_location_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('latitude' in update_fields or 'longitude' in update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'normalized_name'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+class LocationAlias(models.Model):
+    # Other canonical names that resolve to a location, e.g. left behind by a merge
+    name = models.CharField(max_length=100,unique=True)
+    location = models.ForeignKey(Location,on_delete=models.CASCADE,related_name='aliases')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'location aliases'
+
+    def save(self, *args, **kwargs):
+        self.name = canonical_location_name(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.name} -> {self.location}"
+
+class LocationTrigram(models.Model):
+    # Trigram index over Location.normalized_name for autocomplete and dedup
+    location = models.ForeignKey(Location,on_delete=models.CASCADE,related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trigram','location'],name='location_trigram_idx'),
+        ]
+
+class GeocodeCache(models.Model):
+    # Geocoder answers keyed by normalized location name, misses included
+    query = models.CharField(max_length=200,unique=True)
+    token_key = models.CharField(max_length=200,db_index=True)
+    latitude = models.FloatField(blank=True,null=True)
+    longitude = models.FloatField(blank=True,null=True)
+    found = models.BooleanField(default=False)
+    provider = models.CharField(max_length=50,blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.query
+
 class Ride(models.Model):
     class RideStatus(models.TextChoices):
         OPEN = 'open','Open'
@@ -73,16 +134,130 @@ class Ride(models.Model):
     dropping_points = models.JSONField(default=list)
     fare = models.DecimalField(max_digits=8,decimal_places=2)
     seats_offered = models.PositiveSmallIntegerField()
-    seats_booked = models.PositiveSmallIntegerField(default=0)
+    seats_booked = models.PositiveSmallIntegerField(default=0)  # on the busiest segment
+    # Seats per segment (rides.segments.SegmentTree state) for rides with
+    # intermediate stops; segment_version guards concurrent updates
+    segment_seats = models.JSONField(blank=True,null=True)
+    segment_version = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=10,choices=RideStatus.choices,default=RideStatus.OPEN,db_index=True)
     start_time = models.DateTimeField(db_index=True)
     end_time = models.DateTimeField(db_index=True)
+    template = models.ForeignKey('RideTemplate',on_delete=models.SET_NULL,blank=True,null=True,related_name='rides')  # set on rides generated from a recurring template
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # A template materializes each occurrence once
+            models.UniqueConstraint(fields=['template','start_time'],name='unique_template_occurrence'),
+        ]
+        indexes = [
+            # Keyset pagination ordered by (start_time, id)
+            models.Index(fields=['status','start_time','id'],name='ride_status_start_idx'),
+            models.Index(fields=['driver','start_time','id'],name='ride_driver_start_idx'),
+            # Overlap checks and rides.schedule: a driver's open/full rides by time
+            models.Index(fields=['driver','status','start_time','end_time'],name='ride_driver_schedule_idx'),
+        ]
+
     @property
     def seats_available(self):
         return self.seats_offered - self.seats_booked
     
     def __str__(self):
         return f"{self.driver.profile.first_name}'s from {self.source} to {self.destination} on {self.start_time}"
+
+class RideTemplate(models.Model):
+    # A commuter's repeating ride. start_time/end_time are the first
+    # occurrence; rrule (RFC 5545, e.g. FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR)
+    # repeats it at the same local time. rides.recurring materializes the
+    # occurrences ahead of time as ordinary rides.
+    driver = models.ForeignKey(User,on_delete=models.CASCADE,related_name='ride_templates')
+    vehicle = models.ForeignKey(Vehicle,on_delete=models.PROTECT,related_name='ride_templates')
+    source = models.ForeignKey(Location,on_delete=models.PROTECT,related_name='+')
+    destination = models.ForeignKey(Location,on_delete=models.PROTECT,related_name='+')
+    boarding_points = models.JSONField(default=list)
+    dropping_points = models.JSONField(default=list)
+    fare = models.DecimalField(max_digits=8,decimal_places=2)
+    seats_offered = models.PositiveSmallIntegerField()
+    rrule = models.CharField(max_length=500)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    generated_until = models.DateTimeField(blank=True,null=True)  # occurrences before this are materialized
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} to {self.destination}, {self.rrule}"
+
+class RideStop(models.Model):
+    # A ride's route in order: its boarding points, then its dropping points.
+    # Derived from the JSON lists by rides.stops; the (key, ride, sequence)
+    # index answers "rides through A, then B" without reading the JSON.
+    ride = models.ForeignKey(Ride,on_delete=models.CASCADE,related_name='stops')
+    sequence = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=250)
+    key = models.CharField(max_length=250)  # canonical_location_name(name)
+    can_board = models.BooleanField(default=False)
+    can_drop = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['ride','sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['ride','sequence'],name='unique_ride_stop_sequence'),
+        ]
+        indexes = [
+            models.Index(fields=['key','ride','sequence'],name='ride_stop_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stop {self.sequence} of ride {self.ride_id}: {self.name}"
+
+class RideSearchIndex(models.Model):
+    # Denormalized, read-only copy of an open ride holding everything the public
+    # listing renders. Maintained by rides.search_index, never edited directly.
+    ride = models.OneToOneField(Ride,on_delete=models.CASCADE,primary_key=True,related_name='search_index')
+    source = models.ForeignKey(Location,on_delete=models.CASCADE,related_name='+')
+    destination = models.ForeignKey(Location,on_delete=models.CASCADE,related_name='+')
+    source_name = models.CharField(max_length=100)
+    destination_name = models.CharField(max_length=100)
+    source_latitude = models.FloatField(blank=True,null=True)
+    source_longitude = models.FloatField(blank=True,null=True)
+    destination_latitude = models.FloatField(blank=True,null=True)
+    destination_longitude = models.FloatField(blank=True,null=True)
+    boarding_points = models.JSONField(default=list)
+    dropping_points = models.JSONField(default=list)
+    start_date = models.DateField()  # local date bucket of start_time
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    fare = models.DecimalField(max_digits=8,decimal_places=2)
+    seats_offered = models.PositiveSmallIntegerField()
+    seats_booked = models.PositiveSmallIntegerField()
+    seats_available = models.PositiveSmallIntegerField()
+    segment_seats = models.JSONField(blank=True,null=True)  # seats taken per segment, rides with intermediate stops only
+    driver = models.ForeignKey(User,on_delete=models.CASCADE,related_name='+')
+    driver_profile = models.BigIntegerField(blank=True,null=True)  # Profile pk, as exposed by PublicDriverSerializer
+    driver_name = models.CharField(max_length=101)
+    driver_verified = models.BooleanField(default=False)
+    driver_total_rides = models.IntegerField(default=0)
+    driver_rating = models.DecimalField(max_digits=5,decimal_places=2,blank=True,null=True)
+    driver_updated_at = models.DateTimeField(blank=True,null=True)
+    vehicle_display = models.CharField(max_length=201)
+    vehicle_color = models.CharField(max_length=50,blank=True,null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()  # Ride.updated_at, used for incremental sync
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time','ride'],name='ridesearch_start_idx'),
+            models.Index(fields=['start_date','source'],name='ridesearch_date_source_idx'),
+            models.Index(fields=['start_date','destination'],name='ridesearch_date_dest_idx'),
+            models.Index(fields=['updated_at'],name='ridesearch_updated_idx'),
+        ]
+
+    @property
+    def status(self):
+        return Ride.RideStatus.OPEN
+
+    def __str__(self):
+        return f"Search row for ride {self.ride_id}"
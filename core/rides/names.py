@@ -0,0 +1,42 @@
+import re
+
+# Location name canonicalization and trigram helpers, kept free of model
+# imports so models and migrations can use them.
+
+QUALIFIER_MAX_LENGTH = 3
+
+
+def normalize_location_name(name):
+    name = re.sub(r"[^\w\s]"," ",str(name).casefold())
+    return " ".join(name.split())
+
+
+def fuzzy_key(name):
+    # Word order and duplicates don't matter: "Station Pune" == "pune station"
+    return " ".join(sorted(set(normalize_location_name(name).split())))
+
+
+def canonical_location_name(name):
+    # "Mumbai", "mumbai " and "Mumbai, MH" all become "mumbai". Only short
+    # trailing qualifiers (state/country codes) are dropped; longer ones like
+    # "Station, Pune" carry meaning and are kept.
+    parts = str(name).split(',')
+    while len(parts) > 1 and len(normalize_location_name(parts[-1])) <= QUALIFIER_MAX_LENGTH:
+        parts.pop()
+    return normalize_location_name(",".join(parts))
+
+
+def trigrams(name):
+    # pg_trgm style: every word padded with two leading blanks and one trailing
+    grams = set()
+    for word in normalize_location_name(name).split():
+        word = f"  {word} "
+        grams.update(word[i:i+3] for i in range(len(word) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,12 @@
+from core.pagination import IdCursorPagination
+
+
+class RideCursorPagination(IdCursorPagination):
+    ordering = ('start_time','pk')
+
+    def get_ordering(self, request, queryset, view):
+        # Proximity search ranks by distance; keep that order for the cursor
+        order_by = tuple(queryset.query.order_by)
+        if order_by and order_by[0].endswith('_distance_km'):
+            return order_by
+        return self.ordering
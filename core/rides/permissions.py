@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
-from users.models import DriverProfile
+from users.claims import get_claims
 
 User = get_user_model()
 
@@ -15,14 +15,14 @@ class IsDriver(permissions.BasePermission):
 class IsDriverVerified(permissions.BasePermission):
     def has_permission(self, request, view):
         print("Checking permission...")
-        user = request.user
-        if user.role == User.Roles.DRIVER:
-            driver = DriverProfile.objects.get(profile = user.id)
-            if driver.is_driver_verified:
+        # Cached claims, no query; invalidated when verification changes
+        claims = get_claims(request.user)
+        if claims['role'] == User.Roles.DRIVER:
+            if claims['driver_verified']:
                 print("User has permission to access this endpoint..")
             else:
                 print("Access denied...")
-            return driver.is_driver_verified
+            return claims['driver_verified']
         else:
             return False
     def has_object_permission(self, request, view, obj):
@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+
+from dateutil.rrule import DAILY, rrule, rrulestr
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.outbox import enqueue_email
+
+from .models import Ride, RideStop, RideTemplate
+from .schedule import forget as forget_schedule
+from .search_index import refresh_ride_search_index
+from .stops import build_stops
+
+logger = logging.getLogger(__name__)
+
+# Recurring rides. A RideTemplate holds the route, vehicle and fare once
+# (locations resolved when it is saved) plus an RRULE; generate_rides turns
+# the occurrences up to HORIZON ahead into ordinary Ride rows with bulk
+# inserts: one overlap query per driver for the whole batch, one digest email
+# instead of one per ride. Occurrences that clash with another of the
+# driver's rides are skipped and listed in the digest.
+
+HORIZON = timedelta(days=14)
+MAX_OCCURRENCES = 100  # per template and run, guards against runaway rules
+
+
+def parse_rule(rule, start_time):
+    # Occurrences keep start_time's local wall-clock time across DST changes
+    rule = rrulestr(rule.strip().removeprefix('RRULE:'),dtstart=timezone.localtime(start_time))
+    if not isinstance(rule,rrule):
+        raise ValueError("Give a single RRULE.")
+    if rule._freq > DAILY:
+        raise ValueError("Rides can repeat at most daily.")
+    return rule
+
+
+def occurrences(template, after, before):
+    # (start_time, end_time) of the occurrences in (after, before]
+    duration = template.end_time - template.start_time
+    starts = []
+    for start in parse_rule(template.rrule,template.start_time).xafter(after):
+        if start > before or len(starts) == MAX_OCCURRENCES:
+            break
+        starts.append(start)
+    return [(start,start + duration) for start in starts]
+
+
+def generate_rides(driver_id, now=None):
+    # Materializes the driver's active templates up to now + HORIZON
+    now = now or timezone.now()
+    horizon = now + HORIZON
+    with transaction.atomic():
+        templates = list(RideTemplate.objects.select_for_update(of=('self',)).select_related('driver','source','destination').filter(
+            Q(generated_until__isnull=True) | Q(generated_until__lt=horizon),driver_id=driver_id,is_active=True
+        ).order_by('id'))
+        if not templates:
+            return {"created": 0, "skipped": 0}
+        planned = []
+        for template in templates:
+            after = max(template.generated_until or template.start_time - timedelta(microseconds=1),now)
+            upcoming = occurrences(template,after,horizon)
+            planned += [(start,end,template) for start, end in upcoming]
+            # A capped run picks up after its last occurrence next time
+            template.generated_until = upcoming[-1][0] if len(upcoming) == MAX_OCCURRENCES else horizon
+        RideTemplate.objects.bulk_update(templates,['generated_until'])
+        if not planned:
+            return {"created": 0, "skipped": 0}
+        planned.sort(key=lambda occurrence: occurrence[0])
+
+        # Every ride of the driver's that the batch could collide with, in one query
+        busy = list(Ride.objects.filter(
+            driver_id=driver_id,
+            start_time__lt=max(end for _, end, _ in planned),
+            end_time__gt=planned[0][0],
+            status__in=[Ride.RideStatus.OPEN,Ride.RideStatus.FULL]
+        ).values_list('start_time','end_time'))
+        rides, skipped = [], []
+        for start, end, template in planned:
+            if any(busy_start < end and start < busy_end for busy_start, busy_end in busy):
+                skipped.append((start,template))
+                continue
+            busy.append((start,end))
+            rides.append(Ride(
+                driver_id=driver_id,
+                vehicle_id=template.vehicle_id,
+                source_id=template.source_id,
+                destination_id=template.destination_id,
+                boarding_points=template.boarding_points,
+                dropping_points=template.dropping_points,
+                fare=template.fare,
+                seats_offered=template.seats_offered,
+                start_time=start,
+                end_time=end,
+                template=template,
+            ))
+        # bulk_create skips the post_save handlers, so stops and the search index are written here
+        rides = Ride.objects.bulk_create(rides)
+        RideStop.objects.bulk_create([
+            stop for ride in rides for stop in build_stops(ride.id,ride.boarding_points,ride.dropping_points)
+        ])
+        refresh_ride_search_index([ride.id for ride in rides])
+        forget_schedule([driver_id])
+        send_digest(templates[0].driver,rides,skipped)
+    return {"created": len(rides), "skipped": len(skipped)}
+
+
+def describe(start, template):
+    return f"{template.source} to {template.destination} on {timezone.localtime(start):%a %d %b, %I:%M %p}"
+
+
+def send_digest(driver, rides, skipped):
+    lines = [f"- {describe(ride.start_time,ride.template)}" for ride in rides]
+    if skipped:
+        lines += ["","Not scheduled, you already have a ride at that time:"]
+        lines += [f"- {describe(start,template)}" for start, template in skipped]
+    first = rides[0].id if rides else f"skipped-{skipped[0][1].id}-{skipped[0][0]:%Y%m%d%H%M}"
+    enqueue_email(
+        f"recurring-rides:{driver.id}:{first}",
+        "Your upcoming rides",
+        f"{len(rides)} recurring rides were scheduled.\n\n" + "\n".join(lines),
+        [driver.email]
+    )
+
+
+def generate_recurring_rides(now=None):
+    # Beat entry point: every driver with a template that is behind the horizon
+    now = now or timezone.now()
+    drivers = RideTemplate.objects.filter(
+        Q(generated_until__isnull=True) | Q(generated_until__lt=now + HORIZON),is_active=True
+    ).values_list('driver_id',flat=True).distinct()
+    created = skipped = 0
+    for driver_id in list(drivers):
+        result = generate_rides(driver_id,now)
+        created += result['created']
+        skipped += result['skipped']
+    logger.info(f"Generated {created} recurring rides, skipped {skipped} overlapping occurrences.")
+    return {"created": created, "skipped": skipped}
@@ -0,0 +1,162 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from core import async_cache
+from core.metrics import registry
+
+# Shared cache of rendered ride list/detail JSON plus strong ETags, so polling
+# clients get a 304 or cached bytes instead of a fresh query and render.
+# Keys embed a generation: every change to a ride's listing bumps the list
+# generation and that ride's own one (see rides.search_index), orphaning the
+# stale entries. Generation keys never expire; if one is evicted anyway the
+# short TTL bounds how long an old entry can come back. The bumps must reach
+# every worker, so with a per-process cache (CACHE_SHARED off) responses are
+# built fresh on every request, without an ETag.
+
+LIST_GENERATION_KEY = "ride-response-gen:list"
+
+registry.describe("ride_response_cache_total","counter","Ride list/detail lookups in the response cache, by view and result (hit, miss).")
+registry.describe("ride_response_cache_hit_ratio","gauge","Share of ride list/detail lookups served from the response cache, by view.")
+registry.describe("ride_response_not_modified_total","counter","Ride list/detail requests answered with 304 Not Modified, by view.")
+registry.describe("ride_response_bytes_saved_total","counter","Response body bytes not sent thanks to 304 Not Modified, by view.")
+
+
+def ride_generation_key(ride_id):
+    return f"ride-response-gen:{ride_id}"
+
+
+def invalidate_rides(ride_ids=()):
+    keys = [LIST_GENERATION_KEY] + [ride_generation_key(ride_id) for ride_id in ride_ids]
+
+    def bump():
+        generation = time.time_ns()
+        cache.set_many({key: generation for key in keys},None)
+
+    bump()
+    # A request that read the old rows before commit may have cached them
+    transaction.on_commit(bump)
+
+
+def normalized_params(query_params):
+    # Order, blank values and surrounding whitespace do not change the result
+    params = []
+    for key in sorted(query_params):
+        values = sorted(value.strip() for value in query_params.getlist(key) if value.strip())
+        params += [(key,value) for value in values]
+    return urlencode(params)
+
+
+def response_key(request, scope, generation_key):
+    # Only JSON is cached; the browsable API renders per request
+    if not settings.CACHE_SHARED or request.accepted_renderer.format != 'json':
+        return None
+    return make_key(scope,cache.get(generation_key,0),request.accepted_media_type,request.query_params)
+
+
+def make_key(scope, generation, media_type, query_params):
+    digest = hashlib.sha1(f"{media_type}|{normalized_params(query_params)}".encode()).hexdigest()
+    return f"ride-response:{scope}:{generation}:{digest}"
+
+
+def list_key(request):
+    return response_key(request,'list',LIST_GENERATION_KEY)
+
+
+def detail_key(request, pk):
+    if not str(pk).isdigit():
+        return None
+    pk = int(pk)
+    return response_key(request,f"detail:{pk}",ride_generation_key(pk))
+
+
+async def aresponse_key(request, scope, generation_key):
+    # The async views render JSON only; their entries are kept apart because
+    # the pagination links point at /async/
+    if not settings.CACHE_SHARED:
+        return None
+    generation = await async_cache.aget(generation_key,0)
+    return make_key(f"async-{scope}",generation,'application/json',request.query_params)
+
+
+async def alist_key(request):
+    return await aresponse_key(request,'list',LIST_GENERATION_KEY)
+
+
+async def adetail_key(request, pk):
+    return await aresponse_key(request,f"detail:{pk}",ride_generation_key(pk))
+
+
+def etag_for(key, rows):
+    # Strong validator: the key (params + generation) and each row's (id, updated_at);
+    # rows are model instances or core.flat values() dicts
+    pairs = ((row['pk'],row['updated_at']) if isinstance(row,dict) else (row.pk,row.updated_at) for row in rows)
+    state = "|".join(f"{pk}:{updated_at.isoformat()}" for pk, updated_at in pairs)
+    return '"' + hashlib.sha1(f"{key}|{state}".encode()).hexdigest() + '"'
+
+
+def record(view, result):
+    registry.inc("ride_response_cache_total",view=view,result=result)
+    hits = registry.get("ride_response_cache_total",view=view,result='hit')
+    misses = registry.get("ride_response_cache_total",view=view,result='miss')
+    registry.set("ride_response_cache_hit_ratio",hits / (hits + misses),view=view)
+
+
+def cached_response(view, key, build):
+    # build() -> (data, rows); only called on a cache miss
+    request = view.request
+    if key is None:
+        data, _ = build()
+        return Response(data)
+    name = f"{view.basename}-{view.action}"
+
+    entry = cache.get(key)
+    if entry is None:
+        data, rows = build()
+        content = request.accepted_renderer.render(data,request.accepted_media_type,view.get_renderer_context())
+        entry = (etag_for(key,rows),content,request.accepted_media_type)
+        cache.set(key,entry,settings.RIDE_RESPONSE_CACHE_TTL)
+        record(name,'miss')
+    else:
+        record(name,'hit')
+
+    return conditional_response(request,name,entry)
+
+
+async def acached_response(view, key, build):
+    # cached_response for the async views; build is a coroutine function
+    if key is None:
+        data, _ = await build()
+        return HttpResponse(view.renderer.render(data),content_type=view.renderer.media_type)
+    name = view.metric_name
+    entry = await async_cache.aget(key)
+    if entry is None:
+        data, rows = await build()
+        entry = (etag_for(key,rows),view.renderer.render(data),view.renderer.media_type)
+        await async_cache.aset(key,entry,settings.RIDE_RESPONSE_CACHE_TTL)
+        record(name,'miss')
+    else:
+        record(name,'hit')
+    return conditional_response(view.request,name,entry)
+
+
+def conditional_response(request, name, entry):
+    etag, content, content_type = entry
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        registry.inc("ride_response_not_modified_total",view=name)
+        registry.inc("ride_response_bytes_saved_total",len(content),view=name)
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content,content_type=content_type)
+    response['ETag'] = etag
+    # Authenticated API: browsers keep it but revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    return response
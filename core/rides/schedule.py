@@ -0,0 +1,73 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Ride
+
+# Per-driver schedule for free-window listings. A driver's upcoming open and
+# full rides are read once (ride_driver_schedule_idx) into start-sorted
+# [start, end) intervals and kept in the cache until one of their rides is
+# created, edited, cancelled, completed or deleted (rides.signals, the
+# completion task and the recurring generator call forget). The overlap
+# check on create/edit always queries the database.
+
+SCHEDULE_TTL = 5 * 60
+BUSY = [Ride.RideStatus.OPEN,Ride.RideStatus.FULL]
+
+
+def schedule_key(driver_id):
+    return f"driver-schedule:v2:{driver_id}"
+
+
+class DriverSchedule:
+    # Intervals sorted by start plus, for every prefix, the latest end: the
+    # rides starting before a point keep the driver busy until that end
+    def __init__(self, intervals, reach=None):
+        self.intervals = intervals  # (start, end, ride_id)
+        self.starts = [start for start, _, _ in intervals]
+        if reach is None:
+            reach, latest = [], None
+            for _, end, _ in intervals:
+                latest = end if latest is None else max(latest,end)
+                reach.append(latest)
+        self.reach = reach
+
+    @classmethod
+    def build(cls, intervals):
+        return cls(sorted(intervals))
+
+    def free_windows(self, since, until, min_length=timedelta(0)):
+        # Gaps of at least min_length between the rides in [since, until)
+        i = bisect_right(self.starts,since)
+        cursor = max(since,self.reach[i-1]) if i else since
+        windows = []
+        for start, end, _ in self.intervals[i:]:
+            if start >= until:
+                break
+            if start > cursor and start - cursor >= min_length:
+                windows.append((cursor,start))
+            cursor = max(cursor,end)
+        if until > cursor and until - cursor >= min_length:
+            windows.append((cursor,until))
+        return windows
+
+
+def driver_schedule(driver_id):
+    state = cache.get(schedule_key(driver_id))
+    if state is not None:
+        return DriverSchedule(*state)
+    schedule = DriverSchedule.build(list(Ride.objects.filter(
+        driver_id=driver_id,status__in=BUSY,end_time__gt=timezone.now()
+    ).values_list('start_time','end_time','id')))
+    cache.set(schedule_key(driver_id),(schedule.intervals,schedule.reach),SCHEDULE_TTL)
+    return schedule
+
+
+def forget(driver_ids):
+    keys = [schedule_key(driver_id) for driver_id in set(driver_ids)]
+    cache.delete_many(keys)
+    # A request that read the old rows before commit may have cached them
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,124 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import localtime
+
+from .models import Ride, RideSearchIndex
+from .response_cache import invalidate_rides
+from .segments import SegmentTree
+
+logger = logging.getLogger(__name__)
+
+# Keeps RideSearchIndex in step with Ride. Only open rides have a row; anything
+# else (completed, cancelled, full) is removed from the index. Every change
+# here also invalidates the cached ride responses (rides.response_cache).
+
+RIDE_RELATED = ('source','destination','driver__profile__driver_profile','vehicle__model__make')
+
+
+def build_search_row(ride):
+    profile = getattr(ride.driver,'profile',None)
+    driver_profile = getattr(profile,'driver_profile',None) if profile else None
+    return RideSearchIndex(
+        ride_id = ride.id,
+        source_id = ride.source_id,
+        destination_id = ride.destination_id,
+        source_name = ride.source.name,
+        destination_name = ride.destination.name,
+        source_latitude = ride.source.latitude,
+        source_longitude = ride.source.longitude,
+        destination_latitude = ride.destination.latitude,
+        destination_longitude = ride.destination.longitude,
+        boarding_points = ride.boarding_points,
+        dropping_points = ride.dropping_points,
+        start_date = localtime(ride.start_time).date(),
+        start_time = ride.start_time,
+        end_time = ride.end_time,
+        fare = ride.fare,
+        seats_offered = ride.seats_offered,
+        seats_booked = ride.seats_booked,
+        seats_available = max(ride.seats_available,0),
+        segment_seats = SegmentTree.load(ride.segment_seats).occupancy() if ride.segment_seats else None,
+        driver_id = ride.driver_id,
+        driver_profile = profile.id if profile else None,
+        driver_name = f"{profile.first_name} {profile.last_name}" if profile else "",
+        driver_verified = driver_profile.is_driver_verified if driver_profile else False,
+        driver_total_rides = driver_profile.total_rides_as_a_driver if driver_profile else 0,
+        driver_rating = driver_profile.rating if driver_profile else None,
+        driver_updated_at = driver_profile.updated_at if driver_profile else None,
+        vehicle_display = f"{ride.vehicle.model.make.name} {ride.vehicle.model.name}",
+        vehicle_color = ride.vehicle.color,
+        created_at = ride.created_at,
+        updated_at = ride.updated_at,
+    )
+
+
+def refresh_ride_search_index(ride_ids):
+    # Rebuilds the rows of the given rides from the source tables (delete + bulk insert)
+    ride_ids = list(ride_ids)
+    if not ride_ids:
+        return 0
+    rides = Ride.objects.select_related(*RIDE_RELATED).filter(id__in=ride_ids,status=Ride.RideStatus.OPEN)
+    rows = [build_search_row(ride) for ride in rides]
+    with transaction.atomic():
+        RideSearchIndex.objects.filter(ride_id__in=ride_ids).delete()
+        RideSearchIndex.objects.bulk_create(rows)
+    invalidate_rides(ride_ids)
+    return len(rows)
+
+
+def adjust_search_index_seats(ride_id, seats, updated_at):
+    # Cheap in-place seat update used by the booking hot path
+    updated = RideSearchIndex.objects.filter(ride_id=ride_id).update(
+        seats_booked = F('seats_booked') + seats,
+        seats_available = F('seats_available') - seats,
+        updated_at = updated_at
+    )
+    invalidate_rides([ride_id])
+    return updated
+
+
+def set_search_index_segments(ride_id, seats_offered, segment_seats, updated_at):
+    # Same for rides tracked per segment (segment_seats: seats taken per segment)
+    busiest = max(segment_seats,default=0)
+    updated = RideSearchIndex.objects.filter(ride_id=ride_id).update(
+        seats_booked = busiest,
+        seats_available = max(seats_offered - busiest,0),
+        segment_seats = segment_seats,
+        updated_at = updated_at
+    )
+    invalidate_rides([ride_id])
+    return updated
+
+
+def remove_from_ride_search_index(ride_ids):
+    ride_ids = list(ride_ids)
+    invalidate_rides(ride_ids)
+    return RideSearchIndex.objects.filter(ride_id__in=ride_ids).delete()[0]
+
+
+def sync_ride_search_index(full=False, batch_size=1000):
+    # Incremental by default: drop rows of rides that are no longer open and
+    # re-index rides modified after the newest indexed ride.
+    removed = RideSearchIndex.objects.exclude(ride__status=Ride.RideStatus.OPEN).delete()[0]
+    invalidate_rides()
+
+    rides = Ride.objects.filter(status=Ride.RideStatus.OPEN)
+    if full:
+        removed += RideSearchIndex.objects.all().delete()[0]
+    else:
+        last_synced = RideSearchIndex.objects.order_by('-updated_at').values_list('updated_at',flat=True).first()
+        if last_synced:
+            rides = rides.filter(updated_at__gt=last_synced) | rides.filter(search_index__isnull=True)
+
+    refreshed = 0
+    batch = []
+    for ride_id in rides.values_list('id',flat=True).iterator(chunk_size=batch_size):
+        batch.append(ride_id)
+        if len(batch) >= batch_size:
+            refreshed += refresh_ride_search_index(batch)
+            batch = []
+    refreshed += refresh_ride_search_index(batch)
+    logger.info(f"Ride search index synced: {refreshed} refreshed, {removed} removed.")
+    return {"refreshed": refreshed, "removed": removed}
@@ -0,0 +1,128 @@
+from .names import canonical_location_name
+
+# Route and per-segment seat helpers, kept free of model imports so models and
+# migrations can use them.
+#
+# A ride's route is its boarding points followed by the dropping points not
+# already listed; a name in both lists is an intermediate stop where some
+# passengers get off and others get on. Segment i runs from stop i to stop
+# i + 1, and a booking from stop b to stop d takes its seats on [b, d).
+
+
+def route(boarding_points, dropping_points):
+    # [(name, can_board, can_drop)] in travel order
+    boarding = {canonical_location_name(name) for name in boarding_points}
+    dropping = {canonical_location_name(name) for name in dropping_points}
+    return [(name,True,canonical_location_name(name) in dropping) for name in boarding_points] + [
+        (name,False,True) for name in dropping_points if canonical_location_name(name) not in boarding
+    ]
+
+
+def route_positions(boarding_points, dropping_points):
+    return {canonical_location_name(name): sequence for sequence, (name, *_) in enumerate(route(boarding_points,dropping_points))}
+
+
+def route_error(boarding_points, dropping_points):
+    # Why the two lists don't describe one route, or None
+    if not boarding_points or not dropping_points:
+        return None
+    positions = route_positions(boarding_points,dropping_points)
+    dropping = [positions[canonical_location_name(name)] for name in dropping_points]
+    if dropping != sorted(dropping):
+        return "Dropping points should follow the order of the route."
+    if dropping[0] == 0:
+        return "The first boarding point can't be a dropping point."
+    if dropping[-1] != len(positions) - 1:
+        return "The route should end at a dropping point."
+    return None
+
+
+def has_intermediate_stops(boarding_points, dropping_points):
+    # Without them every leg crosses the segment into the first dropping
+    # point, so the busiest segment simply holds every booked seat
+    boarding = {canonical_location_name(name) for name in boarding_points}
+    return any(canonical_location_name(name) in boarding for name in dropping_points)
+
+
+def ride_leg(boarding_points, dropping_points, boarding_point, dropping_point):
+    # (board, drop) stop positions of a trip, or None when it doesn't go forward
+    positions = route_positions(boarding_points,dropping_points)
+    board = positions.get(canonical_location_name(boarding_point))
+    drop = positions.get(canonical_location_name(dropping_point))
+    if board is None or drop is None or board >= drop:
+        return None
+    return board, drop
+
+
+class SegmentTree:
+    """
+    Seats taken on each segment of a ride, with range add and range max in
+    O(log segments). Plain lists, so it round-trips through JSON
+    (Ride.segment_seats).
+    """
+
+    def __init__(self, segments, state=None):
+        self.segments = segments
+        self.size = 1
+        while self.size < segments:
+            self.size *= 2
+        if state:
+            self.peak, self.pending = state['peak'], state['pending']
+        else:
+            # peak[node]: busiest segment under node, not counting the pending
+            # adds of its ancestors; pending[node]: seats added to all of node
+            self.peak = [0] * (2 * self.size)
+            self.pending = [0] * (2 * self.size)
+
+    @classmethod
+    def load(cls, state):
+        return cls(state['segments'],state)
+
+    def dump(self):
+        return {"segments": self.segments,"peak": self.peak,"pending": self.pending}
+
+    def add(self, start, stop, seats, node=1, lo=0, hi=None):
+        hi = self.size if hi is None else hi
+        if stop <= lo or hi <= start:
+            return
+        if start <= lo and hi <= stop:
+            self.peak[node] += seats
+            self.pending[node] += seats
+            return
+        mid = (lo + hi) // 2
+        self.add(start,stop,seats,2 * node,lo,mid)
+        self.add(start,stop,seats,2 * node + 1,mid,hi)
+        self.peak[node] = max(self.peak[2 * node],self.peak[2 * node + 1]) + self.pending[node]
+
+    def max(self, start, stop, node=1, lo=0, hi=None):
+        # Seats taken on the busiest segment of [start, stop)
+        hi = self.size if hi is None else hi
+        if stop <= lo or hi <= start:
+            return float('-inf')
+        if start <= lo and hi <= stop:
+            return self.peak[node]
+        mid = (lo + hi) // 2
+        return max(self.max(start,stop,2 * node,lo,mid),self.max(start,stop,2 * node + 1,mid,hi)) + self.pending[node]
+
+    def busiest(self):
+        return self.max(0,self.segments) if self.segments else 0
+
+    def occupancy(self):
+        return [self.max(i,i + 1) for i in range(self.segments)]
+
+
+def segment_tree(boarding_points, dropping_points, state=None):
+    if state:
+        return SegmentTree.load(state)
+    return SegmentTree(max(len(route(boarding_points,dropping_points)) - 1,0))
+
+
+def segment_availability(boarding_points, dropping_points, seats_offered, seats_booked, occupancy=None):
+    # [{"from", "to", "seats_available"}] for every segment of the route
+    stops = [name for name, *_ in route(boarding_points,dropping_points)]
+    if occupancy is None:
+        occupancy = [seats_booked] * (len(stops) - 1)
+    return [
+        {"from": start,"to": end,"seats_available": max(seats_offered - taken,0)}
+        for start, end, taken in zip(stops,stops[1:],occupancy)
+    ]
@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime 
@@ -7,7 +9,12 @@ from rest_framework import serializers
 from users.models import DriverProfile
 from users.serializers import UserSerializer
 
-from .models import Ride, Vehicle, VehicleMake, VehicleModel, Location
+from .models import Ride, RideSearchIndex, RideTemplate, Vehicle, VehicleMake, VehicleModel, Location
+from .names import canonical_location_name
+from .recurring import parse_rule
+from .schedule import BUSY
+from .segments import SegmentTree, route_error, segment_availability
+from .stops import MAX_STOPS
 from .utils import get_or_create_location_async
 from bookings.models import Booking
 
@@ -32,8 +39,42 @@ class PublicVehicleSerializer(serializers.ModelSerializer):
     def get_model_name(self,obj):
         return f"{obj.model.make.name} {obj.model.name}"
 
-class RideSerializer(serializers.ModelSerializer):
-    driver = PublicDriverSerializer(read_only=True)
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ['id','name','latitude','longitude','is_verified']
+
+def ride_duration(start_time, end_time):
+    delta = abs(end_time - start_time)
+    return delta.total_seconds()
+
+def ride_duration_display(start_time, end_time):
+    delta = abs(end_time - start_time)
+    hours,remainder = divmod(delta.total_seconds(),3600) #return delta//3600 & delta % 3600
+    minutes, _ = divmod(remainder,60)
+    if minutes == 0:
+        return f"{int(hours)}h"
+    return f"{int(hours)}h {int(minutes)}m"
+
+def ride_segments(boarding_points, dropping_points, seats_offered, seats_booked, segment_seats):
+    occupancy = SegmentTree.load(segment_seats).occupancy() if segment_seats else None
+    return segment_availability(boarding_points,dropping_points,seats_offered,seats_booked,occupancy)
+
+class RideDurationMixin:
+    def get_duration(self,obj):
+        return ride_duration(obj.start_time,obj.end_time)
+    
+    def get_duration_display(self,obj):
+        return ride_duration_display(obj.start_time,obj.end_time)
+
+# flat_fields entries (core.flat) shared by the ride serializers
+RIDE_FLAT_FIELDS = {
+    'duration': (('start_time','end_time'),ride_duration),
+    'duration_display': (('start_time','end_time'),ride_duration_display),
+}
+
+class RideSerializer(RideDurationMixin,serializers.ModelSerializer):
+    driver = PublicDriverSerializer(source='driver.profile.driver_profile',read_only=True)
     vehicle = PublicVehicleSerializer(read_only=True)
     vehicle_id = serializers.PrimaryKeyRelatedField(
         source='vehicle',
@@ -45,25 +86,26 @@ class RideSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display',read_only=True)
     duration = serializers.SerializerMethodField()
     duration_display = serializers.SerializerMethodField()
+    segments = serializers.SerializerMethodField()
     # available_seats = serializers.SerializerMethodField(read_only=True)
-    def get_duration(self,obj):
-        start_time = obj.start_time
-        end_time = obj.end_time
-        delta = abs(end_time - start_time)
-        return delta.total_seconds()
-    
-    def get_duration_display(self,obj):
-        delta = abs(obj.end_time - obj.start_time)
-        hours,remainder = divmod(delta.total_seconds(),3600) #return delta//3600 & delta % 3600
-        minutes, _ = divmod(remainder,60)
-        if minutes == 0:
-            return f"{int(hours)}h"
-        return f"{int(hours)}h {int(minutes)}m"
+
+    def get_segments(self,obj):
+        return ride_segments(obj.boarding_points,obj.dropping_points,obj.seats_offered,obj.seats_booked,obj.segment_seats)
+
+    flat_fields = {
+        **RIDE_FLAT_FIELDS,
+        'driver.name': (('profile__first_name','profile__last_name'),lambda first_name, last_name: f"{first_name} {last_name}"),
+        'vehicle.model_name': (('model__make__name','model__name'),lambda make, model: f"{make} {model}"),
+        'source': (('source__name',),str),
+        'destination': (('destination__name',),str),
+        'seats_available': (('seats_offered','seats_booked'),lambda offered, booked: offered - booked),
+        'segments': (('boarding_points','dropping_points','seats_offered','seats_booked','segment_seats'),ride_segments),
+    }
 
     class Meta:
         model = Ride
-        fields = ['id','driver','vehicle','vehicle_id','source','destination','boarding_points','dropping_points','fare','seats_offered','seats_booked','seats_available','status','status_display','start_time','end_time','duration','duration_display','created_at','updated_at']
-        read_only_fields = ['driver','seats_booked','seats_available','status','created_at','updated_at','duration','duration_display']
+        fields = ['id','driver','vehicle','vehicle_id','source','destination','boarding_points','dropping_points','fare','seats_offered','seats_booked','seats_available','segments','status','status_display','start_time','end_time','duration','duration_display','created_at','updated_at']
+        read_only_fields = ['driver','seats_booked','seats_available','segments','status','created_at','updated_at','duration','duration_display']
     
     def validate_vehicle_id(self,value):
         vehicle = value
@@ -87,16 +129,25 @@ class RideSerializer(serializers.ModelSerializer):
         if not end_time:
             raise serializers.ValidationError("End time is required to validate start time")
         if isinstance(end_time,str):
-            end_time = parse_datetime(end_time)
+            try:
+                end_time = parse_datetime(end_time)
+            except ValueError:  # well formed but out of range, e.g. month 13
+                end_time = None
+        if not isinstance(end_time,datetime):
+            raise serializers.ValidationError("End time is not a valid date/time.")
+        if timezone.is_naive(end_time):
+            end_time = timezone.make_aware(end_time)
 
         if value < localtime():
             raise serializers.ValidationError("Start time should be greater than current time")
         
+        # Always against the database (ride_driver_schedule_idx): the cached
+        # schedule may be another worker's stale copy
         overlapping_ride = Ride.objects.filter(
             driver = user,
+            status__in = BUSY,
             start_time__lt = end_time,
-            end_time__gt = value,
-            status__in = [Ride.RideStatus.OPEN,Ride.RideStatus.FULL]
+            end_time__gt = value
         ).exclude(id = self.instance.id if self.instance else None)
 
         if overlapping_ride.exists():
@@ -104,7 +155,35 @@ class RideSerializer(serializers.ModelSerializer):
     
         return value
     
+    def validate_stops(self,value):
+        if not isinstance(value,list) or len(value) > MAX_STOPS:
+            raise serializers.ValidationError(f"Give a list of at most {MAX_STOPS} stops.")
+        if any(not isinstance(name,str) or not name.strip() for name in value):
+            raise serializers.ValidationError("Stop names can't be blank.")
+        value = [name.strip() for name in value]
+        keys = [canonical_location_name(name) for name in value]
+        if len(set(keys)) != len(keys):
+            raise serializers.ValidationError("A stop can only be listed once.")
+        return value
+
+    def validate_boarding_points(self,value):
+        return self.validate_stops(value)
+
+    def validate_dropping_points(self,value):
+        return self.validate_stops(value)
+
     def validate(self, attrs):
+        boarding_points = attrs.get('boarding_points',self.instance.boarding_points if self.instance else [])
+        dropping_points = attrs.get('dropping_points',self.instance.dropping_points if self.instance else [])
+        error = route_error(boarding_points,dropping_points)
+        if error:
+            raise serializers.ValidationError(error)
+        if self.instance and (boarding_points,dropping_points) != (self.instance.boarding_points,self.instance.dropping_points):
+            # Bookings hold route positions
+            if self.instance.booking_set.filter(status=Booking.BookingStatus.CONFIRMED).exists():
+                raise serializers.ValidationError("Stops can't be changed once the ride has bookings.")
+            attrs['segment_seats'] = None
+
         vehicle = attrs.get('vehicle')
         seats_offered = attrs.get('seats_offered')
         start_time = attrs.get('start_time')
@@ -133,8 +212,108 @@ class RideSerializer(serializers.ModelSerializer):
             for field in ['vehicle','fare','seats_offered','start_time']:
                 if field in validated_data:
                     raise serializers.ValidationError(f"{field} cannot be updated once ride is active.")
+        for field in ['source','destination']:
+            if field in validated_data:
+                validated_data[field] = get_or_create_location_async(validated_data[field])
         return super().update(instance, validated_data)
 
+class RideTemplateSerializer(serializers.ModelSerializer):
+    # Same route, fare and vehicle rules as RideSerializer; start_time/end_time are the first occurrence
+    vehicle_id = serializers.PrimaryKeyRelatedField(
+        source='vehicle',
+        queryset=Vehicle.objects.all(),
+        write_only=True
+    )
+    source = serializers.CharField()
+    destination = serializers.CharField()
+
+    validate_vehicle_id = RideSerializer.validate_vehicle_id
+    validate_fare = RideSerializer.validate_fare
+    validate_stops = RideSerializer.validate_stops
+    validate_boarding_points = RideSerializer.validate_boarding_points
+    validate_dropping_points = RideSerializer.validate_dropping_points
+
+    class Meta:
+        model = RideTemplate
+        fields = ['id','vehicle','vehicle_id','source','destination','boarding_points','dropping_points','fare','seats_offered','rrule','start_time','end_time','is_active','generated_until','created_at','updated_at']
+        read_only_fields = ['vehicle','generated_until','created_at','updated_at']
+
+    def validate(self, attrs):
+        instance = self.instance
+        current = lambda field: attrs.get(field,getattr(instance,field,None))
+        error = route_error(current('boarding_points') or [],current('dropping_points') or [])
+        if error:
+            raise serializers.ValidationError(error)
+        vehicle, seats_offered = current('vehicle'), current('seats_offered')
+        if seats_offered == 0 or seats_offered > vehicle.seats-1:
+            raise serializers.ValidationError(f"Offered seats should be in range 1-{vehicle.seats-1}")
+        if current('end_time') <= current('start_time'):
+            raise serializers.ValidationError("End time should be after start time")
+        if current('end_time') - current('start_time') > timedelta(days=1):
+            raise serializers.ValidationError("A recurring ride can't last more than a day.")
+        try:
+            parse_rule(current('rrule'),current('start_time'))
+        except (ValueError,TypeError) as e:
+            raise serializers.ValidationError({"rrule": f"Invalid recurrence rule: {e}"})
+        return attrs
+
+    def resolve_locations(self, validated_data):
+        # Once per template, every generated ride reuses the rows
+        for field in ['source','destination']:
+            if field in validated_data:
+                validated_data[field] = get_or_create_location_async(validated_data[field])
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self.resolve_locations(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance,self.resolve_locations(validated_data))
+
+class SearchDriverSerializer(serializers.Serializer):
+    # Same shape as PublicDriverSerializer, read from the denormalized columns
+    profile = serializers.IntegerField(source='driver_profile')
+    name = serializers.CharField(source='driver_name')
+    is_driver_verified = serializers.BooleanField(source='driver_verified')
+    total_rides_as_a_driver = serializers.IntegerField(source='driver_total_rides')
+    rating = serializers.DecimalField(source='driver_rating',max_digits=5,decimal_places=2)
+    updated_at = serializers.DateTimeField(source='driver_updated_at')
+
+class SearchVehicleSerializer(serializers.Serializer):
+    model_name = serializers.CharField(source='vehicle_display')
+    color = serializers.CharField(source='vehicle_color')
+
+class RideSearchSerializer(RideDurationMixin,serializers.ModelSerializer):
+    # Read-only listing serializer backed by RideSearchIndex, same output as RideSerializer
+    id = serializers.IntegerField(source='ride_id')
+    driver = SearchDriverSerializer(source='*')
+    vehicle = SearchVehicleSerializer(source='*')
+    source = serializers.CharField(source='source_name')
+    destination = serializers.CharField(source='destination_name')
+    status = serializers.CharField()
+    status_display = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
+    duration_display = serializers.SerializerMethodField()
+    segments = serializers.SerializerMethodField()
+
+    def get_status_display(self,obj):
+        return Ride.RideStatus(obj.status).label
+
+    def get_segments(self,obj):
+        return segment_availability(obj.boarding_points,obj.dropping_points,obj.seats_offered,obj.seats_booked,obj.segment_seats)
+
+    flat_fields = {
+        **RIDE_FLAT_FIELDS,
+        'status': ((),lambda: Ride.RideStatus.OPEN.value),
+        'status_display': ((),lambda: Ride.RideStatus.OPEN.label),
+        'segments': (('boarding_points','dropping_points','seats_offered','seats_booked','segment_seats'),segment_availability),
+    }
+
+    class Meta:
+        model = RideSearchIndex
+        fields = ['id','driver','vehicle','source','destination','boarding_points','dropping_points','fare','seats_offered','seats_booked','seats_available','segments','status','status_display','start_time','end_time','duration','duration_display','created_at','updated_at']
+        read_only_fields = fields
+
 class VehicleMakeSerializer(serializers.ModelSerializer):
     class Meta:
         model = VehicleMake
@@ -185,10 +364,10 @@ class BookingsDetailsSerialzer(serializers.Serializer):
         return f"Trip from {obj.source} to {obj.destination}"
     
     def get_date(self,obj):
-        return localtime(obj.start_time.date())
+        return localtime(obj.start_time).date()
 
     def get_time(self,obj):
-        return localtime(obj.start_time.time().strftime("%I:%M %p"))
+        return localtime(obj.start_time).time().strftime("%I:%M %p")
     
     def get_seats_booked(self,obj):
         return obj.seats_booked
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings import inventory
+from users.models import DriverProfile, Profile
+
+from .locations import index_location_trigrams
+from .response_cache import invalidate_rides
+from .models import Location, Ride, Vehicle
+from .schedule import forget as forget_schedule
+from .search_index import refresh_ride_search_index
+from .stops import save_ride_stops
+
+
+@receiver(post_save,sender=Ride)
+def update_ride_search_index(sender,instance,**kwargs):
+    refresh_ride_search_index([instance.id])
+
+@receiver(post_save,sender=Ride)
+def update_ride_stops(sender,instance,created,update_fields,**kwargs):
+    if created or update_fields is None or {'boarding_points','dropping_points'} & set(update_fields):
+        save_ride_stops(instance)
+
+@receiver(post_save,sender=Ride)
+def reset_seat_inventory(sender,instance,created,**kwargs):
+    # seats_offered or status may have changed; reload the counter lazily
+    if not created:
+        inventory.forget([instance.id])
+
+@receiver(post_save,sender=Ride)
+@receiver(post_delete,sender=Ride)
+def invalidate_driver_schedule(sender,instance,**kwargs):
+    forget_schedule([instance.driver_id])
+
+@receiver(post_delete,sender=Ride)
+def invalidate_deleted_ride(sender,instance,**kwargs):
+    invalidate_rides([instance.id])
+
+def refresh_open_rides(**filters):
+    ride_ids = Ride.objects.filter(status=Ride.RideStatus.OPEN,**filters).values_list('id',flat=True)
+    refresh_ride_search_index(ride_ids)
+
+@receiver(post_save,sender=Location)
+def update_location_trigrams(sender,instance,created,update_fields,**kwargs):
+    if created or update_fields is None or 'name' in update_fields:
+        index_location_trigrams([instance])
+
+@receiver(post_save,sender=Location)
+def update_location_rides(sender,instance,created,**kwargs):
+    if not created:
+        refresh_open_rides(source=instance)
+        refresh_open_rides(destination=instance)
+
+@receiver(post_save,sender=Vehicle)
+def update_vehicle_rides(sender,instance,created,**kwargs):
+    if not created:
+        refresh_open_rides(vehicle=instance)
+
+@receiver(post_save,sender=Profile)
+def update_profile_rides(sender,instance,created,**kwargs):
+    if not created:
+        refresh_open_rides(driver_id=instance.user_id)
+
+@receiver(post_save,sender=DriverProfile)
+def update_driver_profile_rides(sender,instance,created,**kwargs):
+    if not created:
+        refresh_open_rides(driver__profile__driver_profile=instance)
@@ -0,0 +1,62 @@
+from django.db.models import Exists, OuterRef
+
+from .locations import matching_locations
+from .models import LocationAlias, Ride, RideStop
+from .names import canonical_location_name
+from .segments import route
+
+# Ordered stop index over Ride.boarding_points/dropping_points (route order
+# as defined in rides.segments). A passenger boards at a boarding stop and
+# gets off at a later dropping stop.
+
+MAX_STOPS = 20  # per list
+
+
+def build_stops(ride_id, boarding_points, dropping_points):
+    return [
+        RideStop(ride_id=ride_id,sequence=sequence,name=name,key=canonical_location_name(name),can_board=can_board,can_drop=can_drop)
+        for sequence, (name, can_board, can_drop) in enumerate(route(boarding_points,dropping_points))
+    ]
+
+
+def save_ride_stops(ride):
+    RideStop.objects.filter(ride_id=ride.id).delete()
+    RideStop.objects.bulk_create(build_stops(ride.id,ride.boarding_points,ride.dropping_points))
+
+
+def sync_ride_stops(ride_ids, batch_size=1000):
+    # Rebuilds the stops of the given rides from their JSON lists
+    ride_ids = list(ride_ids)
+    for i in range(0,len(ride_ids),batch_size):
+        batch = ride_ids[i:i+batch_size]
+        rides = Ride.objects.filter(id__in=batch).values_list('id','boarding_points','dropping_points')
+        stops = [stop for ride in rides for stop in build_stops(*ride)]
+        RideStop.objects.filter(ride_id__in=batch).delete()
+        RideStop.objects.bulk_create(stops,batch_size=5000)
+
+
+def stop_keys(name):
+    # The canonical name plus those of the locations it is an alias of, so
+    # "Bombay" also finds stops entered as "Mumbai"
+    locations = matching_locations(name)
+    names = locations.values_list('normalized_name',flat=True).union(
+        LocationAlias.objects.filter(location__in=locations).values_list('name',flat=True)
+    )
+    return list({canonical_location_name(name),*names})
+
+
+def rides_through(board_at=None, drop_at=None):
+    # Subquery of ride ids with a boarding stop matching board_at followed by
+    # a dropping stop matching drop_at; either may be left out
+    if board_at is None:
+        return RideStop.objects.filter(key__in=stop_keys(drop_at),can_drop=True).values('ride_id')
+    boarding = RideStop.objects.filter(key__in=stop_keys(board_at),can_board=True)
+    if drop_at is not None:
+        boarding = boarding.filter(Exists(RideStop.objects.filter(
+            ride=OuterRef('ride'),key__in=stop_keys(drop_at),can_drop=True,sequence__gt=OuterRef('sequence')
+        )))
+    return boarding.values('ride_id')
+
+
+def rides_via(name):
+    return RideStop.objects.filter(key__in=stop_keys(name)).values('ride_id')
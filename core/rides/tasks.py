@@ -1,56 +1,52 @@
 from celery import shared_task
-from django.conf import settings
-from django.core.mail import send_mail
 from django.db import transaction
-from django.db.models import F, Count
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
 from django.utils import timezone
-from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderServiceError
 
+from .geocoding import geocode_location, geocode_pending_locations
 from .models import Ride, Location
+from .recurring import generate_recurring_rides
+from .schedule import forget as forget_schedule
+from .search_index import remove_from_ride_search_index, sync_ride_search_index
 from bookings.models import Booking
 from users.models import DriverProfile, PassengerProfile
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def send_ride_confirmation_email(user_email,ride_id):
-    logger.info(f"Sending email for ride {ride_id} to {user_email}...")
-    ride = Ride.objects.get(id=ride_id)
-    send_mail(
-        subject = "Ride creation mail",
-        message = f"Ride from {ride.source} to {ride.destination} created successfully.",
-        from_email = settings.DEFAULT_FROM_EMAIL,
-        recipient_list = [user_email]
-    )
-    logger.info(f"Email sent for ride {ride_id}")
-
-@shared_task
-def mark_completed_rides():
-    logger.info("Marking ride status completed...")
-    now = timezone.now()
-    rides_to_complete = Ride.objects.filter(status=Ride.RideStatus.OPEN, end_time__lt=now)
+def increment_counters(model, field, counts):
+    # One UPDATE for the whole batch: field = field + CASE id WHEN .. THEN n END
+    counts = {pk: count for pk, count in counts if pk is not None}
+    if not counts:
+        return 0
+    return model.objects.filter(id__in=counts).update(**{
+        field: F(field) + Case(
+            *[When(id=pk, then=Value(count)) for pk, count in counts.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    })
 
-    if not rides_to_complete.exists():
-        logger.info("No rides to mark as completed.")
-        return
-    ride_ids = list(rides_to_complete.values_list('id',flat=True))
+def complete_rides_batch(ride_ids):
     with transaction.atomic():
-        updated = rides_to_complete.update(status=Ride.RideStatus.COMPLETED)
-        logger.info(f"Marked {updated} rides as completed.")
+        # Re-check the status under lock: counters are only incremented for rides
+        # this transaction moves to completed, so re-running a batch after a
+        # crashed worker never counts a ride twice.
+        ride_ids = list(Ride.objects.select_for_update(skip_locked=True).filter(
+            id__in=ride_ids,status=Ride.RideStatus.OPEN
+        ).values_list('id',flat=True))
+        if not ride_ids:
+            return 0
+        updated = Ride.objects.filter(id__in=ride_ids).update(status=Ride.RideStatus.COMPLETED,updated_at=timezone.now())
 
         driver_counts = Ride.objects.filter(id__in=ride_ids).values(
             'driver__profile__driver_profile'
         ).annotate(
             count=Count('id')
         ).values_list('driver__profile__driver_profile','count')
-        logger.info(f"Driver counts:{driver_counts}")
-        for profile_id, count in driver_counts:
-            logger.info(f"Updating Driver Profile_id:{profile_id} with count:{count}")
-            DriverProfile.objects.filter(id=profile_id).update(
-                total_rides_as_a_driver = F('total_rides_as_a_driver') + count
-            )
+        increment_counters(DriverProfile,'total_rides_as_a_driver',driver_counts)
 
         passenger_counts = Booking.objects.filter(
             ride__in = ride_ids
@@ -59,26 +55,58 @@ def mark_completed_rides():
         ).annotate(
             count = Count('id')
         ).values_list('passenger__profile__passenger_profile','count')
-        logger.info(f"Passenger counts:{passenger_counts}")
-        for profile_id, count in passenger_counts:
-            logger.info(f"Updating Passenger Profile_id:{profile_id} with count:{count}")
-            PassengerProfile.objects.filter(id=profile_id).update(
-                total_rides_as_a_passenger = F('total_rides_as_a_passenger') + count
-            )
-    logger.info("Completed marking rides and updating profiles efficiently.")
+        increment_counters(PassengerProfile,'total_rides_as_a_passenger',passenger_counts)
+
+        remove_from_ride_search_index(ride_ids)
+        # The update skips post_save, so drop the drivers' cached schedules here
+        forget_schedule(Ride.objects.filter(id__in=ride_ids).values_list('driver_id',flat=True).distinct())
+    return updated
+
+@shared_task
+def mark_completed_rides(batch_size=500):
+    logger.info("Marking ride status completed...")
+    now = timezone.now()
+    started = time.perf_counter()
+    completed = batches = 0
+    last = None
+    # Walk expired rides by (end_time, id) keyset in bounded batches, each in its own short transaction
+    while True:
+        expired = Ride.objects.filter(status=Ride.RideStatus.OPEN,end_time__lt=now)
+        if last:
+            expired = expired.filter(Q(end_time__gt=last[0]) | Q(end_time=last[0],id__gt=last[1]))
+        batch = list(expired.order_by('end_time','id').values_list('end_time','id')[:batch_size])
+        if not batch:
+            break
+        last = batch[-1]
+        completed += complete_rides_batch([ride_id for _, ride_id in batch])
+        batches += 1
+
+    elapsed = time.perf_counter() - started
+    rate = completed / elapsed if elapsed else 0
+    if completed:
+        logger.info(f"Marked {completed} rides as completed in {batches} batches, {elapsed:.2f}s ({rate:.0f} rides/s).")
+    else:
+        logger.info("No rides to mark as completed.")
+    return {"completed": completed, "batches": batches, "seconds": round(elapsed,3), "rides_per_second": round(rate,1)}
+
+@shared_task
+def sync_ride_search_index_task(full=False):
+    return sync_ride_search_index(full=full)
+
+@shared_task
+def generate_recurring_rides_task():
+    return generate_recurring_rides()
+
+@shared_task
+def geocode_pending_locations_task(batch_size=None):
+    return geocode_pending_locations(batch_size=batch_size)
 
 @shared_task
 def verify_location_with_geopy(location_id):
     try:
         location = Location.objects.get(id=location_id)
-        geolocator = Nominatim(user_agent='carpool_app')
-        geo_location = geolocator.geocode(location.name)
-        if geo_location:
-            location.latitude = geo_location.latitude
-            location.longitude = geo_location.longitude
-            location.is_verified = True
-        location.save()
+        geocode_location(location)
     except Location.DoesNotExist:
         logger.info("Location does not exist...")
     except GeocoderServiceError as e:
-        logger.info(e)
\ No newline at end of file
+        logger.info(e)
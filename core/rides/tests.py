@@ -1,3 +1,719 @@
-from django.test import TestCase
+import math
+from datetime import timedelta
+from decimal import Decimal
+import unittest
+import warnings
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import call_command
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from benchmarks.fixtures import create_locations, create_rides, create_users, create_vehicles
+from benchmarks.runner import access_token
+from bookings.models import Booking
+from bookings.reservations import reserve_seats
+from bookings.serializers import BookingSerializer
+from core.flat import compile_serializer
+from core.metrics import registry
+from core.renderers import FastJSONRenderer
+from core.testing import fakeredis, process_caches, query_budget, shared_caches
+from users.models import DriverProfile, PassengerProfile
+
+from . import geo, geocoding
+from .filters import RideSearchIndexFilter
+from .geo import EARTH_RADIUS_KM
+from .locations import autocomplete, trigram_counts
+from notifications.models import OutboxEmail
+
+from .models import GeocodeCache, Location, LocationAlias, Ride, RideSearchIndex, RideStop, RideTemplate
+from .recurring import HORIZON, generate_recurring_rides
+from .schedule import DriverSchedule, driver_schedule, schedule_key
+from .search_index import sync_ride_search_index
+from .serializers import RideSearchSerializer, RideSerializer
+from .tasks import complete_rides_batch, mark_completed_rides
+from .utils import find_locations_near, get_or_create_location_async
 
 # Create your tests here.
+
+class MarkCompletedRidesTests(TestCase):
+    def setUp(self):
+        self.drivers = create_users(2,'driver')
+        vehicles = create_vehicles(self.drivers)
+        locations = create_locations(4)
+        self.passenger = create_users(1,'passenger')[0]
+        rides = create_rides(vehicles,locations,7)
+        sync_ride_search_index(full=True)
+        past = timezone.now() - timedelta(hours=1)
+        self.expired_ids = [ride.id for ride in rides[:5]]
+        Ride.objects.filter(id__in=self.expired_ids).update(start_time=past - timedelta(hours=2),end_time=past)
+        Booking.objects.bulk_create([
+            Booking(passenger=self.passenger,ride_id=ride_id,boarding_point='A',dropping_point='B',seats_booked=1,status=Booking.BookingStatus.CONFIRMED)
+            for ride_id in self.expired_ids[:3]
+        ])
+
+    def driver_total(self):
+        return sum(DriverProfile.objects.filter(profile__user__in=self.drivers).values_list('total_rides_as_a_driver',flat=True))
+
+    def test_completes_expired_rides_in_batches(self):
+        result = mark_completed_rides(batch_size=2)
+
+        self.assertEqual(result['completed'],5)
+        self.assertEqual(result['batches'],3)
+        self.assertEqual(Ride.objects.filter(status=Ride.RideStatus.COMPLETED).count(),5)
+        self.assertEqual(Ride.objects.filter(status=Ride.RideStatus.OPEN).count(),2)
+        self.assertEqual(RideSearchIndex.objects.count(),2)
+        self.assertEqual(self.driver_total(),5)
+        self.assertEqual(PassengerProfile.objects.get(profile__user=self.passenger).total_rides_as_a_passenger,3)
+
+    def test_rerunning_a_batch_never_double_counts(self):
+        self.assertEqual(complete_rides_batch(self.expired_ids[:3]),3)
+        # A retried worker picks up the same ids again
+        self.assertEqual(complete_rides_batch(self.expired_ids),2)
+        self.assertEqual(mark_completed_rides()['completed'],0)
+
+        self.assertEqual(self.driver_total(),5)
+        self.assertEqual(PassengerProfile.objects.get(profile__user=self.passenger).total_rides_as_a_passenger,3)
+
+@override_settings(
+    GEOCODER_BACKEND='rides.geocoding.StubBackend',
+    GEOCODER_STUB_RESULTS={'Pune Station': (18.5286,73.8742)},
+    GEOCODER_RATE_LIMIT=1000,
+)
+class GeocodingTests(TestCase):
+    def test_batch_geocodes_pending_locations_and_caches_results(self):
+        found = Location.objects.create(name='Pune Station')
+        missing = Location.objects.create(name='Nowhere')
+
+        self.assertEqual(geocoding.geocode_pending_locations(),{"geocoded": 2, "verified": 1})
+        found.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertTrue(found.is_verified)
+        self.assertIsNotNone(found.geohash)
+        self.assertFalse(missing.is_verified)
+        self.assertIsNotNone(missing.geocoded_at)
+        self.assertEqual(GeocodeCache.objects.count(),2)
+        # Attempted rows are not picked up again
+        self.assertEqual(geocoding.geocode_pending_locations(),{"geocoded": 0, "verified": 0})
+
+    def test_claims_of_dead_workers_expire(self):
+        location = Location.objects.create(name='Pune Station')
+        Location.objects.filter(id=location.id).update(geocode_lease_until=timezone.now() + geocoding.GEOCODE_LEASE)
+        self.assertEqual(geocoding.geocode_pending_locations(),{"geocoded": 0, "verified": 0})
+        Location.objects.filter(id=location.id).update(geocode_lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(geocoding.geocode_pending_locations(),{"geocoded": 1, "verified": 1})
+        location.refresh_from_db()
+        self.assertIsNone(location.geocode_lease_until)
+
+    def test_cache_hits_resolve_without_the_backend(self):
+        geocoding.geocode('Pune Station')
+        with mock.patch.object(geocoding.StubBackend,'geocode') as backend:
+            self.assertEqual(geocoding.geocode('pune  STATION'),(18.5286,73.8742))
+            location = get_or_create_location_async('Station, Pune')
+        backend.assert_not_called()
+        self.assertTrue(location.is_verified)
+        self.assertEqual(location.latitude,18.5286)
+
+class LocationNormalizationTests(TestCase):
+    def setUp(self):
+        drivers = create_users(1,'driver')
+        self.vehicles = create_vehicles(drivers)
+
+    def open_rides_from(self, name):
+        return RideSearchIndexFilter({'source': name},queryset=RideSearchIndex.objects.all()).qs
+
+    def test_spelling_variants_resolve_to_one_location(self):
+        mumbai = get_or_create_location_async('Mumbai')
+        self.assertEqual(get_or_create_location_async('mumbai ').id,mumbai.id)
+        self.assertEqual(get_or_create_location_async('Mumbai, MH').id,mumbai.id)
+        self.assertNotEqual(get_or_create_location_async('Station, Pune').normalized_name,'station')
+        self.assertEqual(Location.objects.filter(normalized_name='mumbai').count(),1)
+
+    def test_autocomplete_matches_prefixes_and_typos(self):
+        for name in ['Pune Station','Pune Airport','Punawale','Mumbai Central']:
+            Location.objects.create(name=name)
+
+        self.assertEqual([l.name for l in autocomplete('pune')],['Pune Airport','Pune Station'])
+        self.assertEqual([l.name for l in autocomplete('PUN',limit=2)],['Punawale','Pune Airport'])
+        self.assertEqual(autocomplete('Mumbai Cnetral')[0].name,'Mumbai Central')
+        self.assertEqual(autocomplete('  '),[])
+
+    def test_trigram_count_keys_are_cache_safe(self):
+        # Grams hold spaces and non-ASCII letters; memcached rejects such keys
+        with warnings.catch_warnings():
+            warnings.simplefilter('error',CacheKeyWarning)
+            counts = trigram_counts([' pu','pun','ö z'])
+        self.assertEqual(set(counts),{' pu','pun','ö z'})
+
+    def test_merge_repoints_rides_and_keeps_old_names_as_aliases(self):
+        # Rows created before normalization existed
+        pune = Location.objects.create(name='Pune')
+        duplicate = Location.objects.create(name='pune.')
+        poona = Location.objects.create(name='Poona')
+        other = Location.objects.create(name='Nashik')
+        rides = create_rides(self.vehicles,[duplicate,other],2) + create_rides(self.vehicles,[poona,other],2)
+        sync_ride_search_index(full=True)
+
+        call_command('merge_duplicate_locations',stdout=mock.MagicMock())
+        call_command('merge_duplicate_locations',poona.id,into=pune.id,stdout=mock.MagicMock())
+
+        self.assertFalse(Location.objects.filter(id__in=[duplicate.id,poona.id]).exists())
+        self.assertEqual(LocationAlias.objects.get(name='poona').location,pune)
+        ride_ids = [ride.id for ride in rides]
+        self.assertFalse(Ride.objects.filter(id__in=ride_ids).exclude(Q(source=pune) | Q(destination=pune)).exists())
+        self.assertEqual(get_or_create_location_async('Poona').id,pune.id)
+        expected = set(Ride.objects.filter(source=pune).values_list('id',flat=True))
+        self.assertTrue(expected)
+        self.assertEqual(set(self.open_rides_from('POONA').values_list('ride_id',flat=True)),expected)
+
+    def test_merge_repoints_ride_templates(self):
+        pune = Location.objects.create(name='Pune')
+        duplicate = Location.objects.create(name='pune.')
+        mumbai = Location.objects.create(name='Mumbai')
+        start = timezone.now() + timedelta(days=1)
+        template = RideTemplate.objects.create(
+            driver_id=self.vehicles[0].owner_id,vehicle=self.vehicles[0],source=duplicate,destination=mumbai,
+            boarding_points=['pune.'],dropping_points=['Mumbai'],fare=300,seats_offered=2,
+            rrule='FREQ=DAILY',start_time=start,end_time=start + timedelta(hours=3)
+        )
+        call_command('merge_duplicate_locations',stdout=mock.MagicMock())
+        template.refresh_from_db()
+        self.assertEqual(template.source,pune)
+        self.assertFalse(Location.objects.filter(id=duplicate.id).exists())
+
+def offset(latitude, longitude, km, bearing):
+    # The point km away along bearing (degrees), on the same sphere as geo.haversine_km
+    lat, lng, d, b = math.radians(latitude), math.radians(longitude), km / EARTH_RADIUS_KM, math.radians(bearing)
+    lat2 = math.asin(math.sin(lat) * math.cos(d) + math.cos(lat) * math.sin(d) * math.cos(b))
+    lng2 = lng + math.atan2(math.sin(b) * math.sin(d) * math.cos(lat),math.cos(d) - math.sin(lat) * math.sin(lat2))
+    return math.degrees(lat2), math.degrees(lng2)
+
+class GeoTests(TestCase):
+    PUNE = (18.5204,73.8567)
+
+    def test_geohash_of_known_points(self):
+        self.assertEqual(geo.encode(57.64911,10.40744,11),'u4pruydqqvj')
+        self.assertEqual(geo.encode(42.6,-5.6,5),'ezs42')
+        self.assertEqual(geo.encode(0,0,5),'s0000')
+        (lat_min, lat_max), (lng_min, lng_max) = geo.decode_bounds(geo.encode(*self.PUNE))
+        self.assertTrue(lat_min <= self.PUNE[0] < lat_max and lng_min <= self.PUNE[1] < lng_max)
+
+    def test_covering_cells_contain_the_whole_circle(self):
+        for radius in (0.5,5,37,100):
+            cells = geo.covering_cells(*self.PUNE,radius)
+            precision = len(cells[0])
+            for bearing in range(0,360,15):
+                point = offset(*self.PUNE,radius * 0.999,bearing)
+                self.assertIn(geo.encode(*point,precision),cells,(radius,bearing))
+
+    def test_locations_at_the_radius_boundary(self):
+        inside = Location.objects.create(name='Inside',latitude=offset(*self.PUNE,4.99,45)[0],longitude=offset(*self.PUNE,4.99,45)[1])
+        Location.objects.create(name='Outside',latitude=offset(*self.PUNE,5.01,45)[0],longitude=offset(*self.PUNE,5.01,45)[1])
+        Location.objects.create(name='Pending')
+        self.assertEqual(find_locations_near(*self.PUNE,5),{inside.id: 4.99})
+
+class ProximitySearchTests(TestCase):
+    PUNE = GeoTests.PUNE
+
+    def setUp(self):
+        self.vehicles = create_vehicles(create_users(1,'driver'))
+        place = lambda name, km: Location.objects.create(name=name,latitude=offset(*self.PUNE,km,90)[0],longitude=offset(*self.PUNE,km,90)[1])
+        self.near, self.nearer, self.far = place('Near',3), place('Nearer',1), place('Far',8)
+        self.mumbai = Location.objects.create(name='Mumbai',latitude=19.076,longitude=72.8777)
+        routes = [(self.near,self.mumbai)] * 3 + [(self.nearer,self.mumbai)] * 5 + [(self.far,self.mumbai),(self.mumbai,self.near)]
+        self.rides = create_rides(self.vehicles,[self.near,self.mumbai],len(routes))
+        for ride, (source, destination) in zip(self.rides,routes):
+            Ride.objects.filter(id=ride.id).update(source=source,destination=destination)
+        sync_ride_search_index(full=True)
+        self.client = APIClient()
+        self.client.force_authenticate(create_users(1,'passenger')[0])
+
+    def walk(self, **params):
+        # Every page of the listing, following the next links
+        response = self.client.get(reverse('ride-list'),{**params,'page_size': 3})
+        rows = []
+        while True:
+            self.assertEqual(response.status_code,200,response.content)
+            page = response.json()
+            rows += page['results']
+            if not page['next']:
+                return rows
+            response = self.client.get(page['next'])
+
+    def test_near_source_ranks_by_distance(self):
+        rows = self.walk(near_source=f"{self.PUNE[0]},{self.PUNE[1]}")
+        expected = sorted(
+            Ride.objects.filter(source__in=[self.nearer,self.near]).values_list('source__name','start_time','id'),
+            key=lambda ride: (ride[0] != 'Nearer',ride[1],ride[2])
+        )
+        self.assertEqual([row['id'] for row in rows],[ride[2] for ride in expected])
+        self.assertEqual([row['source'] for row in rows],['Nearer'] * 5 + ['Near'] * 3)
+
+        rows = self.walk(near_destination=f"{self.PUNE[0]},{self.PUNE[1]}",radius_km=10)
+        self.assertEqual([row['destination'] for row in rows],['Near'])
+        self.assertEqual(len(self.walk(near_source=f"{self.PUNE[0]},{self.PUNE[1]}",radius_km=10)),9)
+
+    def test_invalid_points_and_radii_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('ride-list'),{'near_source': 'pune'}).status_code,400)
+        self.assertEqual(self.client.get(reverse('ride-list'),{'near_source': '18.5,73.8','radius_km': 500}).status_code,400)
+
+class RideSearchIndexTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.vehicle = create_vehicles([self.driver])[0]
+        self.ride = create_rides([self.vehicle],create_locations(2),1,prebooked=False)[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def row(self, ride=None):
+        return RideSearchIndex.objects.filter(ride=ride or self.ride).first()
+
+    def test_rows_follow_ride_changes(self):
+        self.assertEqual(self.row().source_name,self.ride.source.name)
+        start = timezone.now() + timedelta(days=2)
+        created = self.client.post(reverse('ride-list'),{
+            'vehicle_id': self.vehicle.id,'source': 'Pune','destination': 'Mumbai','fare': 300,'seats_offered': 2,
+            'start_time': start.isoformat(),'end_time': (start + timedelta(hours=3)).isoformat()
+        },format='json').data['id']
+        self.assertEqual((self.row(created).source_name,self.row(created).fare),('Pune',300))
+
+        ride = Ride.objects.get(id=created)
+        ride.fare = 450
+        ride.save()
+        self.assertEqual(self.row(created).fare,450)
+        self.client.post(reverse('ride-cancel',args=[created]))
+        self.assertIsNone(self.row(created))
+        self.ride.delete()
+        self.assertFalse(RideSearchIndex.objects.exists())
+
+    def test_rows_follow_location_profile_and_vehicle_edits(self):
+        self.ride.source.name = 'Renamed Chowk'
+        self.ride.source.save()
+        profile = self.driver.profile
+        profile.first_name = 'Zoya'
+        profile.save()
+        self.vehicle.color = 'red'
+        self.vehicle.save()
+        driver_profile = profile.driver_profile
+        driver_profile.rating = 4.5
+        driver_profile.save()
+        row = self.row()
+        self.assertEqual((row.source_name,row.driver_name.split()[0],row.vehicle_color,row.driver_rating),('Renamed Chowk','Zoya','red',Decimal('4.50')))
+
+    def test_sync_catches_up_changes_made_behind_the_signals(self):
+        # Updates and bulk inserts skip post_save
+        Ride.objects.filter(id=self.ride.id).update(fare=999,updated_at=timezone.now() + timedelta(seconds=1))
+        [added] = Ride.objects.bulk_create([Ride(
+            driver=self.driver,vehicle=self.vehicle,source=self.ride.source,destination=self.ride.destination,
+            fare=100,seats_offered=2,start_time=self.ride.start_time + timedelta(days=3),end_time=self.ride.end_time + timedelta(days=3)
+        )])
+        self.assertEqual(sync_ride_search_index(),{"refreshed": 2, "removed": 0})
+        self.assertEqual((self.row().fare,self.row(added).fare),(999,100))
+
+        Ride.objects.filter(id=added.id).update(status=Ride.RideStatus.COMPLETED)
+        self.assertEqual(sync_ride_search_index(),{"refreshed": 0, "removed": 1})
+
+        # A full rebuild also repairs rows that drifted without a newer ride
+        RideSearchIndex.objects.update(driver_name='stale')
+        self.assertEqual(sync_ride_search_index(full=True)["refreshed"],1)
+        self.assertNotEqual(self.row().driver_name,'stale')
+
+class RidePaginationTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        rides = create_rides(create_vehicles([self.driver]),create_locations(4),10,prebooked=False)
+        # Three departures shared by several rides each
+        start = timezone.now() + timedelta(days=1)
+        for i, ride in enumerate(rides):
+            Ride.objects.filter(id=ride.id).update(start_time=start + timedelta(hours=i % 3),end_time=start + timedelta(hours=i % 3,minutes=30))
+        sync_ride_search_index(full=True)
+        self.expected = list(Ride.objects.order_by('start_time','id').values_list('id',flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def walk(self, url, key, **params):
+        pages = [self.client.get(url,{**params,'page_size': 3}).json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        return pages, [row['id'] for page in pages for row in page[key]]
+
+    def test_ties_on_start_time_page_without_duplicates_or_gaps(self):
+        for url, key in ((reverse('ride-list'),'results'),(reverse('ride-my-rides'),'my_rides')):
+            pages, ids = self.walk(url,key)
+            self.assertEqual(ids,self.expected,url)
+            # previous links lead back to the same pages
+            self.assertEqual(self.client.get(pages[2]['previous']).json()[key],pages[1][key])
+
+    def test_invalid_cursor_is_not_found(self):
+        for url in (reverse('ride-list'),reverse('ride-my-rides')):
+            self.assertEqual(self.client.get(url,{'cursor': 'not-a-cursor'}).status_code,404)
+
+class RideQueryBudgetTests(TestCase):
+    # Budgets hold for any page size; an N+1 in a serializer breaks them
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        vehicles = create_vehicles([self.driver])
+        passengers = create_users(5,'passenger')
+        self.rides = create_rides(vehicles,create_locations(4),10)
+        sync_ride_search_index(full=True)
+        Booking.objects.bulk_create([
+            Booking(passenger=passenger,ride=self.rides[0],boarding_point='A',dropping_point='B',seats_booked=1,status=Booking.BookingStatus.CONFIRMED)
+            for passenger in passengers
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def test_ride_list(self):
+        with query_budget(1):
+            response = self.client.get(reverse('ride-list'))
+        self.assertEqual(len(response.json()['results']),10)
+        self.assertIn('db;dur=',response['Server-Timing'])
+
+    def test_bookings_details(self):
+        url = reverse('ride-bookings-details',args=[self.rides[0].id])
+        self.client.get(url)  # caches the driver's claims
+        with query_budget(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(len(response.data['passenger_details']),5)
+
+    def test_bookings_details_date_and_time_are_local(self):
+        start = timezone.localtime(self.rides[0].start_time)
+        data = self.client.get(reverse('ride-bookings-details',args=[self.rides[0].id])).data
+        self.assertEqual((data['date'],data['time']),(start.date(),start.strftime("%I:%M %p")))
+
+
+class RideResponseCacheTests(TestCase):
+    def setUp(self):
+        driver = create_users(1,'driver')[0]
+        self.rides = create_rides(create_vehicles([driver]),create_locations(4),3)
+        sync_ride_search_index(full=True)
+        self.client = APIClient()
+        self.client.force_authenticate(create_users(1,'passenger')[0])
+        registry.clear()
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get(reverse('ride-list'),{'ordering': '','source': self.rides[0].source.name})
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('ride-list'),{'source': f" {self.rides[0].source.name} "})
+        self.assertEqual(second.content,first.content)
+        self.assertEqual(second['ETag'],first['ETag'])
+        self.assertEqual(registry.get('ride_response_cache_total',view='ride-list',result='hit'),1)
+
+    def test_conditional_get(self):
+        url = reverse('ride-detail',args=[self.rides[0].id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code,200)
+        not_modified = self.client.get(url,HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code,304)
+        self.assertEqual(not_modified.content,b'')
+        self.assertEqual(registry.get('ride_response_bytes_saved_total',view='ride-retrieve'),len(response.content))
+
+    def test_seat_changes_and_cancellation_invalidate(self):
+        ride = self.rides[0]
+        url = reverse('ride-detail',args=[ride.id])
+        listing, detail = self.client.get(reverse('ride-list')), self.client.get(url)
+
+        reserve_seats(ride.id,1)
+        fresh = self.client.get(url,HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(fresh.status_code,200)
+        self.assertEqual(fresh.json()['seats_booked'],ride.seats_booked + 1)
+        self.assertNotEqual(self.client.get(reverse('ride-list'))['ETag'],listing['ETag'])
+
+        ride.refresh_from_db()
+        ride.status = Ride.RideStatus.CANCELLED
+        ride.save()
+        self.assertEqual(self.client.get(url).status_code,404)
+        self.assertNotIn(ride.id,[row['id'] for row in self.client.get(reverse('ride-list')).json()['results']])
+
+
+    def seats_on(self, worker_cache, url):
+        with mock.patch('rides.response_cache.cache',worker_cache):
+            return self.client.get(url).json()['seats_booked']
+
+    def booked_on(self, worker_cache, ride):
+        with mock.patch('rides.response_cache.cache',worker_cache):
+            reserve_seats(ride.id,1)
+
+    @unittest.skipUnless(fakeredis,"fakeredis is not installed")
+    def test_invalidation_reaches_every_worker(self):
+        ride = self.rides[0]
+        url = reverse('ride-detail',args=[ride.id])
+        worker_a, worker_b = shared_caches()
+        self.assertEqual(self.seats_on(worker_a,url),ride.seats_booked)
+        self.booked_on(worker_b,ride)
+        self.assertEqual(self.seats_on(worker_a,url),ride.seats_booked + 1)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache_is_bypassed(self):
+        ride = self.rides[0]
+        url = reverse('ride-detail',args=[ride.id])
+        worker_a, worker_b = process_caches()
+        self.assertEqual(self.seats_on(worker_a,url),ride.seats_booked)
+        self.booked_on(worker_b,ride)
+        self.assertEqual(self.seats_on(worker_a,url),ride.seats_booked + 1)
+
+        response = self.client.get(url,HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code,200)
+        self.assertNotIn('ETag',response)
+        self.assertEqual(registry.get('ride_response_cache_total',view='ride-retrieve',result='hit'),0)
+
+
+class AsyncRideViewTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.rides = create_rides(create_vehicles([self.driver]),create_locations(4),25,stops=2)
+        sync_ride_search_index(full=True)
+        passenger = create_users(1,'passenger')[0]
+        self.client = APIClient()
+        self.client.force_authenticate(passenger)
+        self.headers = {'Authorization': f"Bearer {access_token(passenger)}"}
+        self.driver_headers = {'Authorization': f"Bearer {access_token(self.driver)}"}
+        registry.clear()
+
+    async def test_list_pages_like_the_sync_view(self):
+        params = {'source': self.rides[0].source.name}
+        expected = (await sync_to_async(self.client.get)(reverse('ride-list'),params)).json()
+        response = await self.async_client.get(reverse('async-ride-list'),params,headers=self.headers)
+        self.assertEqual(response.json()['results'],expected['results'])
+
+        first = (await self.async_client.get(reverse('async-ride-list'),headers=self.headers)).json()
+        self.assertIn('/async/ride/',first['next'])
+        second = (await self.async_client.get(first['next'],headers=self.headers)).json()
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids,[ride.id for ride in sorted(self.rides,key=lambda ride: (ride.start_time,ride.id))])
+
+        # Stop names are resolved in a thread, the page with the async ORM
+        stop = self.rides[0].boarding_points[-1]
+        routed = (await self.async_client.get(reverse('async-ride-list'),{'board_at': stop},headers=self.headers)).json()
+        self.assertIn(self.rides[0].id,[row['id'] for row in routed['results']])
+
+    async def test_detail_is_cached_and_revalidated(self):
+        url = reverse('async-ride-detail',args=[self.rides[0].id])
+        response = await self.async_client.get(url,headers=self.headers)
+        self.assertEqual(response.json(),(await sync_to_async(self.client.get)(reverse('ride-detail',args=[self.rides[0].id]))).json())
+        not_modified = await self.async_client.get(url,headers={**self.headers,'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code,304)
+        self.assertEqual(registry.get('ride_response_cache_total',view='async-ride-detail',result='hit'),1)
+
+        missing = await self.async_client.get(reverse('async-ride-detail',args=[0]),headers=self.headers)
+        self.assertEqual(missing.status_code,404)
+        anonymous = await self.async_client.get(url)
+        self.assertEqual(anonymous.status_code,401)
+        self.assertIn('Bearer',anonymous['WWW-Authenticate'])
+
+    @override_settings(CACHE_SHARED=False)
+    async def test_per_process_cache_is_bypassed(self):
+        url = reverse('async-ride-detail',args=[self.rides[0].id])
+        await self.async_client.get(url,headers=self.headers)
+        response = await self.async_client.get(url,headers={**self.headers,'If-None-Match': '*'})
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()['id'],self.rides[0].id)
+        self.assertNotIn('ETag',response)
+
+    async def test_my_rides(self):
+        response = await self.async_client.get(reverse('async-ride-my-rides'),headers=self.driver_headers)
+        data = response.json()
+        self.assertEqual(len(data['my_rides']),20)
+        self.assertIn('Server-Timing',response)
+        rest = (await self.async_client.get(data['next'],headers=self.driver_headers)).json()
+        self.assertEqual(len(rest['my_rides']),5)
+
+
+class RideStopTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.vehicle = create_vehicles([self.driver])[0]
+        self.pune, self.lonavala, self.mumbai = [Location.objects.create(name=name) for name in ('Pune','Lonavala','Mumbai')]
+        LocationAlias.objects.create(location=self.mumbai,name='bombay')
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def create_ride(self, boarding_points, dropping_points, days=1):
+        start_time = timezone.now() + timedelta(days=days)
+        return self.client.post(reverse('ride-list'),{
+            'vehicle_id': self.vehicle.id,'source': boarding_points[0],'destination': dropping_points[-1],
+            'boarding_points': boarding_points,'dropping_points': dropping_points,'fare': 300,'seats_offered': 1,
+            'start_time': start_time.isoformat(),'end_time': (start_time + timedelta(hours=3)).isoformat()
+        },format='json')
+
+    def search(self, **params):
+        return set(RideSearchIndexFilter(params,queryset=RideSearchIndex.objects.all()).qs.values_list('ride_id',flat=True))
+
+    def test_route_search_respects_stop_order_and_departure(self):
+        westbound = self.create_ride(['Pune','Lonavala'],['Mumbai, MH'],days=1).data['id']
+        eastbound = self.create_ride(['Mumbai'],['Lonavala','Pune'],days=3).data['id']
+
+        self.assertEqual(list(Ride.objects.get(id=westbound).stops.values_list('sequence','key','can_board','can_drop')),[
+            (0,'pune',True,False),(1,'lonavala',True,False),(2,'mumbai',False,True)
+        ])
+        self.assertEqual(self.search(board_at='lonavala',drop_at='Bombay'),{westbound})
+        self.assertEqual(self.search(board_at='Bombay',drop_at='Pune'),{eastbound})
+        self.assertEqual(self.search(via='Lonavala'),{westbound,eastbound})
+        self.assertEqual(self.search(drop_at='Pune'),{eastbound})
+        self.assertEqual(self.search(via='Lonavala',departs_after=(timezone.now() + timedelta(days=2)).isoformat()),{eastbound})
+
+        ride = Ride.objects.get(id=westbound)
+        ride.dropping_points = ['Lonavala station','Mumbai']
+        ride.save(update_fields=['dropping_points'])
+        self.assertEqual(self.search(board_at='Pune',drop_at='lonavala station'),{westbound})
+
+    def test_invalid_stop_lists_are_rejected(self):
+        self.assertIn('boarding_points',self.create_ride(['Pune','pune '],['Mumbai']).data)
+        self.assertIn('dropping_points',self.create_ride(['Pune'],['Mumbai','']).data)
+        for boarding_points, dropping_points, error in (
+            (['Pune','Lonavala'],['Mumbai','Lonavala'],"Dropping points should follow the order of the route."),
+            (['Pune','Lonavala'],['Pune','Mumbai'],"The first boarding point can't be a dropping point."),
+            (['Pune','Lonavala','Karjat'],['Lonavala'],"The route should end at a dropping point."),
+        ):
+            self.assertEqual(self.create_ride(boarding_points,dropping_points).data['non_field_errors'],[error])
+
+    def test_intermediate_stop_can_board_and_drop(self):
+        ride = Ride.objects.get(id=self.create_ride(['Pune','Lonavala'],['Lonavala','Mumbai']).data['id'])
+        self.assertEqual(list(ride.stops.values_list('key','can_board','can_drop')),[
+            ('pune',True,False),('lonavala',True,True),('mumbai',False,True)
+        ])
+        self.assertEqual(self.search(board_at='Lonavala',drop_at='Mumbai'),{ride.id})
+        self.assertEqual(self.search(board_at='Pune',drop_at='Lonavala'),{ride.id})
+
+class RideTemplateTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.vehicle = create_vehicles([self.driver])[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+        self.start_time = (timezone.localtime() + timedelta(days=1)).replace(hour=8,minute=30,second=0,microsecond=0)
+
+    def post(self, name, start_time, end_time, **fields):
+        return self.client.post(reverse(name),{
+            'vehicle_id': self.vehicle.id,'source': 'Pune','destination': 'Mumbai','fare': 300,'seats_offered': 2,
+            'boarding_points': ['Pune'],'dropping_points': ['Mumbai'],'start_time': start_time.isoformat(),'end_time': end_time.isoformat(),**fields
+        },format='json')
+
+    def test_weekday_template_is_materialized_in_bulk(self):
+        horizon = timezone.now() + HORIZON
+        weekdays = [day for day in (self.start_time + timedelta(days=i) for i in range(15)) if day <= horizon and day.weekday() < 5]
+        # An existing ride clashes with the second occurrence
+        clash = weekdays[1] + timedelta(minutes=30)
+        self.assertEqual(self.post('ride-list',clash,clash + timedelta(hours=1)).status_code,201)
+
+        response = self.post('ridetemplate-list',self.start_time,self.start_time + timedelta(hours=2),rrule='RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR')
+        self.assertEqual(response.status_code,201,response.data)
+        rides = Ride.objects.filter(template_id=response.data['id']).order_by('start_time')
+        self.assertEqual([timezone.localtime(ride.start_time) for ride in rides],weekdays[:1] + weekdays[2:])
+        self.assertEqual(Location.objects.filter(name__in=['Pune','Mumbai']).count(),2)
+        self.assertEqual(RideSearchIndex.objects.filter(ride__in=rides).count(),len(rides))
+        self.assertEqual(RideStop.objects.filter(ride__in=rides).count(),2 * len(rides))
+        digest = OutboxEmail.objects.get(dedup_key__startswith='recurring-rides:')
+        self.assertIn(f"{len(rides)} recurring rides",digest.body)
+        self.assertIn("Not scheduled",digest.body)
+
+        # The beat only adds what moved into the horizon since
+        self.assertEqual(generate_recurring_rides()['created'],0)
+        generate_recurring_rides(now=timezone.now() + timedelta(days=7))
+        later = [day for day in (self.start_time + timedelta(days=i) for i in range(22)) if day <= horizon + timedelta(days=7) and day.weekday() < 5]
+        self.assertEqual(Ride.objects.filter(template_id=response.data['id']).count(),len(later) - 1)
+
+    def test_invalid_rules_are_rejected(self):
+        for rule in ('FREQ=HOURLY','not a rule'):
+            response = self.post('ridetemplate-list',self.start_time,self.start_time + timedelta(hours=2),rrule=rule)
+            self.assertEqual(response.status_code,400)
+            self.assertIn('rrule',response.data)
+        self.assertFalse(Ride.objects.exists())
+
+class DriverScheduleTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.vehicle = create_vehicles([self.driver])[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+        self.base = (timezone.now() + timedelta(days=1)).replace(minute=0,second=0,microsecond=0)
+
+    def at(self, hours):
+        return self.base + timedelta(hours=hours)
+
+    def ride_data(self, start, end):
+        return {
+            'vehicle_id': self.vehicle.id,'source': 'Pune','destination': 'Mumbai','fare': 300,'seats_offered': 1,
+            'start_time': self.at(start).isoformat(),'end_time': self.at(end).isoformat()
+        }
+
+    def create_ride(self, start, end):
+        return self.client.post(reverse('ride-list'),self.ride_data(start,end),format='json')
+
+    def test_free_windows(self):
+        # A long ride covering a short one, then a separate one
+        schedule = DriverSchedule.build([(self.at(0),self.at(10),1),(self.at(2),self.at(3),2),(self.at(12),self.at(14),3)])
+        self.assertEqual(schedule.free_windows(self.at(1),self.at(20)),[(self.at(10),self.at(12)),(self.at(14),self.at(20))])
+        self.assertEqual(schedule.free_windows(self.at(1),self.at(20),timedelta(hours=3)),[(self.at(14),self.at(20))])
+        self.assertEqual(schedule.free_windows(self.at(-2),self.at(1)),[(self.at(-2),self.at(0))])
+        self.assertEqual(schedule.free_windows(self.at(3),self.at(11)),[(self.at(10),self.at(11))])
+
+    def test_unparseable_end_time_is_a_validation_error(self):
+        for end_time in ['tomorrow','2030-13-01T10:00:00',5]:
+            response = self.client.post(reverse('ride-list'),{**self.ride_data(0,2),'end_time': end_time},format='json')
+            self.assertEqual(response.status_code,400)
+            self.assertIn('start_time',response.data)
+
+    def test_rides_invalidate_the_cached_schedule(self):
+        ride = self.create_ride(0,2).data['id']
+        # Another worker's cached schedule from before the ride existed does not let an overlap through
+        cache.set(schedule_key(self.driver.id),([],[]))
+        self.assertIn('start_time',self.create_ride(1,3).data)
+        # A ride can move within its own slot
+        response = self.client.put(reverse('ride-detail',args=[ride]),self.ride_data(1,2),format='json')
+        self.assertEqual(response.status_code,200,response.data)
+        self.assertEqual(self.create_ride(0,1).status_code,201)
+
+        self.client.post(reverse('ride-cancel',args=[ride]))
+        self.assertEqual(driver_schedule(self.driver.id).free_windows(self.at(1),self.at(3)),[(self.at(1),self.at(3))])
+        self.assertEqual(self.create_ride(1,3).status_code,201)
+        windows = self.client.get(reverse('ride-free-windows'),{'days': 2,'min_minutes': 30}).data['free_windows']
+        self.assertIn(self.at(3),[parse_datetime(window['start']) for window in windows])
+
+    def test_completing_rides_drops_the_cached_schedule(self):
+        ride = self.create_ride(0,2).data['id']
+        self.assertEqual(driver_schedule(self.driver.id).free_windows(self.at(0),self.at(2)),[])
+        complete_rides_batch([ride])
+        self.assertIsNone(cache.get(schedule_key(self.driver.id)))
+        self.assertEqual(driver_schedule(self.driver.id).free_windows(self.at(0),self.at(2)),[(self.at(0),self.at(2))])
+
+class FlatSerializerTests(TestCase):
+    def setUp(self):
+        self.rides = create_rides(create_vehicles(create_users(2,'driver')),create_locations(6),12,stops=4)
+        Ride.objects.filter(id=self.rides[0].id).update(status=Ride.RideStatus.CANCELLED)
+        client = APIClient()
+        client.force_authenticate(create_users(1,'passenger')[0])
+        for ride in self.rides[1:5]:
+            client.post(reverse('booking-list'),{
+                'ride': ride.id,'boarding_point': ride.boarding_points[-1],'dropping_point': ride.dropping_points[0],'seats_booked': 1
+            },format='json')
+        sync_ride_search_index(full=True)
+
+    def assertSameOutput(self, serializer, queryset):
+        flat = compile_serializer(serializer)
+        self.assertEqual(flat.serialize(flat.values(queryset)),serializer(queryset,many=True).data)
+
+    def test_flat_output_matches_the_serializers(self):
+        self.assertSameOutput(RideSerializer,Ride.objects.order_by('id'))
+        self.assertSameOutput(RideSearchSerializer,RideSearchIndex.objects.order_by('ride_id'))
+        self.assertSameOutput(BookingSerializer,Booking.objects.order_by('id'))
+        self.assertEqual(Booking.objects.count(),4)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'rides': RideSerializer(Ride.objects.order_by('id'),many=True).data,
+            'text': "Pune\u2028Mumbai\u2029 ₹ \"quoted\"",
+            'when': timezone.now(),'day': timezone.now().date(),'ratio': 0.1,'big': 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data),JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data,renderer_context={'indent': 2}),JSONRenderer().render(data,renderer_context={'indent': 2}))
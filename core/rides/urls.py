@@ -1,13 +1,22 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register('ride',views.RideViewset)
+router.register('ride-template',views.RideTemplateViewset)
 router.register('vehicle-make',views.VehicleMakeViewset)
 router.register('vehicle-model',views.VehicleModelViewset)
 router.register('vehicle',views.VehicleViewset)
+router.register('location',views.LocationViewset)
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+
+# Mounted under /async/ by core.urls
+async_urlpatterns = [
+    path('ride/',async_views.AsyncRideListView.as_view(),name='async-ride-list'),
+    path('ride/my_rides/',async_views.AsyncMyRidesView.as_view(),name='async-ride-my-rides'),
+    path('ride/<int:pk>/',async_views.AsyncRideDetailView.as_view(),name='async-ride-detail'),
+]
@@ -1,16 +1,55 @@
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Round, Sin, Sqrt
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM, PREFIX_END, covering_cells
+from .geocoding import lookup_cache
+from .locations import resolve_location
 from .models import Location
-from .tasks import verify_location_with_geopy
 
 def get_or_create_location_async(name):
     print("Getting location...")
-    location = Location.objects.filter(name=name).first()
+    # "Mumbai", "mumbai " and "Mumbai, MH" all resolve to the same row
+    location = resolve_location(name)
 
     if location:
         return location
-    
-    location = Location.objects.create(name=name)
 
-    print("Starting celery task to verify location with geopy...")
-    verify_location_with_geopy.delay(location.id)
-    
-    return location
\ No newline at end of file
+    # Known places resolve right away from the geocode cache; everything else
+    # is left pending for the batched geocode_pending_locations task.
+    entry = lookup_cache(name)
+    if entry is not None and entry.found:
+        return Location.objects.create(
+            name=name,
+            latitude=entry.latitude,
+            longitude=entry.longitude,
+            is_verified=True,
+            geocoded_at=timezone.now()
+        )
+    return Location.objects.create(name=name)
+
+def near_cells(latitude, longitude, radius_km, prefix=''):
+    # Geohash prefix range scans on the indexed column that cover the circle;
+    # prefix points at the Location through a relation ("source__")
+    cells = covering_cells(latitude,longitude,radius_km)
+    return reduce(or_,[Q(**{f"{prefix}geohash__gte": cell,f"{prefix}geohash__lt": cell + PREFIX_END}) for cell in cells])
+
+
+def distance_km(latitude, longitude, prefix=''):
+    # Haversine distance from the point to the Location's stored coordinates,
+    # computed in SQL so the candidates never leave the database
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    lat2, lng2 = Radians(f"{prefix}latitude"), Radians(f"{prefix}longitude")
+    a = Power(Sin((lat2 - Value(lat1)) / 2),2) + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lng2 - Value(lng1)) / 2),2)
+    return Round(2 * EARTH_RADIUS_KM * ASin(Sqrt(a)),3,output_field=FloatField())
+
+
+def find_locations_near(latitude, longitude, radius_km):
+    # {location_id: distance_km} within radius_km
+    return dict(Location.objects.filter(near_cells(latitude,longitude,radius_km)).annotate(
+        distance=distance_km(latitude,longitude)
+    ).filter(distance__lte=radius_km).values_list('id','distance'))
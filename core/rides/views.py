@@ -1,29 +1,58 @@
 import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from django.shortcuts import render
-from rest_framework import status, viewsets
+from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter
 
-from .filters import RideFilter
-from .models import Ride, Vehicle, VehicleMake, VehicleModel
+from core.flat import compile_serializer
+
+from .filters import RideFilter, RideSearchIndexFilter
+from .locations import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, autocomplete
+from .models import Location, Ride, RideSearchIndex, RideTemplate, Vehicle, VehicleMake, VehicleModel
+from .pagination import RideCursorPagination
+from .recurring import generate_rides
+from .schedule import driver_schedule
 from .permissions import IsDriver, IsDriverVerified
-from .serializers import (RideSerializer, VehicleMakeSerializer,
-                          VehicleModelSerializer, VehicleSerializer,
-                          BookingsDetailsSerialzer)
-from .tasks import send_ride_confirmation_email
+from .response_cache import cached_response, detail_key, list_key
+from .serializers import (LocationSerializer, RideSearchSerializer, RideSerializer, RideTemplateSerializer,
+                          VehicleMakeSerializer, VehicleModelSerializer,
+                          VehicleSerializer, BookingsDetailsSerialzer)
 from bookings.models import Booking
+from notifications.outbox import enqueue_email
 
 # Create your views here.
 
 class RideViewset(viewsets.ModelViewSet):
-    queryset = Ride.objects.all()
+    queryset = Ride.objects.select_related('source','destination','driver__profile__driver_profile','vehicle__model__make')
     serializer_class = RideSerializer
-    filterset_class = RideFilter
-    search_fields = ['source','destination']
+    pagination_class = RideCursorPagination
+
+    # The open-ride listing is served from the denormalized RideSearchIndex table
+    @property
+    def filterset_class(self):
+        return RideSearchIndexFilter if self.action == 'list' else RideFilter
+
+    @property
+    def search_fields(self):
+        if self.action == 'list':
+            return ['source_name','destination_name']
+        return ['source__name','destination__name']
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return RideSearchSerializer
+        return self.serializer_class
+
     def get_queryset(self):
-        qs = Ride.objects.select_related('driver__profile','vehicle__model__make')
+        if self.action == 'list':
+            return RideSearchIndex.objects.all()
+        qs = self.queryset
         user = self.request.user
         if self.action in ['update','partial_update','create','destroy','bookings_details']:
             qs = qs.filter(driver=user)
@@ -32,20 +61,37 @@ class RideViewset(viewsets.ModelViewSet):
     
     def get_permissions(self):
         print("In get permission",self.action)
-        if self.action in ['create','update','destroy','partial_update','bookings_details']:
+        if self.action in ['create','update','destroy','partial_update','bookings_details','free_windows']:
             permissions = [IsAuthenticated,IsDriverVerified]
         else:
             permissions = [IsAuthenticated]
         return [permission() for permission in permissions]
 
+    def list(self, request, *args, **kwargs):
+        def build():
+            # Rows as values() dicts through the flat serializer (core.flat), same output
+            flat = compile_serializer(self.get_serializer_class())
+            page = self.paginate_queryset(flat.values(self.filter_queryset(self.get_queryset())))
+            return self.get_paginated_response(flat.serialize(page)).data, page
+        return cached_response(self,list_key(request),build)
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            ride = self.get_object()
+            return self.get_serializer(ride).data, [ride]
+        return cached_response(self,detail_key(request,kwargs['pk']),build)
+
     def perform_create(self, serializer):
         user = self.request.user
-        ride = serializer.save(driver=user)
-        print(f"Ride created with id {ride.id}. Starting email task in backgorund. ")
-        send_ride_confirmation_email.delay(
-            user_email = user.email,
-            ride_id = ride.id
-        )
+        with transaction.atomic():
+            ride = serializer.save(driver=user)
+            print(f"Ride created with id {ride.id}. Queueing confirmation email. ")
+            enqueue_email(
+                f"ride-created:{ride.id}",
+                "Ride creation mail",
+                f"Ride from {ride.source} to {ride.destination} created successfully.",
+                [user.email]
+            )
 
     # Here POST is used to make API clearer by telling its just not a field update but an action or command to server
     @action(detail=True,methods=['POST'])
@@ -63,10 +109,29 @@ class RideViewset(viewsets.ModelViewSet):
     @action(detail=False,methods=['GET'])
     def my_rides(self,request,pk=None):
         user = request.user
-        rides = Ride.objects.filter(driver=user)
-        serializer = self.get_serializer(rides,many=True)
-        return Response({"my_rides":serializer.data},status=status.HTTP_200_OK)
+        flat = compile_serializer(self.get_serializer_class())
+        rides = self.paginate_queryset(flat.values(self.queryset.filter(driver=user)))
+        return Response({
+            "my_rides":flat.serialize(rides),
+            "next":self.paginator.get_next_link(),
+            "previous":self.paginator.get_previous_link()
+        },status=status.HTTP_200_OK)
     
+    @action(detail=False,methods=['GET'])
+    def free_windows(self,request):
+        # Gaps between the driver's rides over the next ?days= (default a week) of at least ?min_minutes=
+        try:
+            days = min(max(int(request.query_params.get('days',7)),1),31)
+            min_minutes = max(int(request.query_params.get('min_minutes',60)),0)
+        except ValueError:
+            return Response({"error":"days and min_minutes should be whole numbers."},status=status.HTTP_400_BAD_REQUEST)
+        now = timezone.now()
+        windows = driver_schedule(request.user.id).free_windows(now,now + timedelta(days=days),timedelta(minutes=min_minutes))
+        field = serializers.DateTimeField()
+        return Response({
+            "free_windows":[{"start":field.to_representation(start),"end":field.to_representation(end)} for start, end in windows]
+        },status=status.HTTP_200_OK)
+
     @action(detail=True,methods=['GET'])
     def bookings_details(self,request,pk=None):
         print("Before executing get_object")
@@ -77,6 +142,27 @@ class RideViewset(viewsets.ModelViewSet):
         serializer = BookingsDetailsSerialzer(ride)
         return Response(serializer.data,status=status.HTTP_200_OK)
         
+class RideTemplateViewset(viewsets.ModelViewSet):
+    # Recurring rides; saving a template schedules its upcoming occurrences right away
+    queryset = RideTemplate.objects.select_related('source','destination')
+    serializer_class = RideTemplateSerializer
+    permission_classes = [IsAuthenticated,IsDriverVerified]
+
+    def get_queryset(self):
+        return self.queryset.filter(driver=self.request.user).order_by('id')
+
+    def perform_create(self, serializer):
+        serializer.save(driver=self.request.user)
+        generate_rides(self.request.user.id)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        generate_rides(self.request.user.id)
+
+    @action(detail=False,methods=['POST'])
+    def generate(self,request):
+        return Response(generate_rides(request.user.id),status=status.HTTP_200_OK)
+
 class VehicleMakeViewset(viewsets.ModelViewSet):
     queryset = VehicleMake.objects.all()
     serializer_class = VehicleMakeSerializer
@@ -95,3 +181,19 @@ class VehicleViewset(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
         return serializer.data
+
+class LocationViewset(viewsets.GenericViewSet):
+    queryset = Location.objects.all()
+    serializer_class = LocationSerializer
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False,methods=['GET'])
+    def autocomplete(self,request):
+        query = request.query_params.get('q','').strip()
+        try:
+            limit = min(int(request.query_params.get('limit',AUTOCOMPLETE_LIMIT)),MAX_AUTOCOMPLETE_LIMIT)
+        except ValueError:
+            return Response({"error":"limit should be a number."},status=status.HTTP_400_BAD_REQUEST)
+        locations = autocomplete(query,max(limit,1))
+        serializer = self.get_serializer(locations,many=True)
+        return Response(serializer.data,status=status.HTTP_200_OK)
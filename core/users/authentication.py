@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .claims import aget_token_state, get_token_state
+from .models import DriverProfile, PassengerProfile, Profile, User
+
+
+def partial_instance(model, **values):
+    # Instance holding only `values`; every other field is deferred and loaded
+    # in one query on first access (see PartialLoadMixin)
+    fields = model._meta.concrete_fields
+    instance = model.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields if field.attname in values],
+        [values.get(field.attname,DEFERRED) for field in fields],
+    )
+    instance._load_deferred_together = True
+    return instance
+
+
+def user_from_claims(user_id, token):
+    user = partial_instance(
+        User,
+        id=user_id,
+        role=token['role'],
+        is_staff=token['is_staff'],
+        is_active=True,
+        token_version=token['ver'],
+    )
+    if token.get('profile_id') is None:
+        return user
+
+    # Pre-fill the related-object caches, so user.profile.driver_profile and
+    # friends resolve without queries; a missing profile resolves to DoesNotExist
+    profile = partial_instance(Profile,id=token['profile_id'],user_id=user.id)
+    profile._state.fields_cache['user'] = user
+    user._state.fields_cache['profile'] = profile
+    for name, model in (('driver_profile',DriverProfile),('passenger_profile',PassengerProfile)):
+        related = None
+        if token.get(f"{name}_id") is not None:
+            related = partial_instance(model,id=token[f"{name}_id"],profile_id=profile.id)
+            related._state.fields_cache['profile'] = profile
+        profile._state.fields_cache[name] = related
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Builds request.user from the signed token claims instead of loading the
+    user row. Revocation is checked against the cached token version.
+    """
+
+    def get_user(self, validated_token):
+        if 'ver' not in validated_token:
+            # Tokens issued before the claims were added
+            return super().get_user(validated_token)
+        user_id = self.claimed_user_id(validated_token)
+        return self.check_token_state(user_id,get_token_state(user_id),validated_token)
+
+    async def aauthenticate(self, request):
+        # authenticate() for the async views (plain Django requests); the token
+        # state is read without blocking the event loop
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if 'ver' not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+        user_id = self.claimed_user_id(validated_token)
+        return self.check_token_state(user_id,await aget_token_state(user_id),validated_token), validated_token
+
+    def claimed_user_id(self, validated_token):
+        try:
+            # simplejwt signs the id as a string
+            return User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError,ValidationError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_token_state(self, user_id, state, validated_token):
+        version, is_active = state
+        if version is None:
+            raise AuthenticationFailed(_("User not found"),code="user_not_found")
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"),code="user_inactive")
+        if validated_token['ver'] != version:
+            raise AuthenticationFailed(_("Token has been revoked"),code="token_revoked")
+        return user_from_claims(user_id,validated_token)
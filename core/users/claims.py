@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core import async_cache
+
+from .models import DriverProfile, Profile, User
+
+# Authorization claims (role, driver verification) cached per user, so the
+# permission checks on hot endpoints run no SQL. Anything that changes a claim
+# calls invalidate_claims (see users.signals), which takes effect on the next
+# request everywhere. That needs the cache shared by all workers (Redis): with
+# a per-process cache (CACHE_SHARED off) the claims are read from the database.
+
+
+def claims_key(user_id):
+    return f"auth-claims:{user_id}"
+
+
+def token_state_key(user_id):
+    return f"auth-token-state:{user_id}"
+
+
+def load_claims(user):
+    verified = DriverProfile.objects.filter(profile__user_id=user.pk).values_list('is_driver_verified',flat=True).first()
+    return {
+        'role': user.role,
+        'driver_verified': bool(verified),
+    }
+
+
+def get_claims(user):
+    if not settings.CACHE_SHARED:
+        return load_claims(user)
+    claims = cache.get(claims_key(user.pk))
+    if claims is None:
+        claims = load_claims(user)
+        cache.set(claims_key(user.pk),claims,settings.AUTH_CLAIMS_TTL)
+    return claims
+
+
+def invalidate_claims(user_id):
+    keys = [claims_key(user_id),token_state_key(user_id)]
+    cache.delete_many(keys)
+    # A request that read the old row before commit may have re-cached it
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def token_claims(user):
+    # Signed into every token by users.serializers, read back by
+    # users.authentication.ClaimsJWTAuthentication without touching the DB
+    profile_id, driver_profile_id, verified, passenger_profile_id = Profile.objects.filter(user=user).values_list(
+        'id','driver_profile__id','driver_profile__is_driver_verified','passenger_profile__id'
+    ).first() or (None,None,None,None)
+    return {
+        'role': user.role,
+        'is_staff': user.is_staff,
+        'profile_id': profile_id,
+        'driver_profile_id': driver_profile_id,
+        'passenger_profile_id': passenger_profile_id,
+        'driver_verified': bool(verified),
+        'ver': user.token_version,
+    }
+
+
+def load_token_state(user_id):
+    # (token_version, is_active) of the user, None once the user is deleted
+    row = User.objects.filter(pk=user_id).values_list('token_version','is_active').first()
+    return list(row) if row else [None,False]
+
+
+async def aload_token_state(user_id):
+    row = await User.objects.filter(pk=user_id).values_list('token_version','is_active').afirst()
+    return list(row) if row else [None,False]
+
+
+def get_token_state(user_id):
+    # Cached like the claims: a revocation must reach every worker at once
+    if not settings.CACHE_SHARED:
+        return load_token_state(user_id)
+    state = cache.get(token_state_key(user_id))
+    if state is None:
+        state = load_token_state(user_id)
+        cache.set(token_state_key(user_id),state,settings.AUTH_CLAIMS_TTL)
+    return state
+
+
+async def aget_token_state(user_id):
+    # get_token_state for the async views
+    if not settings.CACHE_SHARED:
+        return await aload_token_state(user_id)
+    state = await async_cache.aget(token_state_key(user_id))
+    if state is None:
+        state = await aload_token_state(user_id)
+        await async_cache.aset(token_state_key(user_id),state,settings.AUTH_CLAIMS_TTL)
+    return state
+
+
+def revoke_tokens(user_id):
+    # Every access and refresh token issued before this call stops working
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    invalidate_claims(user_id)
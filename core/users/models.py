@@ -23,7 +23,15 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser",True)
         return self.create_user(email=email,password=password,role="admin",**extra_fields)
         
-class User(AbstractBaseUser,PermissionsMixin):
+class PartialLoadMixin:
+    # Instances built from token claims (users.authentication) hold a few
+    # fields; the first access to a missing one loads all the rest at once
+    def refresh_from_db(self,using=None,fields=None,from_queryset=None):
+        if fields is not None and getattr(self,'_load_deferred_together',False):
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using,fields,from_queryset)
+
+class User(PartialLoadMixin,AbstractBaseUser,PermissionsMixin):
     class Roles(models.TextChoices):
         DRIVER = 'driver', 'Driver'
         PASSENGER = 'passenger', 'Passenger'
@@ -38,6 +46,8 @@ class User(AbstractBaseUser,PermissionsMixin):
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped to revoke every token issued so far (see users.claims.revoke_tokens)
+    token_version = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -62,7 +72,7 @@ class User(AbstractBaseUser,PermissionsMixin):
     def __str__(self):
         return self.email
 
-class Profile(models.Model):
+class Profile(PartialLoadMixin,models.Model):
     class GenderChoices(models.TextChoices):
         MALE = 'male'
         FEMALE = 'female'
@@ -78,7 +88,7 @@ class Profile(models.Model):
     def __str__(self):
         return f"{self.first_name or self.user.email}'s Profile"
     
-class DriverProfile(models.Model):
+class DriverProfile(PartialLoadMixin,models.Model):
     profile = models.OneToOneField(Profile,on_delete=models.CASCADE, related_name="driver_profile")
     is_driver_verified = models.BooleanField(default=False)
     total_rides_as_a_driver = models.IntegerField(default=0) 
@@ -93,7 +103,7 @@ class DriverProfile(models.Model):
     def __str__(self):
         return f"DriverProfile({self.profile.first_name})"
 
-class PassengerProfile(models.Model):
+class PassengerProfile(PartialLoadMixin,models.Model):
     profile = models.OneToOneField(Profile,on_delete=models.CASCADE, related_name="passenger_profile")
     total_rides_as_a_passenger = models.IntegerField(default=0)
 
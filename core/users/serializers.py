@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
 
+from .claims import token_claims
 from .models import (DriverDocuments, DriverProfile, DriverVerification,
                      PassengerProfile, Profile)
 
@@ -57,4 +62,24 @@ class DriverVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = DriverVerification
         fields = ["id","driver_profile","status","admin_feedback","submitted_at","updated_at"] 
-        read_only_fields = ['driver_profile','admin_feedback','submitted_at','updated_at']
\ No newline at end of file
+        read_only_fields = ['driver_profile','admin_feedback','submitted_at','updated_at']
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token.payload.update(token_claims(user))
+        return token
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if 'ver' not in refresh:
+            return super().validate(attrs)
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+        if user is None or not user.is_active or user.token_version != refresh['ver']:
+            raise AuthenticationFailed(self.error_messages['no_active_account'],'no_active_account')
+        # Fresh claims, so a role or verification change shows up on refresh
+        access = refresh.access_token
+        access.payload.update(token_claims(user))
+        return {'access': str(access)}
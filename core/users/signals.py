@@ -1,12 +1,17 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from notifications.outbox import enqueue_email
+
+from .claims import invalidate_claims, revoke_tokens
 from .models import DriverProfile, PassengerProfile, Profile
-from .tasks import send_welcome_email
 
 User = get_user_model()
 
+# Fields signed into tokens or guarding them; changing one revokes the user's tokens
+TOKEN_FIELDS = ('password','role','is_active','is_staff')
+
 @receiver(post_save,sender=User)
 def create_user_profile(sender,instance,created,**kwargs):
     if created:
@@ -16,6 +21,32 @@ def create_user_profile(sender,instance,created,**kwargs):
         elif instance.role == 'passenger':
             PassengerProfile.objects.create(profile=profile)
 
-        send_welcome_email.delay(instance.email)
+        enqueue_email(f"welcome:{instance.pk}","Welcome to carpool...","Thanks for signing up..",[instance.email])
+
+@receiver(pre_save,sender=User)
+def check_token_fields(sender,instance,update_fields=None,**kwargs):
+    instance._revoke_tokens = False
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = [field for field in TOKEN_FIELDS if update_fields is None or field in update_fields]
+    if fields:
+        old = User.objects.filter(pk=instance.pk).values(*fields).first()
+        instance._revoke_tokens = old is not None and any(old[field] != getattr(instance,field) for field in fields)
+
+@receiver(post_save,sender=User)
+def invalidate_user_claims(sender,instance,**kwargs):
+    # Role changes; new users too, ids can be reused after a delete
+    if getattr(instance,'_revoke_tokens',False):
+        revoke_tokens(instance.pk)
+        instance.refresh_from_db(fields=['token_version'])
+    else:
+        invalidate_claims(instance.pk)
 
+@receiver(post_delete,sender=User)
+def invalidate_deleted_user_claims(sender,instance,**kwargs):
+    invalidate_claims(instance.pk)
 
+@receiver(post_save,sender=DriverProfile)
+def invalidate_driver_claims(sender,instance,**kwargs):
+    # Approve, reject, verify and admin edits of the verification flag
+    invalidate_claims(instance.profile.user_id)
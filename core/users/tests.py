@@ -1,3 +1,156 @@
-from django.test import TestCase
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from benchmarks.fixtures import BENCHMARK_PASSWORD, create_locations, create_rides, create_users, create_vehicles
+from core.testing import fakeredis, process_caches, shared_caches
+from rides.permissions import IsDriverVerified
+
+from .authentication import ClaimsJWTAuthentication
+from .claims import aget_token_state, get_claims, get_token_state, revoke_tokens
+from .models import DriverProfile, DriverVerification, User
 
 # Create your tests here.
+
+class ClaimsCacheTests(TestCase):
+    def setUp(self):
+        self.driver = create_users(1,'driver')[0]
+        self.ride = create_rides(create_vehicles([self.driver]),create_locations(2),1)[0]
+        self.verification = DriverVerification.objects.create(driver_profile=self.driver.profile.driver_profile)
+        admin = create_users(1,'admin')[0]
+        User.objects.filter(id=admin.id).update(is_staff=True)
+        admin.refresh_from_db()
+
+        self.driver_client = APIClient()
+        self.driver_client.force_authenticate(self.driver)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+
+    def bookings_details(self):
+        return self.driver_client.get(reverse('ride-bookings-details',args=[self.ride.id]))
+
+    def test_permission_check_runs_no_queries_once_cached(self):
+        get_claims(self.driver)
+        request = SimpleNamespace(user=self.driver)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsDriverVerified().has_permission(request,None))
+
+    def test_revocation_takes_effect_on_the_next_request(self):
+        self.assertEqual(self.bookings_details().status_code,200)
+
+        response = self.admin_client.post(reverse('driver-verification-approval-reject',args=[self.verification.id]),{'admin_feedback': 'Expired licence'})
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(self.bookings_details().status_code,403)
+
+        self.admin_client.post(reverse('driver-verification-approval-approve',args=[self.verification.id]))
+        self.assertEqual(self.bookings_details().status_code,200)
+
+    def reject_on(self, worker_cache):
+        with mock.patch('users.claims.cache',worker_cache):
+            self.admin_client.post(reverse('driver-verification-approval-reject',args=[self.verification.id]),{'admin_feedback': 'Expired licence'})
+
+    def claims_on(self, worker_cache):
+        with mock.patch('users.claims.cache',worker_cache):
+            return get_claims(self.driver)
+
+    @unittest.skipUnless(fakeredis,"fakeredis is not installed")
+    def test_invalidation_reaches_every_worker(self):
+        worker_a, worker_b = shared_caches()
+        self.assertTrue(self.claims_on(worker_a)['driver_verified'])
+        self.reject_on(worker_b)
+        self.assertFalse(self.claims_on(worker_a)['driver_verified'])
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache_is_never_trusted(self):
+        worker_a, worker_b = process_caches()
+        self.assertTrue(self.claims_on(worker_a)['driver_verified'])
+        self.reject_on(worker_b)
+        self.assertFalse(self.claims_on(worker_a)['driver_verified'])
+
+
+class ClaimsTokenTests(TestCase):
+    def setUp(self):
+        self.passenger = create_users(1,'passenger')[0]
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post(reverse('token_obtain_view'),{'email': self.passenger.email,'password': BENCHMARK_PASSWORD})
+        self.assertEqual(response.status_code,200)
+        return response.data
+
+    def get_profiles(self, access):
+        return self.client.get(reverse('profile-list'),HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_authenticated_request_skips_the_user_query(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.get_profiles(access).status_code,200)  # caches the token version
+        with self.assertNumQueries(1):
+            response = self.get_profiles(access)
+        self.assertEqual(response.data['results'][0]['user'],self.passenger.id)
+
+    def test_claims_user_loads_missing_fields_lazily(self):
+        token = AccessToken(self.obtain()['access'])
+        user = ClaimsJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(user,self.passenger)
+            self.assertEqual(user.profile.passenger_profile.profile_id,self.passenger.profile.id)
+            self.assertRaises(DriverProfile.DoesNotExist,lambda: user.profile.driver_profile)
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email,user.phone_number),(self.passenger.email,self.passenger.phone_number))
+
+    def test_plain_tokens_still_authenticate(self):
+        self.assertEqual(self.get_profiles(RefreshToken.for_user(self.passenger).access_token).status_code,200)
+
+    def test_password_change_revokes_issued_tokens(self):
+        tokens = self.obtain()
+        self.assertEqual(self.get_profiles(tokens['access']).status_code,200)
+
+        self.passenger.set_password('a-new-password')
+        self.passenger.save()
+        self.assertEqual(self.get_profiles(tokens['access']).status_code,401)
+        response = self.client.post(reverse('token_refresh_view'),{'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code,401)
+
+    def test_revoke_tokens(self):
+        tokens = self.obtain()
+        response = self.client.post(reverse('token_refresh_view'),{'refresh': tokens['refresh']})
+        self.assertEqual(self.get_profiles(response.data['access']).status_code,200)
+
+        revoke_tokens(self.passenger.id)
+        self.assertEqual(self.get_profiles(response.data['access']).status_code,401)
+        self.assertEqual(self.get_profiles(self.obtain()['access']).status_code,200)
+
+    def profiles_on(self, worker_cache, access):
+        with mock.patch('users.claims.cache',worker_cache):
+            return self.get_profiles(access).status_code
+
+    @unittest.skipUnless(fakeredis,"fakeredis is not installed")
+    def test_revocation_reaches_every_worker(self):
+        access = self.obtain()['access']
+        worker_a, worker_b = shared_caches()
+        self.assertEqual(self.profiles_on(worker_a,access),200)  # caches the token version
+        with mock.patch('users.claims.cache',worker_b):
+            revoke_tokens(self.passenger.id)
+        self.assertEqual(self.profiles_on(worker_a,access),401)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_per_process_cache_is_never_trusted(self):
+        access = self.obtain()['access']
+        worker_a, worker_b = process_caches()
+        self.assertEqual(self.profiles_on(worker_a,access),200)
+        with mock.patch('users.claims.cache',worker_b):
+            revoke_tokens(self.passenger.id)
+        self.assertEqual(self.profiles_on(worker_a,access),401)
+
+        # Deactivated by another worker, which only cleared its own cache
+        User.objects.filter(pk=self.passenger.id).update(is_active=False,token_version=F('token_version') + 1)
+        state = [self.passenger.token_version + 2,False]
+        self.assertEqual(get_token_state(self.passenger.id),state)
+        self.assertEqual(async_to_sync(aget_token_state)(self.passenger.id),state)